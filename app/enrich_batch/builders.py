@@ -78,7 +78,8 @@ def build_embedding_requests(
     since_date: Optional[str] = None,
     limit: Optional[int] = None,
     output_path: str = "data/batch/embeddings.requests.jsonl",
-    authorities: Optional[List[str]] = None
+    authorities: Optional[List[str]] = None,
+    event_ids: Optional[List[str]] = None
 ) -> Dict:
     """
     Build JSONL request file for embeddings.
@@ -88,6 +89,7 @@ def build_embedding_requests(
         limit: Maximum number of documents to process
         output_path: Path to write JSONL file
         authorities: Filter by authority codes (e.g., ['MAS', 'IMDA'])
+        event_ids: Restrict to these events (e.g., a pipeline step's cohort)
 
     Returns:
         Metadata dict with file_path, request_count, estimated_tokens, projected_cost_usd
@@ -119,6 +121,10 @@ def build_embedding_requests(
         placeholders = ",".join(["%s"] * len(authorities))
         query += f" AND e.authority IN ({placeholders})"
         params.extend(authorities)
+
+    if event_ids:
+        query += " AND e.event_id = ANY(%s::uuid[])"
+        params.append(list(event_ids))
     
     query += " ORDER BY e.pub_date DESC"
     
@@ -207,7 +213,8 @@ def build_summary_requests(
     since_date: Optional[str] = None,
     limit: Optional[int] = None,
     output_path: str = "data/batch/summaries.requests.jsonl",
-    authorities: Optional[List[str]] = None
+    authorities: Optional[List[str]] = None,
+    event_ids: Optional[List[str]] = None
 ) -> Dict:
     """
     Build JSONL request file for summaries.
@@ -217,6 +224,7 @@ def build_summary_requests(
         limit: Maximum number of events to process
         output_path: Path to write JSONL file
         authorities: Filter by authority codes (e.g., ['MAS', 'IMDA'])
+        event_ids: Restrict to these events (e.g., a pipeline step's cohort)
 
     Returns:
         Metadata dict with file_path, request_count, estimated_tokens, projected_cost_usd
@@ -246,6 +254,10 @@ def build_summary_requests(
         placeholders = ",".join(["%s"] * len(authorities))
         query += f" AND e.authority IN ({placeholders})"
         params.extend(authorities)
+
+    if event_ids:
+        query += " AND e.event_id = ANY(%s::uuid[])"
+        params.append(list(event_ids))
     
     query += " ORDER BY e.pub_date DESC"
     
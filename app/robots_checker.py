@@ -7,17 +7,25 @@ Checks robots.txt before crawling and logs blocked URLs.
 
 import csv
 import os
+import threading
 import urllib.robotparser
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-from typing import Dict, Optional
+from typing import Dict, Iterable, Optional, Union
 from urllib.parse import urlparse
 
 
+ROBOTS_BLOCKED_CSV = "data/output/validation/latest/robots_blocked.csv"
+
+
 class RobotsChecker:
     """
     Check robots.txt compliance before crawling.
     
     Caches robots.txt parsers per domain to avoid repeated fetches.
+    
+    Can be used as a context manager; the blocked-URL CSV handle is kept
+    open across log_block() calls and flushed/closed on exit.
     """
     
     def __init__(self, user_agent: str):
@@ -28,7 +36,41 @@ class RobotsChecker:
             user_agent: User-agent string to use for robots.txt checks
         """
         self.user_agent = user_agent
-        self.cache: Dict[str, Optional[urllib.robotparser.RobotFileParser]] = {}
+        # Per-domain value: parser, True (robots.txt has no Disallow rules),
+        # or None (robots.txt unavailable)
+        self.cache: Dict[str, Union[urllib.robotparser.RobotFileParser, bool, None]] = {}
+        self._lock = threading.Lock()
+        # Per-domain locks so concurrent first lookups fetch robots.txt once
+        self._fetch_locks: Dict[str, threading.Lock] = {}
+        self._csv_fh = None
+        self._csv_w = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+    
+    def close(self):
+        """Flush and close the blocked-URL CSV handle, if open."""
+        if self._csv_fh is not None:
+            try:
+                self._csv_fh.flush()
+                self._csv_fh.close()
+            except Exception:
+                pass
+            self._csv_fh = None
+            self._csv_w = None
+    
+    def _open_block_log(self):
+        """Open the blocked-URL CSV once, writing the header if the file is new."""
+        os.makedirs(os.path.dirname(ROBOTS_BLOCKED_CSV), exist_ok=True)
+        file_exists = os.path.exists(ROBOTS_BLOCKED_CSV)
+        self._csv_fh = open(ROBOTS_BLOCKED_CSV, "a", buffering=1 << 16, encoding="utf-8", newline="")
+        self._csv_w = csv.writer(self._csv_fh)
+        if not file_exists:
+            self._csv_w.writerow(["authority", "url", "reason", "timestamp"])
     
     def is_allowed(self, url: str) -> bool:
         """
@@ -49,28 +91,84 @@ class RobotsChecker:
             
             # Check cache
             if domain not in self.cache:
-                # Fetch and parse robots.txt
-                rp = urllib.robotparser.RobotFileParser()
-                robots_url = f"{parsed.scheme}://{domain}/robots.txt"
-                rp.set_url(robots_url)
-                
-                try:
-                    rp.read()
-                    self.cache[domain] = rp
-                except Exception:
-                    # Allow on fetch failure (robots.txt may not exist)
-                    self.cache[domain] = None
+                self._fetch_one(parsed.scheme, domain)
             
             # Check if allowed
-            if self.cache[domain] is None:
-                return True  # Allow if robots.txt not available
+            cached = self.cache[domain]
+            if cached is None or cached is True:
+                return True  # robots.txt not available or fully permissive
             
-            return self.cache[domain].can_fetch(self.user_agent, url)
+            return cached.can_fetch(self.user_agent, url)
         
         except Exception:
             # Allow on any error
             return True
     
+    def _fetch_one(self, scheme: str, domain: str):
+        """
+        Fetch and parse robots.txt for a domain and store it in the cache.
+        
+        Other threads asking for the same domain wait for this fetch instead
+        of issuing their own.
+        """
+        with self._lock:
+            fetch_lock = self._fetch_locks.setdefault(domain, threading.Lock())
+        with fetch_lock:
+            if domain not in self.cache:
+                self._fetch_uncached(scheme, domain)
+    
+    def _fetch_uncached(self, scheme: str, domain: str):
+        """Fetch and parse robots.txt for a domain (caller holds its fetch lock)."""
+        rp = urllib.robotparser.RobotFileParser()
+        rp.set_url(f"{scheme or 'https'}://{domain}/robots.txt")
+        
+        try:
+            rp.read()
+        except Exception:
+            # Allow on fetch failure (robots.txt may not exist)
+            rp = None
+        
+        if rp is not None and self._is_permissive(rp):
+            rp = True
+        
+        with self._lock:
+            self.cache[domain] = rp
+    
+    @staticmethod
+    def _is_permissive(rp: urllib.robotparser.RobotFileParser) -> bool:
+        """Return True if the parsed robots.txt cannot disallow any URL."""
+        if rp.disallow_all:
+            return False
+        if rp.allow_all:
+            return True
+        entries = list(rp.entries)
+        if rp.default_entry is not None:
+            entries.append(rp.default_entry)
+        return all(line.allowance for entry in entries for line in entry.rulelines)
+    
+    def warm(self, urls: Iterable[str], max_workers: int = 16):
+        """
+        Prefetch robots.txt for every uncached domain in urls concurrently.
+        
+        Args:
+            urls: URLs whose domains should be fetched
+            max_workers: Thread pool size
+        """
+        pending = {}
+        for url in urls:
+            try:
+                parsed = urlparse(url)
+            except Exception:
+                continue
+            if parsed.netloc and parsed.netloc not in self.cache:
+                pending.setdefault(parsed.netloc, parsed.scheme)
+        
+        if not pending:
+            return
+        
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(pending))) as ex:
+            list(ex.map(lambda item: self._fetch_one(item[1], item[0]), pending.items()))
+    
     def log_block(self, authority: str, url: str, reason: str = "disallowed by robots.txt"):
         """
         Log a blocked URL to CSV.
@@ -81,23 +179,15 @@ class RobotsChecker:
             reason: Reason for block
         """
         try:
-            os.makedirs("data/output/validation/latest", exist_ok=True)
-            csv_path = "data/output/validation/latest/robots_blocked.csv"
-            
-            file_exists = os.path.exists(csv_path)
+            if self._csv_w is None:
+                self._open_block_log()
             
-            with open(csv_path, "a", encoding="utf-8", newline="") as f:
-                writer = csv.writer(f)
-                
-                if not file_exists:
-                    writer.writerow(["authority", "url", "reason", "timestamp"])
-                
-                writer.writerow([
-                    authority or "",
-                    url,
-                    reason,
-                    datetime.now(timezone.utc).isoformat()
-                ])
+            self._csv_w.writerow([
+                authority or "",
+                url,
+                reason,
+                datetime.now(timezone.utc).isoformat()
+            ])
         
         except Exception:
             pass  # Silently fail on logging errors
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Script Environment Helpers
+
+Shared by the baseline / preflight scripts: app/.env lookups without
+exporting the whole file, and JSON output through orjson when installed.
+"""
+
+import json
+import os
+from functools import lru_cache
+
+try:
+    import orjson  # optional C JSON writer
+except ImportError:
+    orjson = None
+
+
+@lru_cache(maxsize=1)
+def _dotenv_values():
+    """Parse app/.env once, only when a variable is missing from os.environ."""
+    try:
+        from dotenv import dotenv_values
+        return dotenv_values("app/.env")
+    except Exception:
+        return {}
+
+
+def getenv(name, default=None):
+    """os.getenv() that falls back to app/.env without exporting the whole file."""
+    value = os.environ.get(name)
+    if value is None:
+        value = _dotenv_values().get(name)
+    return default if value is None else value
+
+
+def write_json(path: str, obj) -> None:
+    """Write obj as indented JSON (orjson if available, else the stdlib)."""
+    if orjson is not None:
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(obj, option=orjson.OPT_INDENT_2))
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(obj, f, indent=2)
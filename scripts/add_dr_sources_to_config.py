@@ -1,5 +1,5 @@
 #!/usr/bin/env python3
-import os, glob, json, sys, time
+import os, json, sys, time
 from urllib.parse import urlparse
 
 """
@@ -15,19 +15,22 @@ OUTPUT_DIR = os.path.join(REPO_ROOT, "data", "output")
 CONFIG_DIR = os.path.join(REPO_ROOT, "config")
 
 def latest_dr_json() -> str:
-    files = sorted(glob.glob(os.path.join(OUTPUT_DIR, "deep_research_sources_*.json")))
+    try:
+        with os.scandir(OUTPUT_DIR) as it:
+            files = [e for e in it
+                     if e.name.startswith("deep_research_sources_") and e.name.endswith(".json")]
+    except FileNotFoundError:
+        files = []
     if not files:
         raise SystemExit("No deep_research_sources_*.json found in data/output/. Run a Deep Research report first.")
     # pick latest by timestamp in filename if present; otherwise by mtime
-    def key(p):
-        base = os.path.basename(p)
+    def key(e):
         try:
-            ts = int(base.split("_")[-1].split(".")[0])
+            ts = int(e.name.rsplit("_", 1)[-1].split(".")[0])
         except Exception:
-            ts = int(os.path.getmtime(p))
+            ts = int(e.stat().st_mtime)
         return ts
-    files.sort(key=key)
-    return files[-1]
+    return max(files, key=key).path
 
 def domain(url: str) -> str:
     try:
@@ -48,13 +51,16 @@ def to_yaml(sources: list[dict]) -> str:
         name = s.get("title") or s.get("domain") or "(untitled)"
         url = s.get("url", "")
         dom = s.get("domain") or domain(url)
-        lines.append(f"  - name: \"{name.replace('"','\\\"')}\"")
-        lines.append(f"    url: {url}")
-        lines.append(f"    category: candidate")
-        lines.append(f"    # suggested: limit: 8")
-        lines.append(f"    # suggested: max_depth: 2")
-        lines.append(f"    # domain: {dom}")
-        lines.append(f"    # accessed_at: {s.get('accessed_at','')}")
+        name_esc = name.replace("\\", "\\\\").replace('"', '\\"')
+        lines.append(
+            f'  - name: "{name_esc}"\n'
+            f"    url: {url}\n"
+            f"    category: candidate\n"
+            f"    # suggested: limit: 8\n"
+            f"    # suggested: max_depth: 2\n"
+            f"    # domain: {dom}\n"
+            f"    # accessed_at: {s.get('accessed_at','')}"
+        )
     return "\n".join(lines) + "\n"
 
 def main():
@@ -2,14 +2,21 @@
 import argparse
 import csv
 import os
-import subprocess
+from collections import namedtuple
 from datetime import datetime, timezone, timedelta
 from typing import Dict, List, Tuple, Set
 from dotenv import load_dotenv
+import psycopg2
 import yaml
 
 DELIM = "|"
 
+# Positional row shape of fetch_events(); tuples avoid a dict per row
+AlertEvent = namedtuple(
+    "AlertEvent",
+    ["event_id", "ts", "authority", "title", "url", "summary_en", "source_url", "clean_text"],
+)
+
 
 def iso_utc_now() -> str:
     return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
@@ -27,57 +34,45 @@ def load_rules(path: str) -> List[Dict]:
             continue
         out.append({
             "name": str(name),
-            "match": [str(x).lower() for x in match],
+            # Encoded once so matching uses bytes search (memmem) per event
+            "match": [str(x).lower().encode("utf-8") for x in match],
             "authorities": [str(a).upper() for a in auths]
         })
     return out
 
 
-def fetch_events(db_url: str, window_hours: int) -> List[Dict]:
+def fetch_events(db_url: str, window_hours: int) -> List[AlertEvent]:
     sql = (
-        "COPY ("
-        " SELECT e.event_id, to_char(e.access_ts AT TIME ZONE 'UTC', 'YYYY-MM-DD\"T\"HH24:MI:SS\"Z\"') AS ts,"
+        "SELECT e.event_id, to_char(e.access_ts AT TIME ZONE 'UTC', 'YYYY-MM-DD\"T\"HH24:MI:SS\"Z\"') AS ts,"
         " e.authority, e.title, e.url, e.summary_en, d.source_url, d.clean_text"
         " FROM events e LEFT JOIN documents d ON d.event_id = e.event_id"
-        f" WHERE e.access_ts >= NOW() - INTERVAL '{window_hours} hours'"
+        " WHERE e.access_ts >= NOW() - %s * INTERVAL '1 hour'"
         " ORDER BY e.access_ts DESC"
-        ") TO STDOUT WITH (FORMAT CSV, DELIMITER '|', HEADER TRUE)"
     )
-    cmd = ["psql", db_url, "-v", "ON_ERROR_STOP=1", "-c", sql]
-    res = subprocess.run(cmd, check=False, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    text = res.stdout.decode("utf-8", errors="ignore")
-    rows: List[Dict] = []
-    reader = csv.DictReader(text.splitlines(), delimiter=DELIM)
-    for r in reader:
-        rows.append(r)
+    conn = psycopg2.connect(db_url)
+    try:
+        # Server-side cursor streams rows in batches instead of forking psql
+        with conn.cursor(name="alerts_events") as cur:
+            cur.itersize = 2000
+            cur.execute(sql, (window_hours,))
+            rows = [AlertEvent._make(r) for r in cur]
+    finally:
+        conn.close()
     return rows
 
 
-def run_alerts(rules_path: str, window_hours: int) -> Tuple[int, Dict[str, int]]:
-    load_dotenv("app/.env")
-    db_url = os.getenv("NEON_DATABASE_URL")
-    if not db_url:
-        raise SystemExit("NEON_DATABASE_URL not set; configure app/.env")
-    rules = load_rules(rules_path)
-    events = fetch_events(db_url, window_hours)
-
-    out_path = os.path.join("deliverables", "alerts_latest.csv")
-    os.makedirs("deliverables", exist_ok=True)
-    val_dir = os.path.join("data", "output", "validation", "latest")
-    os.makedirs(val_dir, exist_ok=True)
-    summary_path = os.path.join(val_dir, "alerts_summary.txt")
-
-    # Matching
-    alerts: List[Tuple[str, Dict]] = []
+def match_events(events: List[AlertEvent], rules: List[Dict]) -> List[Tuple[str, AlertEvent]]:
+    """Match events against rules, deduplicated per (rule, event) and sorted newest first."""
+    alerts: List[Tuple[str, AlertEvent]] = []
     seen: Set[Tuple[str, str]] = set()
     for ev in events:
-        ev_id = ev.get("id")
-        auth = (ev.get("authority") or "").upper()
+        ev_id = str(ev.event_id)
+        auth = (ev.authority or "").upper()
         hay = " ".join([
-            ev.get("title") or "",
-            ev.get("summary_en") or "",
-            ev.get("content") or "",
-        ]).lower()
+            ev.title or "",
+            ev.summary_en or "",
+            ev.clean_text or "",
+        ]).lower().encode("utf-8", "ignore")
         for rule in rules:
             if auth not in rule["authorities"]:
                 continue
@@ -89,45 +84,54 @@ def run_alerts(rules_path: str, window_hours: int) -> Tuple[int, Dict[str, int]]
                 alerts.append((rule["name"], ev))
 
     # Deterministic ordering
-    def sort_key(item: Tuple[str, Dict]):
+    def sort_key(item: Tuple[str, AlertEvent]):
         rule_name, ev = item
         return (
-            ev.get("ts") or "",
+            ev.ts or "",
             rule_name,
-            ev.get("id") or "",
+            str(ev.event_id),
         )
     alerts.sort(key=sort_key, reverse=True)
+    return alerts
+
+
+def run_alerts(rules_path: str, window_hours: int) -> Tuple[int, Dict[str, int]]:
+    load_dotenv("app/.env")
+    db_url = os.getenv("NEON_DATABASE_URL")
+    if not db_url:
+        raise SystemExit("NEON_DATABASE_URL not set; configure app/.env")
+    rules = load_rules(rules_path)
+
+    # If empty, adaptively widen window (14d, 30d). Windows are nested, so fetch
+    # and match once at the widest window and filter by timestamp per window.
+    fallback_windows = (336, 720) if window_hours == 168 else ()
+    all_events = fetch_events(db_url, fallback_windows[-1] if fallback_windows else window_hours)
+    all_alerts = match_events(all_events, rules)
+
+    out_path = os.path.join("deliverables", "alerts_latest.csv")
+    os.makedirs("deliverables", exist_ok=True)
+    val_dir = os.path.join("data", "output", "validation", "latest")
+    os.makedirs(val_dir, exist_ok=True)
+    summary_path = os.path.join(val_dir, "alerts_summary.txt")
+
+    now = datetime.now(timezone.utc)
+
+    def cutoff(hours: int) -> str:
+        # ts is rendered as YYYY-MM-DDTHH:MM:SSZ, so string order is time order
+        return (now - timedelta(hours=hours)).strftime("%Y-%m-%dT%H:%M:%SZ")
 
-    # If empty, adaptively widen window
     effective_hours = window_hours
     fallback_applied = False
-    if not alerts and window_hours == 168:
-        for nh in (336, 720):  # 14d, 30d
-            events = fetch_events(db_url, nh)
-            alerts = []
-            seen.clear()
-            for ev in events:
-                ev_id = ev.get("id")
-                auth = (ev.get("authority") or "").upper()
-                hay = " ".join([
-                    ev.get("title") or "",
-                    ev.get("summary_en") or "",
-                    ev.get("content") or "",
-                ]).lower()
-                for rule in rules:
-                    if auth not in rule["authorities"]:
-                        continue
-                    if any(k in hay for k in rule["match"]):
-                        key = (rule["name"], ev_id)
-                        if key in seen:
-                            continue
-                        seen.add(key)
-                        alerts.append((rule["name"], ev))
-            alerts.sort(key=sort_key, reverse=True)
-            if alerts:
-                effective_hours = nh
-                fallback_applied = True
-                break
+    alerts: List[Tuple[str, AlertEvent]] = []
+    for nh in (window_hours,) + fallback_windows:
+        lo = cutoff(nh)
+        alerts = [a for a in all_alerts if (a[1].ts or "") >= lo]
+        if alerts:
+            effective_hours = nh
+            fallback_applied = nh != window_hours
+            break
+    lo = cutoff(effective_hours)
+    events = [ev for ev in all_events if (ev.ts or "") >= lo]
 
     # Write CSV (final alerts set)
     written = 0
@@ -135,9 +139,9 @@ def run_alerts(rules_path: str, window_hours: int) -> Tuple[int, Dict[str, int]]
         w = csv.writer(fh, delimiter=DELIM)
         w.writerow(["rule", "ts", "authority", "title", "url", "preview_200"])
         for rule_name, ev in alerts:
-            url = ev.get("source_url") or ev.get("url") or ""
-            preview = (ev.get("content") or ev.get("summary_en") or ev.get("title") or "")[:200]
-            w.writerow([rule_name, ev.get("ts"), ev.get("authority"), ev.get("title"), url, preview])
+            url = ev.source_url or ev.url or ""
+            preview = (ev.clean_text or ev.summary_en or ev.title or "")[:200]
+            w.writerow([rule_name, ev.ts, ev.authority, ev.title, url, preview])
             written += 1
 
     # Summary
@@ -1,29 +1,97 @@
-import os, argparse, markdown, time
-from dotenv import load_dotenv
-# weasyprint imported lazily in main to allow fallback when system libs are missing
+import os, argparse, functools, hashlib, json, re, tempfile, time
+from concurrent.futures import ProcessPoolExecutor
+# markdown, dotenv and reportlab are imported on first use (build_one, _md_convert) so importing this module
+# for its helpers stays cheap; weasyprint is imported lazily (once, via _get_weasy)
+# to allow fallback when system libs are missing
 
 BRAND_BLUE = "#00205B"; BRAND_RED = "#BA0C2F"; BRAND_WHITE = "#FFFFFF"
 
-HTML_TMPL = """<html><head><meta charset="utf-8"/>{style}</head><body>
+# WeasyPrint HTML is streamed to a temp file: head, converted markdown sections, tail
+HTML_HEAD_TMPL = """<html><head><meta charset="utf-8"/>{style}</head><body>
 {watermark}
 <div class="header"><img src="{logo}" height="40"/><div class="title">{brand} — ASEAN Tech Investment Report</div></div>
 <div class="small">{domain}</div>
-{content}
-</body></html>"""
+"""
+HTML_TAIL = "</body></html>"
 
-def parse_front_matter(md: str) -> dict:
-    meta = {}
+# WeasyPrint page CSS; brand colors are filled in here, per-document values
+# ({brand}, {date_str}, {version_id}) via format_map in build_one
+_CSS_FOOTER_LEFT = "            @bottom-left {{ content: '{brand} | {date_str}'; color: %(blue)s; font-size: 9pt; }}\n"
+_CSS_COMMON = """        body {{ font-family: sans-serif; }}
+        .header .title {{ color: %(blue)s; font-weight: 700; }}
+        .small {{ color: %(blue)s; }}
+"""
+_CSS_PUBLISH = ("""
+        <style>
+        @page {{ size: A4; margin: 20mm;
+""" + _CSS_FOOTER_LEFT + """            @bottom-right {{ content: 'Page ' counter(page) ' | v{version_id}'; color: %(blue)s; font-size: 9pt; }}
+            @bottom-center {{ content: 'support@aseanforge.com'; color: %(blue)s; font-size: 8pt; }}
+        }}
+""" + _CSS_COMMON + """        </style>
+        """) % {"blue": BRAND_BLUE}
+_CSS_DRAFT = ("""
+        <style>
+        @page {{ size: A4; margin: 20mm;
+""" + _CSS_FOOTER_LEFT + """        }}
+""" + _CSS_COMMON + """        .watermark {{ position: fixed; top: 12px; right: 12px; color: %(red)s; opacity: 0.25; font-weight: 700; }}
+        </style>
+        """) % {"blue": BRAND_BLUE, "red": BRAND_RED}
+
+# Line classifier for the ReportLab block parser: one match per line, dispatch on lastgroup
+BLOCK_RE = re.compile(
+    r"^(?:(?P<h1># )|(?P<h2>## )|(?P<h3>### )"
+    r"|(?P<img>\s*!\[(?P<alt>.*?)\]\((?P<src>[^\)]+)\)\s*$))"
+)
+
+# Cached WeasyPrint HTML class: None = not probed yet, False = unavailable
+_WEASY = None
+
+
+def _get_weasy():
+    """Import weasyprint.HTML once per process; ASEANFORGE_WEASY_OK=0 skips the probe."""
+    global _WEASY
+    if _WEASY is None:
+        if os.getenv("ASEANFORGE_WEASY_OK") == "0":
+            _WEASY = False
+        else:
+            try:
+                from weasyprint import HTML
+                _WEASY = HTML
+            except Exception as we:
+                print("[warn] WeasyPrint unavailable, using ReportLab fallback:", we)
+                _WEASY = False
+    return _WEASY
+
+
+def _front_matter_end(md: str) -> int:
+    """Index of the closing '\n---' of YAML front matter, or -1 if there is none."""
     if md.startswith("---"):
-        end = md.find("\n---", 3)
-        if end != -1:
-            block = md[3:end].strip().splitlines()
-            for ln in block:
-                if ":" in ln:
-                    k, v = ln.split(":", 1)
-                    meta[k.strip()] = v.strip()
+        return md.find("\n---", 3)
+    return -1
+
+
+def _parse_meta(md: str, end: int) -> dict:
+    meta = {}
+    if end != -1:
+        block = md[3:end].strip().splitlines()
+        for ln in block:
+            if ":" in ln:
+                k, v = ln.split(":", 1)
+                meta[k.strip()] = v.strip()
     return meta
 
 
+def parse_front_matter(md: str) -> dict:
+    return _parse_meta(md, _front_matter_end(md))
+
+
+def _split_md(md: str) -> tuple[dict, list[str]]:
+    """Locate front matter once; return (meta, body lines after the front matter)."""
+    end = _front_matter_end(md)
+    start = end + 4 if end != -1 else 0
+    return _parse_meta(md, end), md[start:].splitlines()
+
+
 def slugify(text: str) -> str:
     import re as _re
     s = (text or "").lower()
@@ -50,116 +118,310 @@ def resolve_mode(cli_mode: str | None, meta: dict) -> str:
 
 
 
-def extract_first_h1(md: str) -> str | None:
-    # Skip YAML front matter if present
-    start = 0
-    if md.startswith("---"):
-        end = md.find("\n---", 3)
-        if end != -1:
-            start = end + 4
-    for ln in md[start:].splitlines():
+@functools.lru_cache(maxsize=64)
+def _image_reader_cached(path: str, mtime_ns: int):
+    from reportlab.lib.utils import ImageReader
+    return ImageReader(path)
+
+
+def _image_reader(path: str):
+    """Return a cached ReportLab ImageReader for path, or None if the file is missing.
+
+    Keyed by absolute path and mtime so a repeated logo/chart is decoded once.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return _image_reader_cached(os.path.abspath(path), st.st_mtime_ns)
+
+
+_SEP_CHARS = "-|: "
+
+
+def is_table_sep(s: str) -> bool:
+    """True for a markdown table separator row such as '|---|:--:|'."""
+    s = s.strip()
+    # strip() with a char set empties the string only if every char is in the set
+    return s.startswith("|") and s.endswith("|") and "-" in s and not s.strip(_SEP_CHARS)
+
+
+def parse_blocks(lines: list[str]) -> list[dict]:
+    """Parse markdown body lines into simple blocks (headings, images, paragraphs, tables)."""
+    blocks = []
+    i = 0
+    n = len(lines)
+    para_buf = []
+    # Share one str object per distinct table cell / image path
+    interned = {}
+    def flush_para():
+        # Fragments are stripped and non-empty, so the join needs no extra strip()
+        # copy; the buffer list is reused across paragraphs
+        if para_buf:
+            blocks.append({"type": "para", "text": " ".join(para_buf)})
+            para_buf.clear()
+    def split_row(row: str):
+        cells = []
+        for c in row.strip("|").split("|"):
+            c = c.strip()
+            cells.append(interned.setdefault(c, c))
+        return cells
+    while i < n:
+        ln = lines[i]
+        m = BLOCK_RE.match(ln)
+        if m:
+            kind = m.lastgroup
+            flush_para()
+            if kind == "img":
+                src = m.group("src")
+                blocks.append({"type": "image", "src": interned.setdefault(src, src), "alt": m.group("alt")})
+            else:
+                blocks.append({"type": kind, "text": ln[m.end():].strip()})
+            i += 1
+            continue
+        # Detect Markdown table: header row, separator, then data rows
+        if "|" in ln and i + 1 < n and is_table_sep(lines[i+1]):
+            flush_para()
+            # collect header, separator, then rows until blank or non-table
+            header_line = ln.strip()
+            i += 2
+            data_rows = []
+            while i < n and "|" in lines[i] and lines[i].strip():
+                data_rows.append(lines[i].strip())
+                i += 1
+            header_cells = split_row(header_line)
+            rows = [header_cells] + [split_row(r) for r in data_rows]
+            blocks.append({"type": "table", "rows": rows})
+            continue
+        if not ln.strip():
+            flush_para(); i += 1; continue
+        para_buf.append(ln.strip()); i += 1
+    flush_para()
+    return blocks
+
+
+# Per-(font, size) word width memo for wrap_lines, shared across documents
+_WORD_WIDTHS: dict = {}
+
+
+def wrap_lines(text: str, font_name: str, font_size: int, max_width: float):
+    """Greedy word wrap by rendered string width.
+
+    Each paragraph's words are measured once up front (memoized per (font, size))
+    and the wrap sums those widths, instead of re-measuring each growing line.
+    """
+    from reportlab.pdfbase import pdfmetrics
+    widths = _WORD_WIDTHS.setdefault((font_name, font_size), {})
+    space_w = widths.get(" ")
+    if space_w is None:
+        space_w = widths[" "] = pdfmetrics.stringWidth(" ", font_name, font_size)
+    words = text.split()
+    if not words:
+        return
+    for w in set(words).difference(widths):
+        widths[w] = pdfmetrics.stringWidth(w, font_name, font_size)
+    word_w = [widths[w] for w in words]
+    # Short paragraph: everything fits on one line
+    if sum(word_w) + space_w * (len(words) - 1) <= max_width:
+        yield " ".join(words)
+        return
+    line = []
+    line_w = 0.0
+    for w, w_w in zip(words, word_w):
+        if not line:
+            if w_w <= max_width:
+                line = [w]
+                line_w = w_w
+            else:
+                # very long single word; hard break
+                yield w
+        elif line_w + space_w + w_w <= max_width:
+            line.append(w)
+            line_w += space_w + w_w
+        else:
+            yield " ".join(line)
+            line = [w]
+            line_w = w_w
+    if line:
+        yield " ".join(line)
+
+
+WRAP_CACHE_FILE = "wrap_cache.{key}.json"
+
+
+class WrapCache:
+    """On-disk cache of wrapped paragraph lines for repeated builds of a draft.
+
+    Keyed by sha256 of (font, size, width, text). Only entries used by the
+    latest build are written back, so the file tracks the current document.
+    Each input gets its own file (batch workers never share one), and saves
+    are atomic so a reader never sees half-written JSON.
+    """
+
+    def __init__(self, cache_dir: str | None, input_path: str = ""):
+        self.path = None
+        if cache_dir:
+            key = hashlib.sha1(os.path.abspath(input_path).encode("utf-8")).hexdigest()
+            self.path = os.path.join(cache_dir, WRAP_CACHE_FILE.format(key=key))
+        self.old = {}
+        self.used = {}
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.old = json.load(f)
+            except Exception:
+                self.old = {}
+
+    def lines(self, text: str, font_name: str, font_size: int, max_width: float) -> list[str]:
+        if not self.path:
+            return list(wrap_lines(text, font_name, font_size, max_width))
+        key = hashlib.sha256(f"{font_name}|{font_size}|{max_width:.3f}|{text}".encode("utf-8")).hexdigest()
+        got = self.used.get(key) or self.old.get(key)
+        if got is None:
+            got = list(wrap_lines(text, font_name, font_size, max_width))
+        self.used[key] = got
+        return got
+
+    def save(self):
+        if not self.path or self.used == self.old:
+            return
+        tmp = None
+        try:
+            cache_dir = os.path.dirname(self.path)
+            os.makedirs(cache_dir, exist_ok=True)
+            with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=cache_dir,
+                                             suffix=".tmp", delete=False) as f:
+                tmp = f.name
+                json.dump(self.used, f)
+            os.replace(tmp, self.path)
+        except Exception:
+            if tmp and os.path.exists(tmp):
+                os.remove(tmp)
+
+
+# Reused markdown parser (extensions are set up once per process)
+_MD = None
+
+
+def _md_convert(text: str) -> str:
+    global _MD
+    if _MD is None:
+        import markdown
+        _MD = markdown.Markdown(extensions=["tables","fenced_code"])
+    return _MD.reset().convert(text)
+
+
+def extract_first_h1(body_lines: list[str]) -> str | None:
+    for ln in body_lines:
         if ln.startswith("# "):
             return ln[2:].strip()
     return None
 
-def extract_cost_line(md: str) -> str | None:
+def extract_cost_line(body_lines: list[str]) -> str | None:
     # Look for the visible cost block added right after front matter
-    start = 0
-    if md.startswith("---"):
-        end = md.find("\n---", 3)
-        if end != -1:
-            start = end + 4
-    for ln in md[start:].splitlines():
+    for ln in body_lines:
         if ln.strip().startswith("**Run Cost:**"):
             return ln.strip().strip()
     return None
 
 
-def main(input, output, logo, mode="auto"):
+def build_one(input, output, logo="assets/logo.png", mode="auto", cache_dir=None) -> str:
+    """Build one PDF from a markdown file and return the output path."""
+    from dotenv import load_dotenv
     load_dotenv(override=True)
     brand = os.getenv("BRAND_NAME","AseanForge"); domain=os.getenv("BRAND_DOMAIN","aseanforge.com")
     with open(input, "r", encoding="utf-8") as f: md = f.read()
-    meta = parse_front_matter(md)
+    meta, body_lines = _split_md(md)
     mode = resolve_mode(mode, meta)
     date_str = time.strftime("%Y-%m-%d")
     version_id = compute_version_id(meta, meta.get("topic", ""))
-    cost_line_text = extract_cost_line(md)
-
-    # Build minimal CSS and watermark for WeasyPrint path
-    style = ""
-    watermark_html = ""
-    if mode == "publish":
-        style = f"""
-        <style>
-        @page {{ size: A4; margin: 20mm;
-            @bottom-left {{ content: '{brand} | {date_str}'; color: {BRAND_BLUE}; font-size: 9pt; }}
-            @bottom-right {{ content: 'Page ' counter(page) ' | v{version_id}'; color: {BRAND_BLUE}; font-size: 9pt; }}
-            @bottom-center {{ content: 'support@aseanforge.com'; color: {BRAND_BLUE}; font-size: 8pt; }}
-        }}
-        body {{ font-family: sans-serif; }}
-        .header .title {{ color: {BRAND_BLUE}; font-weight: 700; }}
-        .small {{ color: {BRAND_BLUE}; }}
-        </style>
-        """
-    else:
-        style = f"""
-        <style>
-        @page {{ size: A4; margin: 20mm;
-            @bottom-left {{ content: '{brand} | {date_str}'; color: {BRAND_BLUE}; font-size: 9pt; }}
-        }}
-        body {{ font-family: sans-serif; }}
-        .header .title {{ color: {BRAND_BLUE}; font-weight: 700; }}
-        .small {{ color: {BRAND_BLUE}; }}
-        .watermark {{ position: fixed; top: 12px; right: 12px; color: {BRAND_RED}; opacity: 0.25; font-weight: 700; }}
-        </style>
-        """
-        watermark_html = "<div class='watermark'>DRAFT</div>"
+    cost_line_text = extract_cost_line(body_lines)
 
-    html_body = markdown.markdown(md, extensions=["tables","fenced_code"])
-    html = HTML_TMPL.format(style=style, watermark=watermark_html, logo=logo, brand=brand, domain=domain, content=html_body)
     os.makedirs(os.path.dirname(output), exist_ok=True)
-    # Try WeasyPrint first; if it fails (system libs), fall back to ReportLab
-    try:
-        from weasyprint import HTML
-        HTML(string=html, base_url=".").write_pdf(output)
-        print(f"Wrote PDF (WeasyPrint, mode={mode}): {output}")
-        return
-    except Exception as we:
-        print("[warn] WeasyPrint unavailable, using ReportLab fallback:", we)
+    # Try WeasyPrint first; if it is unavailable or fails, fall back to ReportLab
+    HTML = _get_weasy()
+    if HTML:
+        # Minimal CSS and watermark for WeasyPrint path
+        style = (_CSS_PUBLISH if mode == "publish" else _CSS_DRAFT).format_map(
+            {"brand": brand, "date_str": date_str, "version_id": version_id})
+        watermark_html = "" if mode == "publish" else "<div class='watermark'>DRAFT</div>"
+        tmp = tempfile.NamedTemporaryFile("w", suffix=".html", encoding="utf-8", delete=False)
+        try:
+            with tmp as fh:
+                fh.write(HTML_HEAD_TMPL.format(style=style, watermark=watermark_html, logo=logo, brand=brand, domain=domain))
+                # One conversion for the whole body: reference-style links and
+                # abbreviations defined in one section apply across all of them
+                fh.write(_md_convert("\n".join(body_lines)))
+                fh.write("\n")
+                fh.write(HTML_TAIL)
+            HTML(filename=tmp.name, base_url=".").write_pdf(output)
+            print(f"Wrote PDF (WeasyPrint, mode={mode}): {output}")
+            return output
+        except Exception as we:
+            print("[warn] WeasyPrint failed, using ReportLab fallback:", we)
+        finally:
+            os.unlink(tmp.name)
     try:
         from reportlab.lib.pagesizes import A4
         from reportlab.pdfgen import canvas
-        from reportlab.lib.utils import ImageReader
         from reportlab.lib.units import cm
         from reportlab.lib import colors
         from reportlab.platypus import Table, TableStyle
 
+        # Per-run constants: parse brand colors and build the table style once
+        blue = colors.HexColor(BRAND_BLUE)
+        red = colors.HexColor(BRAND_RED)
+        # One TableStyle shared by every table; Table.setStyle only reads its commands
+        table_style = TableStyle([
+            ("BACKGROUND", (0,0), (-1,0), blue),
+            ("TEXTCOLOR", (0,0), (-1,0), colors.white),
+            ("FONTNAME", (0,0), (-1,0), "Helvetica-Bold"),
+            ("FONTSIZE", (0,0), (-1,-1), 9),
+            ("ALIGN", (0,0), (-1,-1), "LEFT"),
+            ("GRID", (0,0), (-1,-1), 0.5, blue),
+            ("ROWBACKGROUNDS", (0,1), (-1,-1), [colors.whitesmoke, colors.HexColor("#F7F9FC")]),
+            ("LEFTPADDING", (0,0), (-1,-1), 6), ("RIGHTPADDING", (0,0), (-1,-1), 6),
+            ("TOPPADDING", (0,0), (-1,-1), 4), ("BOTTOMPADDING", (0,0), (-1,-1), 4),
+        ])
+
+        # Last (font, size, fill) set by the block loop; cleared whenever something
+        # else (header, table) may have changed canvas state
+        pen = []
+        def set_pen(c, font_name: str, font_size: int, fill):
+            state = (font_name, font_size, fill)
+            if pen != [state]:
+                c.setFont(font_name, font_size)
+                c.setFillColor(fill)
+                pen[:] = [state]
+
         def draw_header(c):
+            pen.clear()
             W, H = A4
             y = H - 2*cm
             # Logo
             try:
-                if os.path.exists(logo):
-                    c.drawImage(ImageReader(logo), 2*cm, y-1.2*cm, width=3.5*cm, height=1.2*cm, mask='auto')
+                ir = _image_reader(logo)
+                if ir:
+                    c.drawImage(ir, 2*cm, y-1.2*cm, width=3.5*cm, height=1.2*cm, mask='auto')
             except Exception:
                 pass
             # Brand header
             c.setFont("Helvetica-Bold", 14)
-            c.setFillColor(colors.HexColor(BRAND_BLUE))
+            c.setFillColor(blue)
             c.drawString(6*cm, y-0.5*cm, f"{brand} — ASEAN Tech Investment Report")
             c.setFont("Helvetica", 9)
             c.drawString(6*cm, y-1.0*cm, domain)
             # Draft watermark (subtle, corner)
             if mode == "draft":
                 c.setFont("Helvetica-Bold", 10)
-                c.setFillColor(colors.HexColor(BRAND_RED))
+                c.setFillColor(red)
                 c.drawRightString(W - 2*cm, y-0.5*cm, "DRAFT")
             return y - 2.2*cm
 
         def draw_footer(c, page_offset: int = 0, include_page_num: bool = True):
             W, _ = A4
             c.setFont("Helvetica", 9)
-            c.setFillColor(colors.HexColor(BRAND_BLUE))
+            c.setFillColor(blue)
             # Left footer: brand + date
             c.drawString(2*cm, 1.5*cm, f"{brand} | {date_str}")
             # Second line: support contact
@@ -180,13 +442,14 @@ def main(input, output, logo, mode="auto"):
         def draw_cover(c, title_text: str):
             # Logo centered near top
             try:
-                if os.path.exists(logo):
+                ir = _image_reader(logo)
+                if ir:
                     logo_w = 6*cm; logo_h = 2*cm
-                    c.drawImage(ImageReader(logo), (W - logo_w)/2, H - 5*cm, width=logo_w, height=logo_h, mask='auto')
+                    c.drawImage(ir, (W - logo_w)/2, H - 5*cm, width=logo_w, height=logo_h, mask='auto')
             except Exception:
                 pass
             # Title and date in brand colors
-            c.setFillColor(colors.HexColor(BRAND_BLUE))
+            c.setFillColor(blue)
             c.setFont("Helvetica-Bold", 24)
             c.drawCentredString(W/2, H/2 + 2*cm, title_text)
             c.setFont("Helvetica", 12)
@@ -194,15 +457,15 @@ def main(input, output, logo, mode="auto"):
             # Cost line under date, if available
             if cost_line_text:
                 c.setFont("Helvetica", 10)
-                c.setFillColor(colors.HexColor(BRAND_BLUE))
+                c.setFillColor(blue)
                 c.drawCentredString(W/2, H/2, cost_line_text)
             # Draft watermark visible on cover
             if mode == "draft":
                 c.setFont("Helvetica-Bold", 14)
-                c.setFillColor(colors.HexColor(BRAND_RED))
+                c.setFillColor(red)
                 c.drawRightString(W - 2*cm, H - 2*cm, "DRAFT")
 
-        title_text = extract_first_h1(md) or "ASEAN Tech Investment Report"
+        title_text = extract_first_h1(body_lines) or "ASEAN Tech Investment Report"
         page_offset = 1  # start numbering from content pages
         draw_cover(c, title_text)
         # Footer on cover without page number
@@ -215,108 +478,25 @@ def main(input, output, logo, mode="auto"):
         right = 2*cm
         content_w = W - left - right
 
-        import re as _re
-        IMG_RE = _re.compile(r"^!\[(?P<alt>.*?)\]\((?P<src>[^\)]+)\)\s*$")
-
-        # Parse markdown into simple blocks (headings, images, paragraphs, tables)
-        def parse_blocks(md_text: str):
-            # skip YAML front matter
-            start = 0
-            if md_text.startswith("---"):
-                end = md_text.find("\n---", 3)
-                if end != -1:
-                    start = end + 4
-            lines = md_text[start:].splitlines()
-            blocks = []
-            i = 0
-            para_buf = []
-            def flush_para():
-                nonlocal para_buf
-                if para_buf:
-                    blocks.append({"type": "para", "text": " ".join(para_buf).strip()})
-                    para_buf = []
-            def is_table_sep(s: str) -> bool:
-                s = s.strip()
-                return s.startswith("|") and s.endswith("|") and set(s.replace("|"," ").replace(" ", "").replace(":","-")).issubset(set("-"))
-            while i < len(lines):
-                ln = lines[i]
-                m = IMG_RE.match(ln.strip())
-                if m:
-                    flush_para()
-                    blocks.append({"type": "image", "src": m.group("src"), "alt": m.group("alt")})
-                    i += 1
-                    continue
-                if ln.startswith("# "):
-                    flush_para(); blocks.append({"type": "h1", "text": ln[2:].strip()}); i += 1; continue
-                if ln.startswith("## "):
-                    flush_para(); blocks.append({"type": "h2", "text": ln[3:].strip()}); i += 1; continue
-                if ln.startswith("### "):
-                    flush_para(); blocks.append({"type": "h3", "text": ln[4:].strip()}); i += 1; continue
-                # Detect Markdown table: header row, separator, then data rows
-                if "|" in ln and i + 1 < len(lines) and is_table_sep(lines[i+1]):
-                    flush_para()
-                    # collect header, separator, then rows until blank or non-table
-                    header_line = ln.strip()
-                    sep_line = lines[i+1].strip()
-                    i += 2
-                    data_rows = []
-                    while i < len(lines) and "|" in lines[i] and lines[i].strip():
-                        data_rows.append(lines[i].strip())
-                        i += 1
-                    def split_row(row: str):
-                        cells = [c.strip() for c in row.strip("|").split("|")]
-                        return cells
-                    header_cells = split_row(header_line)
-                    rows = [header_cells] + [split_row(r) for r in data_rows]
-                    blocks.append({"type": "table", "rows": rows})
-                    continue
-                if not ln.strip():
-                    flush_para(); i += 1; continue
-                para_buf.append(ln.strip()); i += 1
-            flush_para()
-            return blocks
-
-        # Word wrap utility using string width
-        from reportlab.pdfbase import pdfmetrics
-        def wrap_lines(text: str, font_name: str, font_size: int, max_width: float):
-            words = text.split()
-            line = ""
-            for w in words:
-                candidate = (line + (" " if line else "") + w)
-                if pdfmetrics.stringWidth(candidate, font_name, font_size) <= max_width:
-                    line = candidate
-                else:
-                    if line:
-                        yield line
-                        line = w
-                    else:
-                        # very long single word; hard break
-                        yield w
-                        line = ""
-            if line:
-                yield line
-
-        blocks = parse_blocks(md)
+        blocks = parse_blocks(body_lines)
+        wrap_cache = WrapCache(cache_dir, input)
         for blk in blocks:
             if blk["type"] == "h1":
-                c.setFillColor(colors.HexColor(BRAND_BLUE))
-                c.setFont("Helvetica-Bold", 18)
+                set_pen(c, "Helvetica-Bold", 18, blue)
                 y -= 8
                 c.drawString(left, y, blk["text"]) ; y -= 22
             elif blk["type"] == "h2":
-                c.setFillColor(colors.black)
-                c.setFont("Helvetica-Bold", 14)
+                set_pen(c, "Helvetica-Bold", 14, colors.black)
                 y -= 6
                 c.drawString(left, y, blk["text"]) ; y -= 18
             elif blk["type"] == "h3":
-                c.setFillColor(colors.black)
-                c.setFont("Helvetica-Bold", 12)
+                set_pen(c, "Helvetica-Bold", 12, colors.black)
                 y -= 4
                 c.drawString(left, y, blk["text"]) ; y -= 14
             elif blk["type"] == "image":
                 try:
-                    if os.path.exists(blk["src"]):
-                        ir = ImageReader(blk["src"])
+                    ir = _image_reader(blk["src"])
+                    if ir:
                         iw, ih = ir.getSize()
                         scale = min(content_w / float(iw), 1.0)
                         dw, dh = iw * scale, ih * scale
@@ -328,8 +508,7 @@ def main(input, output, logo, mode="auto"):
                         y -= (dh + 10)
                     else:
                         # missing image placeholder text
-                        c.setFillColor(colors.red)
-                        c.setFont("Helvetica-Oblique", 10)
+                        set_pen(c, "Helvetica-Oblique", 10, colors.red)
                         c.drawString(left, y, f"[Image not found: {blk['src']}]")
                         y -= 14
                 except Exception:
@@ -342,48 +521,70 @@ def main(input, output, logo, mode="auto"):
                         ncols = max(1, len(data[0]))
                         col_w = content_w / ncols
                         tbl = Table(data, colWidths=[col_w]*ncols)
-                        ts = TableStyle([
-                            ("BACKGROUND", (0,0), (-1,0), colors.HexColor(BRAND_BLUE)),
-                            ("TEXTCOLOR", (0,0), (-1,0), colors.white),
-                            ("FONTNAME", (0,0), (-1,0), "Helvetica-Bold"),
-                            ("FONTSIZE", (0,0), (-1,-1), 9),
-                            ("ALIGN", (0,0), (-1,-1), "LEFT"),
-                            ("GRID", (0,0), (-1,-1), 0.5, colors.HexColor(BRAND_BLUE)),
-                            ("ROWBACKGROUNDS", (0,1), (-1,-1), [colors.whitesmoke, colors.HexColor("#F7F9FC")]),
-                            ("LEFTPADDING", (0,0), (-1,-1), 6), ("RIGHTPADDING", (0,0), (-1,-1), 6),
-                            ("TOPPADDING", (0,0), (-1,-1), 4), ("BOTTOMPADDING", (0,0), (-1,-1), 4),
-                        ])
-                        tbl.setStyle(ts)
+                        tbl.setStyle(table_style)
                         w, h = tbl.wrap(content_w, y)
                         if y - h < 2.5*cm:
                             draw_footer(c, page_offset=page_offset, include_page_num=True)
                             c.showPage(); y = draw_header(c)
                         tbl.drawOn(c, left, y - h)
+                        pen.clear()
                         y -= (h + 12)
                 except Exception:
                     pass
             else:  # paragraph
-                c.setFillColor(colors.black)
-                c.setFont("Times-Roman", 10)
-                for ln in wrap_lines(blk.get("text", ""), "Times-Roman", 10, content_w):
+                set_pen(c, "Times-Roman", 10, colors.black)
+                for ln in wrap_cache.lines(blk.get("text", ""), "Times-Roman", 10, content_w):
                     if y < 2.5*cm:
                         draw_footer(c, page_offset=page_offset, include_page_num=True)
                         c.showPage(); y = draw_header(c)
-                        c.setFont("Times-Roman", 10); c.setFillColor(colors.black)
+                        set_pen(c, "Times-Roman", 10, colors.black)
                     c.drawString(left, y, ln); y -= 14
                 y -= 6  # paragraph spacing
 
         draw_footer(c, page_offset=page_offset, include_page_num=True)
         c.showPage()
         c.save()
+        wrap_cache.save()
         print(f"Wrote PDF (ReportLab, mode={mode}): {output}")
+        return output
     except Exception as rl:
         raise SystemExit(f"Failed to build PDF with both WeasyPrint and ReportLab fallback: {rl}")
 
+
+def main(input, output, logo, mode="auto", cache_dir=None):
+    return build_one(input, output, logo, mode=mode, cache_dir=cache_dir)
+
+
+def _warm_imports():
+    """ProcessPoolExecutor initializer: pay the PDF engine imports once per worker."""
+    if not _get_weasy():
+        import reportlab.pdfgen.canvas  # noqa: F401
+        import reportlab.platypus  # noqa: F401
+
+
+def build_many(jobs: list[dict], max_workers: int | None = None) -> list[str]:
+    """Build several PDFs in parallel; each job holds build_one() keyword arguments."""
+    with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count(), initializer=_warm_imports) as ex:
+        futures = [ex.submit(build_one, **job) for job in jobs]
+        return [f.result() for f in futures]
+
 if __name__ == "__main__":
     ap = argparse.ArgumentParser()
-    ap.add_argument("--input", required=True); ap.add_argument("--output", required=True)
+    ap.add_argument("--input"); ap.add_argument("--output")
     ap.add_argument("--logo", default="assets/logo.png")
     ap.add_argument("--mode", choices=["auto","draft","publish"], default="auto", help="auto=read from YAML front matter; or override explicitly")
-    main(**vars(ap.parse_args()))
+    ap.add_argument("--cache-dir", default=None, help="Reuse wrapped paragraph lines across rebuilds (ReportLab path), e.g. .cache/build_pdf")
+    ap.add_argument("--batch", default=None, help="JSON manifest: list of {input, output[, logo, mode]} built in parallel")
+    ap.add_argument("--workers", type=int, default=None, help="Worker processes for --batch (default: CPU count)")
+    args = ap.parse_args()
+    if args.batch:
+        with open(args.batch, "r", encoding="utf-8") as f:
+            jobs = json.load(f)
+        for job in jobs:
+            job.setdefault("logo", args.logo); job.setdefault("mode", args.mode); job.setdefault("cache_dir", args.cache_dir)
+        build_many(jobs, args.workers)
+    else:
+        if not (args.input and args.output):
+            ap.error("--input and --output are required unless --batch is given")
+        main(args.input, args.output, args.logo, mode=args.mode, cache_dir=args.cache_dir)
 
@@ -9,6 +9,7 @@ Usage:
 """
 
 import argparse
+import io
 import os
 import sys
 from datetime import datetime, timezone
@@ -38,10 +39,6 @@ def main():
     if args.authorities:
         authorities = [a.strip().upper() for a in args.authorities.split(",")]
     
-    # Connect to database
-    conn = psycopg2.connect(os.getenv("NEON_DATABASE_URL"))
-    cur = conn.cursor()
-    
     # Build WHERE clause
     where_clauses = []
     params = []
@@ -57,8 +54,53 @@ def main():
     
     where_sql = " AND ".join(where_clauses) if where_clauses else "1=1"
     
-    # Open output file
-    with open(args.output, "w", encoding="utf-8") as f:
+    # Single round trip: filter events once, aggregate events and documents per
+    # authority from the same CTE; overall stats are derived from these rows
+    conn = psycopg2.connect(os.getenv("NEON_DATABASE_URL"))
+    cur = conn.cursor(name="baseline")
+    cur.execute(f"""
+        WITH f AS (
+            SELECT event_id, authority, summary_en, summary_model,
+                   embedding IS NOT NULL AS has_embedding, embedding_model, pub_date
+            FROM events
+            WHERE {where_sql}
+        ), ev AS (
+            SELECT 
+                authority,
+                COUNT(*) AS total_events,
+                COUNT(summary_en) AS events_with_summary,
+                ROUND(100.0 * COUNT(summary_en) / NULLIF(COUNT(*), 0), 1) AS pct_summary,
+                COUNT(DISTINCT summary_model) AS summary_models,
+                COUNT(*) FILTER (WHERE has_embedding) AS events_with_embedding,
+                MIN(pub_date) AS earliest_pub_date,
+                MAX(pub_date) AS latest_pub_date
+            FROM f
+            GROUP BY authority
+        ), docs AS (
+            SELECT 
+                f.authority,
+                COUNT(DISTINCT d.document_id) AS total_docs,
+                COUNT(DISTINCT d.document_id) FILTER (WHERE f.has_embedding) AS docs_with_vectors,
+                ROUND(100.0 * COUNT(DISTINCT d.document_id) FILTER (WHERE f.has_embedding) / NULLIF(COUNT(DISTINCT d.document_id), 0), 1) AS pct_vectors,
+                COUNT(DISTINCT f.embedding_model) AS embedding_models
+            FROM documents d
+            JOIN f ON f.event_id = d.event_id
+            GROUP BY f.authority
+        )
+        SELECT ev.authority, ev.total_events, ev.events_with_summary, ev.pct_summary, ev.summary_models,
+               ev.events_with_embedding, ev.earliest_pub_date, ev.latest_pub_date,
+               docs.total_docs, docs.docs_with_vectors, docs.pct_vectors, docs.embedding_models
+        FROM ev
+        LEFT JOIN docs ON docs.authority IS NOT DISTINCT FROM ev.authority
+        ORDER BY ev.authority;
+    """, params)
+    rows = cur.fetchall()
+    # Everything below is formatting; release the connection now
+    cur.close()
+    conn.close()
+    
+    # Build the report in memory and write it with a single call
+    with io.StringIO() as f:
         f.write(f"=== Baseline Database Counts ===\n")
         f.write(f"Timestamp: {datetime.now(timezone.utc).isoformat()}\n")
         if authorities:
@@ -67,65 +109,41 @@ def main():
             f.write(f"Since: {args.since}\n")
         f.write("\n")
         
-        # Query 1: Summary coverage by authority
+        # Summary coverage by authority
         f.write("## Summary Coverage by Authority\n\n")
-        
-        cur.execute(f"""
-            SELECT 
-                authority,
-                COUNT(*) AS total_events,
-                COUNT(summary_en) AS events_with_summary,
-                ROUND(100.0 * COUNT(summary_en) / NULLIF(COUNT(*), 0), 1) AS pct_summary,
-                COUNT(DISTINCT summary_model) AS models_used
-            FROM events
-            WHERE {where_sql}
-            GROUP BY authority
-            ORDER BY authority;
-        """, params)
-        
-        rows = cur.fetchall()
-        
         f.write("| Authority | Total Events | With Summary | % Summary | Models Used |\n")
         f.write("|-----------|--------------|--------------|-----------|-------------|\n")
         
         total_events = 0
         total_with_summary = 0
+        total_with_embedding = 0
+        earliest = latest = None
         
-        for auth, total, with_summary, pct, models in rows:
+        for auth, total, with_summary, pct, models, with_embedding, first, last, *_ in rows:
             f.write(f"| {auth} | {total:,} | {with_summary:,} | {pct or 0:.1f}% | {models or 0} |\n")
             total_events += total
             total_with_summary += with_summary or 0
-        
-        overall_pct = round(100.0 * total_with_summary / total_events, 1) if total_events > 0 else 0
-        f.write(f"| **TOTAL** | **{total_events:,}** | **{total_with_summary:,}** | **{overall_pct:.1f}%** | - |\n")
+            total_with_embedding += with_embedding or 0
+            if first and (earliest is None or first < earliest):
+                earliest = first
+            if last and (latest is None or last > latest):
+                latest = last
+        
+        summary_pct = round(100.0 * total_with_summary / total_events, 1) if total_events > 0 else 0
+        f.write(f"| **TOTAL** | **{total_events:,}** | **{total_with_summary:,}** | **{summary_pct:.1f}%** | - |\n")
         f.write("\n")
         
-        # Query 2: Embedding coverage by authority
+        # Embedding coverage by authority (authorities with documents only)
         f.write("## Embedding Coverage by Authority\n\n")
-        
-        cur.execute(f"""
-            SELECT 
-                e.authority,
-                COUNT(DISTINCT d.document_id) AS total_docs,
-                COUNT(DISTINCT CASE WHEN e.embedding IS NOT NULL THEN d.document_id END) AS docs_with_vectors,
-                ROUND(100.0 * COUNT(DISTINCT CASE WHEN e.embedding IS NOT NULL THEN d.document_id END) / NULLIF(COUNT(DISTINCT d.document_id), 0), 1) AS pct_vectors,
-                COUNT(DISTINCT e.embedding_model) AS models_used
-            FROM documents d
-            JOIN events e ON e.event_id = d.event_id
-            WHERE {where_sql}
-            GROUP BY e.authority
-            ORDER BY e.authority;
-        """, params)
-        
-        rows = cur.fetchall()
-        
         f.write("| Authority | Total Docs | With Vectors | % Vectors | Models Used |\n")
         f.write("|-----------|------------|--------------|-----------|-------------|\n")
         
         total_docs = 0
         total_with_vectors = 0
         
-        for auth, total, with_vectors, pct, models in rows:
+        for auth, *_, total, with_vectors, pct, models in rows:
+            if total is None:
+                continue
             f.write(f"| {auth} | {total:,} | {with_vectors:,} | {pct or 0:.1f}% | {models or 0} |\n")
             total_docs += total
             total_with_vectors += with_vectors or 0
@@ -134,30 +152,20 @@ def main():
         f.write(f"| **TOTAL** | **{total_docs:,}** | **{total_with_vectors:,}** | **{overall_pct:.1f}%** | - |\n")
         f.write("\n")
         
-        # Query 3: Overall stats
+        # Overall stats
         f.write("## Overall Statistics\n\n")
         
-        cur.execute(f"""
-            SELECT 
-                COUNT(*) AS total_events,
-                COUNT(summary_en) AS events_with_summary,
-                COUNT(embedding) AS events_with_embedding,
-                MIN(pub_date) AS earliest_pub_date,
-                MAX(pub_date) AS latest_pub_date
-            FROM events
-            WHERE {where_sql};
-        """, params)
-        
-        total, with_summary, with_embedding, earliest, latest = cur.fetchone()
-        
+        total = total_events
         f.write(f"- Total Events: {total:,}\n")
-        f.write(f"- Events with Summary: {with_summary:,} ({round(100.0 * with_summary / total, 1) if total > 0 else 0:.1f}%)\n")
-        f.write(f"- Events with Embedding: {with_embedding:,} ({round(100.0 * with_embedding / total, 1) if total > 0 else 0:.1f}%)\n")
+        f.write(f"- Events with Summary: {total_with_summary:,} ({round(100.0 * total_with_summary / total, 1) if total > 0 else 0:.1f}%)\n")
+        f.write(f"- Events with Embedding: {total_with_embedding:,} ({round(100.0 * total_with_embedding / total, 1) if total > 0 else 0:.1f}%)\n")
         if earliest and latest:
             f.write(f"- Date Range: {earliest.strftime('%Y-%m-%d')} to {latest.strftime('%Y-%m-%d')}\n")
         f.write("\n")
+        report = f.getvalue()
     
-    conn.close()
+    with open(args.output, "w", encoding="utf-8") as out:
+        out.write(report)
     
     print(f"✓ Baseline counts saved to: {args.output}")
     
@@ -165,7 +173,7 @@ def main():
     print()
     print("Summary:")
     print(f"  Total Events: {total_events:,}")
-    print(f"  Events with Summary: {total_with_summary:,} ({overall_pct:.1f}%)")
+    print(f"  Events with Summary: {total_with_summary:,} ({summary_pct:.1f}%)")
     print(f"  Total Documents: {total_docs:,}")
     print(f"  Documents with Vectors: {total_with_vectors:,}")
 
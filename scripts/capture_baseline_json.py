@@ -2,7 +2,7 @@
 """
 Capture Baseline Metrics for Coverage Gap Closure Pipeline
 
-Queries database for all 13 authorities and captures:
+Queries database for all 13 authorities (one aggregate round-trip) and captures:
 - Total events count
 - Events with non-NULL summary_en
 - Events with non-NULL summary_model
@@ -12,22 +12,24 @@ Queries database for all 13 authorities and captures:
 
 Saves to baseline_counts.json with per-authority breakdown and global totals.
 
+Requires the events_unique_hash index (migrate_add_enrichment_columns.py) and
+the coverage indexes idx_documents_qualifying / idx_events_pub_date
+(migrate_add_coverage_indexes.py); fails fast if any are missing.
+
 Usage:
     .venv/bin/python scripts/capture_baseline_json.py
 """
 
+import io
 import os
 import sys
-import json
 from datetime import datetime, timezone
 
-try:
-    from dotenv import load_dotenv
-    load_dotenv("app/.env")
-except Exception:
-    pass
-
 import psycopg2
+from psycopg2.extras import RealDictCursor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from app.script_env import getenv, write_json
 
 
 AUTHORITIES = [
@@ -37,184 +39,176 @@ AUTHORITIES = [
 ]
 
 
+# Created by scripts/migrate_add_coverage_indexes.py
+REQUIRED_INDEXES = ("idx_documents_qualifying", "idx_events_pub_date")
+
+# Created by scripts/migrate_add_enrichment_columns.py
+ENRICHMENT_COLUMNS = (
+    "summary_model", "summary_ts", "summary_version",
+    "embedding_model", "embedding_ts", "embedding_version",
+)
+
+METRIC_COLUMNS = (
+    "total_events", "events_with_summary", "events_with_summary_model",
+    "events_with_embedding", "events_with_embedding_model", "total_documents",
+    "docs_with_embedding", "docs_with_embedding_model", "events_without_docs",
+)
+
+
+PCT_COLUMNS = (
+    "summary_coverage_pct", "summary_model_coverage_pct",
+    "doc_coverage_pct", "embedding_model_coverage_pct",
+)
+
+
+def _metrics(row):
+    """Build the baseline metrics dict (counts + coverage %) from one aggregate row."""
+    return {col: (row[col] if row else 0) for col in METRIC_COLUMNS + PCT_COLUMNS}
+
+
 def main():
+    # One snapshot time for every artifact this run writes
+    now_iso = datetime.now(timezone.utc).isoformat()
     output_path = "data/output/validation/latest/baseline_counts.json"
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
     
     try:
-        conn = psycopg2.connect(os.getenv("NEON_DATABASE_URL"))
-        cur = conn.cursor()
+        conn = psycopg2.connect(getenv("NEON_DATABASE_URL"))
+        cur = conn.cursor(cursor_factory=RealDictCursor)
         
         # Verify schema elements
         print("Verifying database schema...")
         
-        # Check unique index
+        # Unique index, coverage indexes and enrichment columns in one round-trip
         cur.execute("""
-            SELECT indexname 
-            FROM pg_indexes 
-            WHERE tablename = 'events' 
-              AND indexname = 'events_unique_hash';
-        """)
-        if not cur.fetchone():
+            SELECT 
+                EXISTS (
+                    SELECT 1 FROM pg_indexes 
+                    WHERE tablename = 'events' 
+                      AND indexname = 'events_unique_hash'
+                ) AS unique_index_ok,
+                ARRAY(
+                    SELECT c.relname::text FROM pg_index i
+                    JOIN pg_class c ON c.oid = i.indexrelid
+                    WHERE c.relname = ANY(%s) AND i.indisvalid
+                ) AS coverage_indexes,
+                ARRAY(
+                    SELECT column_name::text FROM information_schema.columns 
+                    WHERE table_name = 'events' 
+                      AND column_name = ANY(%s)
+                ) AS enrichment_cols;
+        """, (list(REQUIRED_INDEXES), list(ENRICHMENT_COLUMNS)))
+        schema = cur.fetchone()
+        
+        if not schema["unique_index_ok"]:
             print("❌ FAIL: Unique index 'events_unique_hash' not found")
             sys.exit(1)
         print("  ✓ Unique index 'events_unique_hash' exists")
         
-        # Check enrichment columns
-        cur.execute("""
-            SELECT column_name 
-            FROM information_schema.columns 
-            WHERE table_name = 'events' 
-              AND column_name IN ('summary_model', 'summary_ts', 'summary_version', 
-                                  'embedding_model', 'embedding_ts', 'embedding_version');
-        """)
-        enrichment_cols = [row[0] for row in cur.fetchall()]
-        if len(enrichment_cols) != 6:
-            print(f"❌ FAIL: Expected 6 enrichment columns, found {len(enrichment_cols)}")
+        # Coverage metric indexes (scripts/migrate_add_coverage_indexes.py)
+        # coverage_indexes only lists valid ones: a failed CONCURRENTLY build
+        # leaves an INVALID index the planner never uses
+        missing_indexes = [name for name in REQUIRED_INDEXES if name not in schema["coverage_indexes"]]
+        if missing_indexes:
+            print(f"❌ FAIL: Missing or invalid indexes {', '.join(missing_indexes)} "
+                  "(run scripts/migrate_add_coverage_indexes.py)")
+            sys.exit(1)
+        print(f"  ✓ Coverage indexes exist and are valid ({', '.join(REQUIRED_INDEXES)})")
+        
+        enrichment_cols = schema["enrichment_cols"]
+        if len(enrichment_cols) != len(ENRICHMENT_COLUMNS):
+            print(f"❌ FAIL: Expected {len(ENRICHMENT_COLUMNS)} enrichment columns, found {len(enrichment_cols)}")
             sys.exit(1)
-        print("  ✓ All 6 enrichment columns exist")
+        print(f"  ✓ All {len(ENRICHMENT_COLUMNS)} enrichment columns exist")
         
         # Capture metrics
         print("\nCapturing baseline metrics...")
         
         baseline = {
-            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "timestamp": now_iso,
             "authorities": {},
             "global": {}
         }
         
-        # Per-authority metrics
-        for authority in AUTHORITIES:
-            cur.execute("""
-                SELECT 
+        # Per-authority and global metrics in one round-trip: ROLLUP adds the
+        # all-events row (authority IS NULL) alongside the per-authority rows,
+        # and coverage percentages are computed set-wise in the same SELECT.
+        # docs LEFT JOINs events so the global row counts every document,
+        # including orphans with no matching event (Step 0 reports those);
+        # orphans fall into the NULL-authority group, which is not reported.
+        cur.execute("""
+            WITH ev AS (
+                SELECT
+                    e.authority,
                     COUNT(*) AS total_events,
-                    COUNT(summary_en) AS events_with_summary,
-                    COUNT(summary_model) AS events_with_summary_model,
-                    COUNT(embedding) AS events_with_embedding,
-                    COUNT(embedding_model) AS events_with_embedding_model
-                FROM events
-                WHERE authority = %s;
-            """, (authority,))
-            
-            total, with_summary, with_summary_model, with_embedding, with_embedding_model = cur.fetchone()
-            
-            # Count documents
-            cur.execute("""
-                SELECT COUNT(DISTINCT d.document_id)
-                FROM documents d
-                JOIN events e ON e.event_id = d.event_id
-                WHERE e.authority = %s;
-            """, (authority,))
-            total_docs = cur.fetchone()[0]
-            
-            # Count documents with embeddings
-            cur.execute("""
-                SELECT COUNT(DISTINCT d.document_id)
-                FROM documents d
-                JOIN events e ON e.event_id = d.event_id
-                WHERE e.authority = %s
-                  AND e.embedding IS NOT NULL;
-            """, (authority,))
-            docs_with_embedding = cur.fetchone()[0]
-            
-            # Count documents with embedding_model
-            cur.execute("""
-                SELECT COUNT(DISTINCT d.document_id)
-                FROM documents d
-                JOIN events e ON e.event_id = d.event_id
-                WHERE e.authority = %s
-                  AND e.embedding_model IS NOT NULL;
-            """, (authority,))
-            docs_with_embedding_model = cur.fetchone()[0]
-            
-            # Count events with zero documents
-            cur.execute("""
-                SELECT COUNT(*)
+                    COUNT(e.summary_en) AS events_with_summary,
+                    COUNT(e.summary_model) AS events_with_summary_model,
+                    COUNT(e.embedding) AS events_with_embedding,
+                    COUNT(e.embedding_model) AS events_with_embedding_model,
+                    COUNT(*) FILTER (
+                        WHERE NOT EXISTS (SELECT 1 FROM documents d WHERE d.event_id = e.event_id)
+                    ) AS events_without_docs,
+                    GROUPING(e.authority) AS is_global
                 FROM events e
-                WHERE e.authority = %s
-                  AND NOT EXISTS (
-                      SELECT 1 FROM documents d WHERE d.event_id = e.event_id
-                  );
-            """, (authority,))
-            events_without_docs = cur.fetchone()[0]
-            
-            baseline["authorities"][authority] = {
-                "total_events": total,
-                "events_with_summary": with_summary,
-                "events_with_summary_model": with_summary_model,
-                "events_with_embedding": with_embedding,
-                "events_with_embedding_model": with_embedding_model,
-                "total_documents": total_docs,
-                "docs_with_embedding": docs_with_embedding,
-                "docs_with_embedding_model": docs_with_embedding_model,
-                "events_without_docs": events_without_docs,
-                "summary_coverage_pct": round(100.0 * with_summary / total, 2) if total > 0 else 0,
-                "summary_model_coverage_pct": round(100.0 * with_summary_model / total, 2) if total > 0 else 0,
-                "doc_coverage_pct": round(100.0 * (total - events_without_docs) / total, 2) if total > 0 else 0,
-                "embedding_model_coverage_pct": round(100.0 * docs_with_embedding_model / total_docs, 2) if total_docs > 0 else 0
-            }
-        
-        # Global totals
-        cur.execute("""
-            SELECT 
-                COUNT(*) AS total_events,
-                COUNT(summary_en) AS events_with_summary,
-                COUNT(summary_model) AS events_with_summary_model,
-                COUNT(embedding) AS events_with_embedding,
-                COUNT(embedding_model) AS events_with_embedding_model
-            FROM events;
+                GROUP BY ROLLUP (e.authority)
+            ), docs AS (
+                SELECT
+                    e.authority,
+                    COUNT(*) AS total_documents,
+                    COUNT(*) FILTER (WHERE e.embedding IS NOT NULL) AS docs_with_embedding,
+                    COUNT(*) FILTER (WHERE e.embedding_model IS NOT NULL) AS docs_with_embedding_model,
+                    GROUPING(e.authority) AS is_global
+                FROM documents d
+                LEFT JOIN events e ON e.event_id = d.event_id
+                GROUP BY ROLLUP (e.authority)
+            )
+            SELECT
+                ev.*,
+                COALESCE(docs.total_documents, 0) AS total_documents,
+                COALESCE(docs.docs_with_embedding, 0) AS docs_with_embedding,
+                COALESCE(docs.docs_with_embedding_model, 0) AS docs_with_embedding_model,
+                COALESCE(ROUND(100.0 * ev.events_with_summary / NULLIF(ev.total_events, 0), 2), 0)::float8
+                    AS summary_coverage_pct,
+                COALESCE(ROUND(100.0 * ev.events_with_summary_model / NULLIF(ev.total_events, 0), 2), 0)::float8
+                    AS summary_model_coverage_pct,
+                COALESCE(ROUND(100.0 * (ev.total_events - ev.events_without_docs) / NULLIF(ev.total_events, 0), 2), 0)::float8
+                    AS doc_coverage_pct,
+                COALESCE(ROUND(100.0 * docs.docs_with_embedding_model / NULLIF(docs.total_documents, 0), 2), 0)::float8
+                    AS embedding_model_coverage_pct
+            FROM ev
+            LEFT JOIN docs
+              ON docs.is_global = ev.is_global
+             AND docs.authority IS NOT DISTINCT FROM ev.authority;
         """)
         
-        total, with_summary, with_summary_model, with_embedding, with_embedding_model = cur.fetchone()
-        
-        cur.execute("SELECT COUNT(*) FROM documents;")
-        total_docs = cur.fetchone()[0]
-        
-        cur.execute("SELECT COUNT(*) FROM documents d JOIN events e ON e.event_id = d.event_id WHERE e.embedding IS NOT NULL;")
-        docs_with_embedding = cur.fetchone()[0]
-        
-        cur.execute("SELECT COUNT(*) FROM documents d JOIN events e ON e.event_id = d.event_id WHERE e.embedding_model IS NOT NULL;")
-        docs_with_embedding_model = cur.fetchone()[0]
+        by_authority = {}
+        global_row = None
+        for row in cur.fetchall():
+            if row["is_global"]:
+                global_row = row
+            else:
+                by_authority[row["authority"]] = row
         
-        cur.execute("""
-            SELECT COUNT(*)
-            FROM events e
-            WHERE NOT EXISTS (
-                SELECT 1 FROM documents d WHERE d.event_id = e.event_id
-            );
-        """)
-        events_without_docs = cur.fetchone()[0]
-        
-        baseline["global"] = {
-            "total_events": total,
-            "events_with_summary": with_summary,
-            "events_with_summary_model": with_summary_model,
-            "events_with_embedding": with_embedding,
-            "events_with_embedding_model": with_embedding_model,
-            "total_documents": total_docs,
-            "docs_with_embedding": docs_with_embedding,
-            "docs_with_embedding_model": docs_with_embedding_model,
-            "events_without_docs": events_without_docs,
-            "summary_coverage_pct": round(100.0 * with_summary / total, 2) if total > 0 else 0,
-            "summary_model_coverage_pct": round(100.0 * with_summary_model / total, 2) if total > 0 else 0,
-            "doc_coverage_pct": round(100.0 * (total - events_without_docs) / total, 2) if total > 0 else 0,
-            "embedding_model_coverage_pct": round(100.0 * docs_with_embedding_model / total_docs, 2) if total_docs > 0 else 0
-        }
+        for authority in AUTHORITIES:
+            baseline["authorities"][authority] = _metrics(by_authority.get(authority))
+        baseline["global"] = _metrics(global_row)
         
         # Save to JSON
-        with open(output_path, "w", encoding="utf-8") as f:
-            json.dump(baseline, f, indent=2)
+        write_json(output_path, baseline)
         
         conn.close()
         
-        print(f"\n✓ Baseline counts saved to: {output_path}")
-        print(f"\nGlobal Summary:")
-        print(f"  Total Events: {baseline['global']['total_events']}")
-        print(f"  Events with Summary: {baseline['global']['events_with_summary']} ({baseline['global']['summary_coverage_pct']}%)")
-        print(f"  Events with Summary Model: {baseline['global']['events_with_summary_model']} ({baseline['global']['summary_model_coverage_pct']}%)")
-        print(f"  Total Documents: {baseline['global']['total_documents']}")
-        print(f"  Docs with Embedding Model: {baseline['global']['docs_with_embedding_model']} ({baseline['global']['embedding_model_coverage_pct']}%)")
-        print(f"  Events without Docs: {baseline['global']['events_without_docs']}")
+        g = baseline["global"]
+        summary = io.StringIO()
+        summary.write(f"\n✓ Baseline counts saved to: {output_path}\n")
+        summary.write("\nGlobal Summary:\n")
+        summary.write(f"  Total Events: {g['total_events']}\n")
+        summary.write(f"  Events with Summary: {g['events_with_summary']} ({g['summary_coverage_pct']}%)\n")
+        summary.write(f"  Events with Summary Model: {g['events_with_summary_model']} ({g['summary_model_coverage_pct']}%)\n")
+        summary.write(f"  Total Documents: {g['total_documents']}\n")
+        summary.write(f"  Docs with Embedding Model: {g['docs_with_embedding_model']} ({g['embedding_model_coverage_pct']}%)\n")
+        summary.write(f"  Events without Docs: {g['events_without_docs']}\n")
+        sys.stdout.write(summary.getvalue())
         
         return 0
         
@@ -225,12 +219,15 @@ def main():
         blockers_path = "data/output/validation/latest/blockers.md"
         os.makedirs(os.path.dirname(blockers_path), exist_ok=True)
         
+        report = (
+            "# Step 0: Baseline Metrics - FAILED\n\n"
+            f"**Timestamp**: {now_iso}\n\n"
+            f"**Error**: {str(e)}\n\n"
+            "## Details\n\n"
+            "Database connectivity or schema verification failed.\n"
+        )
         with open(blockers_path, "w", encoding="utf-8") as f:
-            f.write("# Step 0: Baseline Metrics - FAILED\n\n")
-            f.write(f"**Timestamp**: {datetime.now(timezone.utc).isoformat()}\n\n")
-            f.write(f"**Error**: {str(e)}\n\n")
-            f.write("## Details\n\n")
-            f.write("Database connectivity or schema verification failed.\n")
+            f.write(report)
         
         print(f"\n❌ Blockers documented in: {blockers_path}")
         return 1
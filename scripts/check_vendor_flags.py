@@ -1,23 +1,49 @@
 #!/usr/bin/env python3
+import json
 import os
 from datetime import datetime, timezone
-from dotenv import load_dotenv
 import yaml
 
+try:
+    from yaml import CSafeLoader as SafeLoader  # libyaml-backed parser
+except ImportError:
+    from yaml import SafeLoader
+
 OUT_PATH = os.path.join("data","output","validation","latest","vendor_flags.txt")
 CFG_PATH = os.path.join("configs","vendor_overrides.yaml")
+CFG_CACHE_PATH = CFG_PATH + ".cache.json"
+
+
+def load_cfg():
+    """Parse CFG_PATH, reusing a JSON copy keyed on (mtime_ns, size) when unchanged."""
+    st = os.stat(CFG_PATH)
+    key = [st.st_mtime_ns, st.st_size]
+    try:
+        with open(CFG_CACHE_PATH, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+        if cached.get("key") == key:
+            return cached.get("cfg") or {}
+    except (OSError, ValueError):
+        pass
+    with open(CFG_PATH, "r", encoding="utf-8") as f:
+        cfg = yaml.load(f, Loader=SafeLoader) or {}
+    try:
+        with open(CFG_CACHE_PATH, "w", encoding="utf-8") as f:
+            json.dump({"key": key, "cfg": cfg}, f)
+    except (OSError, TypeError, ValueError):
+        pass  # cache is best-effort; non-JSON values just skip it
+    return cfg
+
 
 def main():
-    load_dotenv("app/.env")  # no prints
     os.makedirs(os.path.dirname(OUT_PATH), exist_ok=True)
     bnm = {"unlock": False}
     kom = {"unlock": False}
     if os.path.exists(CFG_PATH):
         try:
-            with open(CFG_PATH, "r", encoding="utf-8") as f:
-                cfg = yaml.safe_load(f) or {}
-                bnm = dict(cfg.get("bnm") or bnm)
-                kom = dict(cfg.get("kominfo") or kom)
+            cfg = load_cfg()
+            bnm = dict(cfg.get("bnm") or bnm)
+            kom = dict(cfg.get("kominfo") or kom)
         except Exception:
             pass
     now = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
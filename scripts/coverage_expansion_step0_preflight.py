@@ -3,111 +3,125 @@
 Coverage Expansion Step 0: Preflight & Baseline
 
 Purpose: Establish baseline metrics and validate environment before expansion
+
+Indexes: the metric queries expect idx_documents_qualifying (partial index on
+documents(event_id) for clean_text >= 400 chars) and idx_events_pub_date; create
+them with scripts/migrate_add_coverage_indexes.py.
 """
 
-import json
+import io
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone, timedelta
-from decimal import Decimal
 from typing import Dict, List
 
-try:
-    from dotenv import load_dotenv
-    load_dotenv("app/.env")
-except Exception:
-    pass
-
 import psycopg2
 from psycopg2.extras import RealDictCursor
 
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from app.script_env import getenv, write_json
+
 OUTPUT_DIR = "data/output/validation/latest"
 BASELINE_FILE = os.path.join(OUTPUT_DIR, "expansion_baseline.json")
+FRESHNESS_WINDOWS = (7, 30, 90)
+LAGGARD_DOC_PCT = 75.0
 
 
 def get_db():
     """Get database connection."""
-    db_url = os.getenv("NEON_DATABASE_URL")
+    db_url = getenv("NEON_DATABASE_URL")
     if not db_url:
         raise RuntimeError("NEON_DATABASE_URL not set in app/.env")
     return psycopg2.connect(db_url)
 
 
-def compute_baseline_metrics():
-    """Compute comprehensive baseline metrics."""
-    conn = get_db()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    
-    # Global metrics
-    cur.execute("""
-        SELECT 
-            COUNT(*) as total_events,
-            COUNT(DISTINCT CASE WHEN d.clean_text IS NOT NULL AND LENGTH(d.clean_text) >= 400 THEN e.event_id END) as events_with_docs,
-            COUNT(DISTINCT CASE WHEN e.summary_en IS NOT NULL THEN e.event_id END) as events_with_summary,
-            COUNT(DISTINCT CASE WHEN e.embedding IS NOT NULL THEN e.event_id END) as events_with_embedding,
-            ROUND(100.0 * COUNT(DISTINCT CASE WHEN d.clean_text IS NOT NULL AND LENGTH(d.clean_text) >= 400 THEN e.event_id END) / COUNT(*), 2) as doc_completeness_pct,
-            ROUND(100.0 * COUNT(DISTINCT CASE WHEN e.summary_en IS NOT NULL THEN e.event_id END) / COUNT(*), 2) as summary_coverage_pct,
-            ROUND(100.0 * COUNT(DISTINCT CASE WHEN e.embedding IS NOT NULL THEN e.event_id END) / COUNT(*), 2) as embedding_coverage_pct
-        FROM events e
-        LEFT JOIN documents d ON d.event_id = e.event_id
-    """)
-    global_metrics = dict(cur.fetchone())
+def compute_baseline_metrics(conn, now):
+    """Compute comprehensive baseline metrics on an open connection as of `now`."""
+    # Server-side cursor: rows are consumed straight off the cursor below
+    cur = conn.cursor(name='baseline_auth', cursor_factory=RealDictCursor)
     
-    # Per-authority metrics
-    cur.execute("""
-        SELECT 
-            e.authority,
-            COUNT(*) as total_events,
-            COUNT(DISTINCT CASE WHEN d.clean_text IS NOT NULL AND LENGTH(d.clean_text) >= 400 THEN e.event_id END) as events_with_docs,
-            COUNT(DISTINCT CASE WHEN e.summary_en IS NOT NULL THEN e.event_id END) as events_with_summary,
-            COUNT(DISTINCT CASE WHEN e.embedding IS NOT NULL THEN e.event_id END) as events_with_embedding,
-            ROUND(100.0 * COUNT(DISTINCT CASE WHEN d.clean_text IS NOT NULL AND LENGTH(d.clean_text) >= 400 THEN e.event_id END) / COUNT(*), 2) as doc_completeness_pct,
-            ROUND(100.0 * COUNT(DISTINCT CASE WHEN e.summary_en IS NOT NULL THEN e.event_id END) / COUNT(*), 2) as summary_coverage_pct,
-            ROUND(100.0 * COUNT(DISTINCT CASE WHEN e.embedding IS NOT NULL THEN e.event_id END) / COUNT(*), 2) as embedding_coverage_pct
-        FROM events e
-        LEFT JOIN documents d ON d.event_id = e.event_id
-        GROUP BY e.authority
-        ORDER BY e.authority
-    """)
-    authority_metrics = {row['authority']: dict(row) for row in cur.fetchall()}
-    
-    # Freshness metrics (7, 30, 90 days)
-    now = datetime.now(timezone.utc)
-    freshness_windows = [7, 30, 90]
-    freshness_metrics = {}
-    
-    for days in freshness_windows:
-        since_date = now - timedelta(days=days)
-        cur.execute("""
+    # Global, per-authority and freshness (7/30/90 days) metrics in one pass:
+    # the events/documents join is collapsed to one row per event (so plain
+    # COUNT(*) FILTER replaces COUNT(DISTINCT ...)) and rolled up via
+    # GROUPING SETS; freshness windows are nested so they are FILTERed columns
+    # on the global row rather than disjoint buckets.
+    params = {f"since_{days}": now - timedelta(days=days) for days in FRESHNESS_WINDOWS}
+    freshness_cols = "".join(f"""
+            COUNT(*) FILTER (WHERE pub_date >= %(since_{days})s) as total_events_{days}d,
+            COUNT(*) FILTER (WHERE has_doc AND pub_date >= %(since_{days})s) as events_with_docs_{days}d,
+            COALESCE(ROUND(100.0 * COUNT(*) FILTER (WHERE has_doc AND pub_date >= %(since_{days})s)
+                  / NULLIF(COUNT(*) FILTER (WHERE pub_date >= %(since_{days})s), 0), 2), 0)::float8 as doc_completeness_pct_{days}d,"""
+        for days in FRESHNESS_WINDOWS)
+    cur.execute(f"""
+        WITH per_event AS (
             SELECT 
-                COUNT(*) as total_events,
-                COUNT(DISTINCT CASE WHEN d.clean_text IS NOT NULL AND LENGTH(d.clean_text) >= 400 THEN e.event_id END) as events_with_docs,
-                ROUND(100.0 * COUNT(DISTINCT CASE WHEN d.clean_text IS NOT NULL AND LENGTH(d.clean_text) >= 400 THEN e.event_id END) / COUNT(*), 2) as doc_completeness_pct
+                e.event_id,
+                e.authority,
+                e.pub_date,
+                bool_or(e.summary_en IS NOT NULL) as has_summary,
+                bool_or(e.embedding IS NOT NULL) as has_embedding,
+                COALESCE(bool_or(d.clean_text IS NOT NULL AND LENGTH(d.clean_text) >= 400), false) as has_doc
             FROM events e
             LEFT JOIN documents d ON d.event_id = e.event_id
-            WHERE e.pub_date >= %s
-        """, (since_date,))
-        freshness_metrics[f"{days}d"] = dict(cur.fetchone())
-    
-    # Identify laggards (doc completeness < 75%)
-    laggards = []
-    for authority, metrics in authority_metrics.items():
-        if metrics['doc_completeness_pct'] < 75.0:
-            laggards.append({
-                'authority': authority,
-                'doc_completeness_pct': metrics['doc_completeness_pct'],
-                'total_events': metrics['total_events'],
-                'events_with_docs': metrics['events_with_docs']
-            })
+            GROUP BY e.event_id, e.authority, e.pub_date
+        ), totals AS (
+            SELECT 
+                GROUPING(authority) = 1 as is_global,
+                authority,{freshness_cols}
+                COUNT(*) as total_events,
+                COUNT(*) FILTER (WHERE has_doc) as events_with_docs,
+                COUNT(*) FILTER (WHERE has_summary) as events_with_summary,
+                COUNT(*) FILTER (WHERE has_embedding) as events_with_embedding,
+                ROUND(100.0 * COUNT(*) FILTER (WHERE has_doc) / COUNT(*), 2)::float8 as doc_completeness_pct,
+                ROUND(100.0 * COUNT(*) FILTER (WHERE has_summary) / COUNT(*), 2)::float8 as summary_coverage_pct,
+                ROUND(100.0 * COUNT(*) FILTER (WHERE has_embedding) / COUNT(*), 2)::float8 as embedding_coverage_pct
+            FROM per_event
+            GROUP BY GROUPING SETS ((), (authority))
+        )
+        SELECT 
+            totals.*,
+            -- Laggards (doc completeness < 75%), ranked by volume so
+            -- high-volume authorities come first
+            CASE WHEN NOT is_global AND doc_completeness_pct < %(laggard_pct)s
+                 THEN row_number() OVER (
+                     PARTITION BY NOT is_global AND doc_completeness_pct < %(laggard_pct)s
+                     ORDER BY total_events DESC, authority)
+            END as laggard_rank
+        FROM totals
+        ORDER BY is_global DESC, authority
+    """, {**params, 'laggard_pct': LAGGARD_DOC_PCT})
     
-    # Sort laggards by total events (prioritize high-volume authorities)
-    laggards.sort(key=lambda x: x['total_events'], reverse=True)
+    metric_keys = ('total_events', 'events_with_docs', 'events_with_summary', 'events_with_embedding',
+                   'doc_completeness_pct', 'summary_coverage_pct', 'embedding_coverage_pct')
+    global_metrics = {}
+    freshness_metrics = {}
+    authority_metrics = {}
+    laggard_slots = {}
+    for row in cur:
+        if row['is_global']:
+            global_metrics = {k: row[k] for k in metric_keys}
+            for days in FRESHNESS_WINDOWS:
+                freshness_metrics[f"{days}d"] = {
+                    'total_events': row[f'total_events_{days}d'],
+                    'events_with_docs': row[f'events_with_docs_{days}d'],
+                    'doc_completeness_pct': row[f'doc_completeness_pct_{days}d'],
+                }
+        else:
+            authority_metrics[row['authority']] = {'authority': row['authority'], **{k: row[k] for k in metric_keys}}
+            if row['laggard_rank']:
+                laggard_slots[row['laggard_rank']] = {
+                    'authority': row['authority'],
+                    'doc_completeness_pct': row['doc_completeness_pct'],
+                    'total_events': row['total_events'],
+                    'events_with_docs': row['events_with_docs']
+                }
+    laggards = [laggard_slots[rank] for rank in range(1, len(laggard_slots) + 1)]
     
     cur.close()
-    conn.close()
     
     return {
-        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'timestamp': now.isoformat(),
         'global': global_metrics,
         'by_authority': authority_metrics,
         'freshness': freshness_metrics,
@@ -115,25 +129,23 @@ def compute_baseline_metrics():
     }
 
 
-def validate_environment():
-    """Validate environment and SDK configurations."""
-    issues = []
-    
-    # Check required environment variables
-    required_vars = [
-        'NEON_DATABASE_URL',
-        'FIRECRAWL_API_KEY',
-        'OPENAI_API_KEY',
-        'SUMMARY_MODEL',
-        'EMBED_MODEL',
-        'ROBOTS_UA'
-    ]
-    
-    for var in required_vars:
-        if not os.getenv(var):
-            issues.append(f"Missing environment variable: {var}")
-    
-    # Test database connection
+REQUIRED_ENV_VARS = (
+    'NEON_DATABASE_URL',
+    'FIRECRAWL_API_KEY',
+    'OPENAI_API_KEY',
+    'SUMMARY_MODEL',
+    'EMBED_MODEL',
+    'ROBOTS_UA'
+)
+
+
+def _check_env_vars() -> List[str]:
+    """Check required environment variables."""
+    return [f"Missing environment variable: {var}" for var in REQUIRED_ENV_VARS if not getenv(var)]
+
+
+def _check_db() -> List[str]:
+    """Test database connection."""
     try:
         conn = get_db()
         cur = conn.cursor()
@@ -141,34 +153,73 @@ def validate_environment():
         cur.close()
         conn.close()
     except Exception as e:
-        issues.append(f"Database connection failed: {e}")
-    
-    # Test Firecrawl SDK
+        return [f"Database connection failed: {e}"]
+    return []
+
+
+def _check_firecrawl() -> List[str]:
+    """
+    Test Firecrawl REST access the way Step 2 uses it (requests + Bearer key).
+
+    Only an auth rejection or an unreachable API is an issue; other statuses
+    from the lightweight credit-usage probe are not treated as failures.
+    """
+    api_key = getenv('FIRECRAWL_API_KEY')
+    if not api_key:
+        return []  # Reported by _check_env_vars
     try:
-        from firecrawl import FirecrawlApp
-        fc = FirecrawlApp(api_key=os.getenv('FIRECRAWL_API_KEY'))
-        # Test signature (should have wait_for parameter)
-        import inspect
-        sig = inspect.signature(fc.scrape)
-        if 'wait_for' not in sig.parameters:
-            issues.append("Firecrawl SDK appears to be v1 (need v2 with wait_for parameter)")
+        import requests
+        api_url = getenv('FIRECRAWL_API_URL', 'https://api.firecrawl.dev').rstrip('/')
+        response = requests.get(
+            f"{api_url}/v2/team/credit-usage",
+            headers={"Authorization": f"Bearer {api_key}"},
+            timeout=10,
+        )
     except Exception as e:
-        issues.append(f"Firecrawl SDK validation failed: {e}")
-    
-    # Test OpenAI SDK
+        return [f"Firecrawl API validation failed: {e}"]
+    if response.status_code in (401, 403):
+        return [f"Firecrawl API rejected FIRECRAWL_API_KEY (HTTP {response.status_code})"]
+    return []
+
+
+def _check_openai() -> List[str]:
+    """Test OpenAI SDK batch API support (module check; no client is built)."""
     try:
-        import openai
-        client = openai.OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-        # Test that we can access the client
-        if not hasattr(client, 'batches'):
-            issues.append("OpenAI SDK missing batch API support")
+        import openai  # noqa: F401
     except Exception as e:
-        issues.append(f"OpenAI SDK validation failed: {e}")
+        return [f"OpenAI SDK validation failed: {e}"]
+    try:
+        import openai.resources.batches  # noqa: F401
+    except ImportError:
+        return ["OpenAI SDK missing batch API support"]
+    return []
+
+
+def validate_environment():
+    """Validate environment and SDK configurations."""
+    issues = _check_env_vars()
+    
+    # The DB handshake, the Firecrawl API probe and the OpenAI SDK import are
+    # independent and I/O / import bound, so overlap them; each check returns
+    # its own issue list
+    checks = (_check_db, _check_firecrawl, _check_openai)
+    with ThreadPoolExecutor(max_workers=len(checks)) as pool:
+        futures = {pool.submit(check): idx for idx, check in enumerate(checks)}
+        results = [[] for _ in checks]
+        for fut in as_completed(futures):
+            results[futures[fut]] = fut.result()
+    
+    # Report in a stable order regardless of completion order
+    for check_issues in results:
+        issues.extend(check_issues)
     
     return issues
 
 
 def main():
+    # One snapshot time for the baseline timestamp and freshness windows
+    now = datetime.now(timezone.utc)
+    
     print("=" * 60)
     print("COVERAGE EXPANSION STEP 0: Preflight & Baseline")
     print("=" * 60)
@@ -190,65 +241,23 @@ def main():
     
     # Compute baseline metrics
     print("Computing baseline metrics...")
+    conn = None
     try:
-        baseline = compute_baseline_metrics()
+        # One connection serves both the baseline metrics and the sanity checks
+        conn = get_db()
+        baseline = compute_baseline_metrics(conn, now)
         
         # Ensure output directory exists
         os.makedirs(OUTPUT_DIR, exist_ok=True)
         
-        # Write baseline file (convert Decimal to float for JSON serialization)
-        def decimal_to_float(obj):
-            if isinstance(obj, Decimal):
-                return float(obj)
-            elif isinstance(obj, dict):
-                return {k: decimal_to_float(v) for k, v in obj.items()}
-            elif isinstance(obj, list):
-                return [decimal_to_float(v) for v in obj]
-            return obj
-
-        baseline_serializable = decimal_to_float(baseline)
-
-        with open(BASELINE_FILE, 'w') as f:
-            json.dump(baseline_serializable, f, indent=2)
+        # Write baseline file (percentages are float8 from SQL, so no Decimal
+        # conversion pass is needed)
+        write_json(BASELINE_FILE, baseline)
         
         print(f"  ✓ Baseline metrics saved to {BASELINE_FILE}")
         print()
 
         # Sanity checks: zero-doc and short-doc counts by authority, FK & duplicates
-        conn = get_db()
-        cur = conn.cursor()
-
-        cur.execute("""
-            WITH per_event AS (
-              SELECT e.event_id, e.authority,
-                     COALESCE(MAX(LENGTH(d.clean_text)), 0) AS max_len
-              FROM events e
-              LEFT JOIN documents d ON d.event_id = e.event_id
-              GROUP BY e.event_id, e.authority
-            )
-            SELECT authority,
-                   COUNT(*) FILTER (WHERE max_len = 0) AS zero_doc_events,
-                   COUNT(*) FILTER (WHERE max_len > 0 AND max_len < 400) AS short_doc_events
-            FROM per_event
-            GROUP BY authority
-            ORDER BY authority
-        """)
-        rows = cur.fetchall()
-
-        cur.execute("""
-            SELECT COUNT(*)
-            FROM documents d
-            LEFT JOIN events e ON e.event_id = d.event_id
-            WHERE e.event_id IS NULL
-        """)
-        orphan_docs = cur.fetchone()[0]
-
-        cur.execute("""
-            SELECT (COUNT(*) - COUNT(DISTINCT source_url))
-            FROM documents
-            WHERE source_url IS NOT NULL AND source_url <> ''
-        """)
-        duplicate_source_urls = cur.fetchone()[0]
 
         # Diagnosis note
         diagnosis = (
@@ -256,30 +265,68 @@ def main():
             "which often already had qualifying docs (>=400 chars). Switching to zero-doc/short-doc (<400) focus."
         )
 
-        # Write sanity findings
+        # Build sanity findings in memory (the per-authority table rows are
+        # rendered in SQL and COPYed straight from libpq into the buffer),
+        # then write the file in one go
+        buf = io.StringIO()
+        buf.write("# Sanity Findings\n\n")
+        buf.write("## Zero-doc and Short-doc Events by Authority\n\n")
+        buf.write("authority | zero_doc_events | short_doc_events\n")
+        buf.write("---|---:|---:\n")
+        cur = conn.cursor()
+        cur.copy_expert("""
+            COPY (
+                WITH per_event AS (
+                  SELECT e.event_id, e.authority,
+                         COALESCE(MAX(LENGTH(d.clean_text)), 0) AS max_len
+                  FROM events e
+                  LEFT JOIN documents d ON d.event_id = e.event_id
+                  GROUP BY e.event_id, e.authority
+                )
+                SELECT concat_ws(' | ',
+                                 COALESCE(authority, ''),
+                                 COUNT(*) FILTER (WHERE max_len = 0),
+                                 COUNT(*) FILTER (WHERE max_len > 0 AND max_len < 400))
+                FROM per_event
+                GROUP BY authority
+                ORDER BY authority
+            ) TO STDOUT
+        """, buf)
+
+        # Both integrity counts in one round-trip
+        cur.execute("""
+            SELECT
+                (SELECT COUNT(*)
+                 FROM documents d
+                 LEFT JOIN events e ON e.event_id = d.event_id
+                 WHERE e.event_id IS NULL),
+                (SELECT (COUNT(*) - COUNT(DISTINCT source_url))
+                 FROM documents
+                 WHERE source_url IS NOT NULL AND source_url <> '')
+        """)
+        orphan_docs, duplicate_source_urls = cur.fetchone()
+
+        buf.write("\n## Integrity Checks\n\n")
+        buf.write(f"Orphan documents (no matching event): {orphan_docs}\n\n")
+        buf.write(f"Duplicate source_url entries: {duplicate_source_urls}\n\n")
+        buf.write("## Diagnosis\n\n")
+        buf.write(diagnosis)
+
         os.makedirs(OUTPUT_DIR, exist_ok=True)
         sanity_path = os.path.join(OUTPUT_DIR, "sanity_findings.md")
         with open(sanity_path, 'w') as fmd:
-            fmd.write("# Sanity Findings\n\n")
-            fmd.write("## Zero-doc and Short-doc Events by Authority\n\n")
-            fmd.write("authority | zero_doc_events | short_doc_events\n")
-            fmd.write("---|---:|---:\n")
-            for r in rows:
-                fmd.write(f"{r[0]} | {r[1]} | {r[2]}\n")
-            fmd.write("\n## Integrity Checks\n\n")
-            fmd.write(f"Orphan documents (no matching event): {orphan_docs}\n\n")
-            fmd.write(f"Duplicate source_url entries: {duplicate_source_urls}\n\n")
-            fmd.write("## Diagnosis\n\n")
-            fmd.write(diagnosis)
+            fmd.write(buf.getvalue())
 
         cur.close()
-        conn.close()
         print(f"  ✓ Sanity findings saved to {sanity_path}")
         print()
 
     except Exception as e:
         print(f"✗ Failed to compute baseline metrics: {e}")
         sys.exit(1)
+    finally:
+        if conn is not None:
+            conn.close()
 
     # Display summary
     global_metrics = baseline['global']
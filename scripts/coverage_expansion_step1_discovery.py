@@ -6,16 +6,34 @@ Purpose: Discover URLs from sitemaps and listings for lagging authorities
 """
 
 import csv
+import gzip
+import io
 import json
 import os
+import re
+import sqlite3
 import sys
-import time
+import threading
 import requests
 import xml.etree.ElementTree as ET
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime, timezone, timedelta
-from typing import Dict, List, Set
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
 from urllib.parse import urljoin, urlparse
-from bs4 import BeautifulSoup
+from xml.sax.saxutils import unescape as xml_unescape
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    from selectolax.lexbor import LexborHTMLParser  # optional fast HTML parser
+except ImportError:
+    LexborHTMLParser = None
+
+try:
+    import ciso8601  # optional C ISO-8601 parser
+except ImportError:
+    ciso8601 = None
 
 try:
     from dotenv import load_dotenv
@@ -24,7 +42,7 @@ except Exception:
     pass
 
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
 
 # Import robots checker
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
@@ -33,6 +51,37 @@ from app.robots_checker import RobotsChecker
 OUTPUT_DIR = "data/output/validation/latest"
 BASELINE_FILE = os.path.join(OUTPUT_DIR, "expansion_baseline.json")
 DISCOVERED_URLS_CSV = os.path.join(OUTPUT_DIR, "discovered_urls.csv")
+DISCOVERED_COLUMNS = ['authority', 'url', 'lastmod', 'source', 'in_sitemap']
+
+# Sitemap/listing bodies kept for conditional (ETag / Last-Modified) refetch
+HTTP_CACHE_PATH = "data/cache/discovery_http.sqlite"
+# Completed sitemap/listing fetches of an unfinished run (removed on success)
+CHECKPOINT_PATH = os.path.join(OUTPUT_DIR, "discovery_checkpoint.jsonl")
+# A checkpoint from a run started longer ago than this is discarded, not resumed
+CHECKPOINT_MAX_AGE_HOURS = 12
+
+# Politeness: at most this many in-flight requests per host
+HOST_CONCURRENCY = 2
+FETCH_WORKERS = 16
+
+# Cap on sitemap files (index + children) fetched per authority
+MAX_SITEMAPS_PER_AUTHORITY = 200
+
+# Max pattern-generated URLs kept per authority
+PATTERN_URL_LIMIT = 100
+
+# Common date path segments (last 2 years), in generation order
+PATTERN_DATE_SUFFIXES = tuple(
+    suffix
+    for year in (2023, 2024, 2025)
+    for month in range(1, 13)
+    for suffix in (f"{year}/{month:02d}/", f"{year}-{month:02d}/", f"{year}{month:02d}/")
+)
+
+# Listing links worth following (news, press releases, etc.)
+LISTING_KEYWORDS_RE = re.compile(
+    r'news|press|release|announcement|circular|regulation|guideline|speech|statement'
+)
 
 # Authority sitemap/feed configurations
 AUTHORITY_CONFIGS = {
@@ -137,6 +186,211 @@ def get_db():
     return psycopg2.connect(db_url)
 
 
+_host_slots: Dict[str, threading.BoundedSemaphore] = {}
+_host_slots_lock = threading.Lock()
+
+
+def _host_slot(url: str) -> threading.BoundedSemaphore:
+    """Return the per-host semaphore bounding concurrent requests to url's host."""
+    netloc = urlparse(url).netloc
+    with _host_slots_lock:
+        slot = _host_slots.get(netloc)
+        if slot is None:
+            slot = _host_slots[netloc] = threading.BoundedSemaphore(HOST_CONCURRENCY)
+    return slot
+
+
+def make_session() -> requests.Session:
+    """Shared HTTP session (keep-alive connection pool) for all discovery fetches."""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=64, pool_maxsize=HOST_CONCURRENCY)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['User-Agent'] = os.getenv('ROBOTS_UA', 'AseanForgeBot/1.0')
+    return session
+
+
+class ResponseCache:
+    """
+    On-disk (SQLite) store of response bodies and their validators.
+
+    Lets reruns send If-None-Match / If-Modified-Since and reuse the stored
+    body on 304. Safe to share between fetch threads.
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS http_cache (
+                    url TEXT PRIMARY KEY,
+                    etag TEXT,
+                    last_modified TEXT,
+                    body BLOB NOT NULL
+                )
+            """)
+
+    def lookup(self, url: str) -> Optional[Tuple[Optional[str], Optional[str], bytes]]:
+        """Return (etag, last_modified, body) for url, or None if not cached."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT etag, last_modified, body FROM http_cache WHERE url = ?", (url,)
+            ).fetchone()
+
+    def store(self, url: str, headers, body: bytes) -> None:
+        """Remember body if the response carried a validator."""
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+        if not etag and not last_modified:
+            return
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO http_cache (url, etag, last_modified, body) VALUES (?, ?, ?, ?)",
+                (url, etag, last_modified, body),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+# Set by main(); None disables conditional requests
+_http_cache: Optional[ResponseCache] = None
+
+
+class DiscoveryCheckpoint:
+    """
+    Append-only JSONL log of completed sitemap and listing fetches.
+
+    A rerun after a crash replays these results instead of refetching. The
+    first line is a header with the run's start time; a checkpoint older than
+    CHECKPOINT_MAX_AGE_HOURS (or without a header) is discarded so a later
+    run refetches. Each further line is one fetch; torn or malformed lines
+    are ignored on load.
+    """
+
+    def __init__(self, path: str, max_age_hours: float = CHECKPOINT_MAX_AGE_HOURS):
+        self.path = path
+        self._lock = threading.Lock()
+        self._done: Dict[Tuple[str, str], Tuple[List[Dict], List[str]]] = {}
+        self.stale = False
+        line = ''
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                started_at = self._read_header(f.readline())
+                cutoff = datetime.now(timezone.utc) - timedelta(hours=max_age_hours)
+                if started_at is None or started_at < cutoff:
+                    self.stale = True
+                else:
+                    for line in f:
+                        self._load_record(line)
+            if self.stale:
+                os.remove(path)
+                line = ''
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        is_new = not os.path.exists(path)
+        self._fh = open(path, 'a', encoding='utf-8')
+        if is_new:
+            header = {'started_at': datetime.now(timezone.utc).isoformat()}
+            self._fh.write(json.dumps(header) + '\n')
+            self._fh.flush()
+        elif line and not line.endswith('\n'):
+            # Terminate a torn line so the next record starts cleanly
+            self._fh.write('\n')
+
+    @staticmethod
+    def _read_header(line: str) -> Optional[datetime]:
+        """Run start time from the header line, or None if it is missing/invalid."""
+        try:
+            started_at = datetime.fromisoformat(json.loads(line)['started_at'])
+        except (ValueError, TypeError, KeyError):
+            return None
+        if started_at.tzinfo is None:
+            started_at = started_at.replace(tzinfo=timezone.utc)
+        return started_at
+
+    def _load_record(self, line: str) -> None:
+        """Restore one fetch record; incomplete or malformed records are skipped."""
+        try:
+            rec = json.loads(line)
+            kind, url, discovered = rec['kind'], rec['url'], rec['discovered']
+            children = list(rec.get('children') or [])
+            for item in discovered:
+                if item.get('lastmod'):
+                    item['lastmod'] = parse_lastmod(item['lastmod'])
+        except (ValueError, TypeError, KeyError, AttributeError):
+            return
+        self._done[(kind, url)] = (discovered, children)
+
+    def __len__(self) -> int:
+        return len(self._done)
+
+    def get(self, kind: str, url: str) -> Optional[Tuple[List[Dict], List[str]]]:
+        """Return (discovered, children) recorded for a completed fetch, if any."""
+        with self._lock:
+            return self._done.get((kind, url))
+
+    def record(self, kind: str, url: str, discovered: List[Dict], children: List[str] = ()) -> None:
+        rec = {
+            'kind': kind,
+            'url': url,
+            'discovered': [
+                dict(item, lastmod=item['lastmod'].isoformat() if item['lastmod'] else None)
+                for item in discovered
+            ],
+            'children': list(children),
+        }
+        line = json.dumps(rec) + '\n'
+        with self._lock:
+            self._done[(kind, url)] = (discovered, list(children))
+            self._fh.write(line)
+            self._fh.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._fh.close()
+
+    def discard(self) -> None:
+        """Close and delete the checkpoint once the run's output is written."""
+        self.close()
+        os.remove(self.path)
+
+
+# Set by main(); None disables checkpointing
+_checkpoint: Optional[DiscoveryCheckpoint] = None
+
+
+def _conditional_headers(cached) -> Dict[str, str]:
+    """Validator headers for a cached (etag, last_modified, body) row."""
+    headers = {}
+    if cached:
+        etag, last_modified, _ = cached
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+    return headers
+
+
+def fetch(session: requests.Session, url: str) -> Tuple[int, bytes]:
+    """
+    GET url, holding the host's slot for the duration of the request.
+
+    Returns (status, body); a 304 against the response cache is reported
+    as 200 with the cached body.
+    """
+    cached = _http_cache.lookup(url) if _http_cache else None
+    with _host_slot(url):
+        response = session.get(url, timeout=30, headers=_conditional_headers(cached))
+    if response.status_code == 304 and cached:
+        return 200, cached[2]
+    if response.status_code == 200 and _http_cache:
+        _http_cache.store(url, response.headers, response.content)
+    return response.status_code, response.content
+
+
 def load_baseline():
     """Load baseline metrics."""
     if not os.path.exists(BASELINE_FILE):
@@ -146,199 +400,454 @@ def load_baseline():
         return json.load(f)
 
 
-def get_existing_urls() -> Set[str]:
-    """Get set of URLs already in the database."""
-    conn = get_db()
+def find_existing_urls(conn, candidate_urls: Iterable[str]) -> Set[str]:
+    """
+    Return the subset of candidate_urls already present in events.
+
+    The candidates are shipped to Postgres and probed there, so memory and
+    transfer scale with the discovered set rather than the whole table.
+    """
+    rows = [(u,) for u in candidate_urls]
+    if not rows:
+        return set()
     cur = conn.cursor()
+    found = execute_values(cur, """
+        SELECT u.url
+        FROM (VALUES %s) AS u(url)
+        WHERE EXISTS (SELECT 1 FROM events e WHERE e.url = u.url)
+    """, rows, page_size=1000, fetch=True)
+    cur.close()
+    return {row[0] for row in found}
 
-    cur.execute("SELECT DISTINCT url FROM events")
-    urls = {row[0] for row in cur.fetchall()}
 
-    cur.close()
-    conn.close()
+def stage_discovered_urls(conn, rows: List[Tuple]) -> None:
+    """
+    Replace the staged discoveries for these authorities with rows, via COPY.
 
-    return urls
+    Runs in a single transaction, so downstream steps never see a half-written
+    batch for an authority.
+    """
+    buf = io.StringIO()
+    csv.writer(buf).writerows(rows)
+    buf.seek(0)
+    authorities = sorted({row[0] for row in rows})
 
+    with conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS discovered_urls_staging (
+                    authority TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    lastmod TIMESTAMPTZ,
+                    source TEXT NOT NULL,
+                    in_sitemap BOOLEAN NOT NULL,
+                    discovered_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+                );
+            """)
+            cur.execute("DELETE FROM discovered_urls_staging WHERE authority = ANY(%s);", (authorities,))
+            cur.copy_expert(
+                "COPY discovered_urls_staging (authority, url, lastmod, source, in_sitemap) "
+                "FROM STDIN WITH (FORMAT csv)",
+                buf,
+            )
 
-def generate_pattern_urls(authority: str, patterns: List[str], existing_urls: Set[str]) -> List[Dict]:
-    """Generate URLs based on patterns and existing URL analysis."""
-    discovered = []
 
-    # Get existing URLs for this authority to analyze patterns
-    conn = get_db()
+def get_recent_urls(conn, authorities: List[str], per_authority: int = 50) -> Dict[str, List[str]]:
+    """Most recent event URLs for each authority, newest first, in one query."""
     cur = conn.cursor()
-
     cur.execute("""
-        SELECT url, pub_date
-        FROM events
-        WHERE authority = %s
-        ORDER BY pub_date DESC
-        LIMIT 50
-    """, (authority,))
-
-    authority_urls = cur.fetchall()
+        SELECT authority, url
+        FROM (
+            SELECT authority, url, pub_date,
+                   ROW_NUMBER() OVER (PARTITION BY authority ORDER BY pub_date DESC) AS rn
+            FROM events
+            WHERE authority = ANY(%s)
+        ) ranked
+        WHERE rn <= %s
+        ORDER BY authority, pub_date DESC
+    """, (list(authorities), per_authority))
+    rows = cur.fetchall()
     cur.close()
-    conn.close()
-
-    # Analyze URL patterns from existing URLs
-    url_patterns = set()
-    for url, pub_date in authority_urls:
-        # Extract base patterns
-        parts = url.split('/')
-        if len(parts) >= 4:
-            base_pattern = '/'.join(parts[:4]) + '/'
-            url_patterns.add(base_pattern)
-
-    # Generate variations based on common patterns
-    for base_pattern in url_patterns:
-        # Generate date-based variations (last 2 years)
-        for year in [2023, 2024, 2025]:
-            for month in range(1, 13):
-                # Common date patterns
-                date_variations = [
-                    f"{base_pattern}{year}/{month:02d}/",
-                    f"{base_pattern}{year}-{month:02d}/",
-                    f"{base_pattern}{year}{month:02d}/",
-                ]
-
-                for variation in date_variations:
-                    if variation not in existing_urls:
-                        discovered.append({
-                            'url': variation,
-                            'lastmod': None,
-                            'source': 'pattern',
-                            'in_sitemap': False
-                        })
-
-    # Limit to avoid too many URLs
-    return discovered[:100]
-
-
-def parse_sitemap(url: str, robots_checker: RobotsChecker) -> List[Dict]:
-    """Parse sitemap XML and extract URLs with lastmod dates."""
+
+    recent = {authority: [] for authority in authorities}
+    for authority, url in rows:
+        recent[authority].append(url)
+    return recent
+
+
+def generate_pattern_urls(authority_urls: List[str]) -> List[Dict]:
+    """
+    Generate URLs based on patterns and existing URL analysis.
+
+    authority_urls are the authority's recent event URLs (get_recent_urls).
+    Candidates are not checked against the database here; main() probes all
+    discovered URLs at once and caps pattern URLs per authority afterwards.
+    """
+    # Analyze URL patterns from existing URLs: scheme://host/first-segment/
+    url_patterns = {
+        '/'.join(parts[:4]) + '/'
+        for parts in (url.split('/', 4) for url in authority_urls)
+        if len(parts) >= 4
+    }
+
+    # Generate date-based variations of each base pattern
+    return [
+        {'url': base_pattern + suffix, 'lastmod': None, 'source': 'pattern', 'in_sitemap': False}
+        for base_pattern in url_patterns
+        for suffix in PATTERN_DATE_SUFFIXES
+    ]
+
+
+SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+# Exact tag -> element kind for the sitemap elements we read, namespaced or not
+_URL, _SITEMAP, _LOC, _LASTMOD = range(4)
+_TAG_KINDS = {
+    tag: kind
+    for name, kind in (('url', _URL), ('sitemap', _SITEMAP), ('loc', _LOC), ('lastmod', _LASTMOD))
+    for tag in (f'{{{SITEMAP_NS}}}{name}', name)
+}
+
+
+def iter_sitemap_entries(stream, child_sitemaps: Optional[List[str]] = None) -> Iterator[Tuple[str, Optional[str]]]:
+    """
+    Stream (loc, lastmod) pairs from a sitemap as each <url> element closes.
+
+    Works for both the sitemaps.org namespace and un-namespaced sitemaps.
+    For a <sitemapindex>, each child <sitemap> loc is appended to
+    child_sitemaps instead of being yielded. Finished subtrees are cleared
+    from the root as we go, so memory stays flat regardless of sitemap size.
+    """
+    root = None
+    loc = lastmod = None
+    for event, elem in ET.iterparse(stream, events=('start', 'end')):
+        if root is None:
+            root = elem
+            continue
+        if event != 'end':
+            continue
+        # <loc>/<lastmod> close before their parent, so pick up their text
+        # as they go by instead of searching the parent's children
+        kind = _TAG_KINDS.get(elem.tag)
+        if kind is None:
+            continue
+        if kind == _LOC:
+            loc = elem.text
+        elif kind == _LASTMOD:
+            lastmod = elem.text
+        else:
+            if loc:
+                if kind == _URL:
+                    yield loc.strip(), lastmod
+                elif child_sitemaps is not None:
+                    child_sitemaps.append(loc.strip())
+            loc = lastmod = None
+            root.clear()
+
+
+_URL_BLOCK_RE = re.compile(rb'<(?:[\w-]+:)?(url|sitemap)\b[^>]*>(.*?)</(?:[\w-]+:)?\1\s*>', re.S)
+_LOC_RE = re.compile(rb'<(?:[\w-]+:)?loc\s*>\s*(.*?)\s*</(?:[\w-]+:)?loc\s*>', re.S)
+_LASTMOD_RE = re.compile(rb'<(?:[\w-]+:)?lastmod\s*>\s*(.*?)\s*</(?:[\w-]+:)?lastmod\s*>', re.S)
+
+
+class _TailReader:
+    """
+    File-like wrapper that remembers the last few chunks handed to the parser.
+
+    If record is a list, every chunk read is also appended to it.
+    """
+
+    def __init__(self, raw, keep: int = 2, record: Optional[List[bytes]] = None):
+        self.raw = raw
+        self.recent = deque(maxlen=keep)
+        self.record = record
+
+    def read(self, n: int = -1) -> bytes:
+        data = self.raw.read(n)
+        self.recent.append(data)
+        if self.record is not None:
+            self.record.append(data)
+        return data
+
+    def tail(self) -> bytes:
+        """Bytes from around the parse failure point through the end of the stream."""
+        rest = self.raw.read()
+        if self.record is not None:
+            self.record.append(rest)
+        return b''.join(self.recent) + rest
+
+
+def salvage_sitemap_entries(body: bytes, child_sitemaps: Optional[List[str]] = None) -> Iterator[Tuple[str, Optional[str]]]:
+    """
+    Tolerant fallback for malformed sitemaps: pull (loc, lastmod) out of any
+    complete <url>...</url> blocks, ignoring whatever broke the XML parser.
+    Complete <sitemap> blocks go to child_sitemaps as in iter_sitemap_entries.
+    """
+    for block in _URL_BLOCK_RE.finditer(body):
+        loc = _LOC_RE.search(block.group(2))
+        if not loc:
+            continue
+        page_url = xml_unescape(loc.group(1).decode('utf-8', 'replace'))
+        if block.group(1) == b'sitemap':
+            if child_sitemaps is not None:
+                child_sitemaps.append(page_url)
+            continue
+        lastmod = _LASTMOD_RE.search(block.group(2))
+        yield (
+            page_url,
+            lastmod.group(1).decode('utf-8', 'replace') if lastmod else None,
+        )
+
+
+@lru_cache(maxsize=4096)
+def parse_lastmod(text: str) -> Optional[datetime]:
+    """
+    Parse a sitemap <lastmod> value into an aware datetime (None if invalid).
+
+    Date-only values are taken as UTC midnight. Cached because sitemaps
+    repeat the same few lastmod strings across thousands of entries.
+    """
+    text = text.strip()
+    try:
+        if ciso8601 is not None:
+            value = ciso8601.parse_datetime(text)
+        else:
+            value = datetime.fromisoformat(text.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def parse_sitemap(url: str, robots_checker: RobotsChecker, session: requests.Session) -> Tuple[List[Dict], List[str]]:
+    """
+    Parse sitemap XML and extract URLs with lastmod dates.
+
+    Returns (discovered, child_sitemaps); child_sitemaps is non-empty when
+    url is a sitemap index. Gzipped sitemaps are decompressed on the fly.
+    """
+    done = _checkpoint.get('sitemap', url) if _checkpoint else None
+    if done is not None:
+        return done
+    
     discovered = []
+    child_sitemaps = []
     
     try:
         # Check robots.txt
         if not robots_checker.is_allowed(url):
             print(f"    ✗ Sitemap blocked by robots.txt: {url}")
-            return discovered
+            return discovered, child_sitemaps
         
         print(f"    Fetching sitemap: {url}")
-        response = requests.get(url, timeout=30, headers={
-            'User-Agent': os.getenv('ROBOTS_UA', 'AseanForgeBot/1.0')
-        })
-        
-        if response.status_code != 200:
-            print(f"    ✗ HTTP {response.status_code}: {url}")
-            return discovered
-        
-        # Parse XML
-        root = ET.fromstring(response.content)
-        
-        # Handle different sitemap formats
-        namespaces = {
-            'sitemap': 'http://www.sitemaps.org/schemas/sitemap/0.9'
-        }
-        
-        # Look for URL entries
-        urls = root.findall('.//sitemap:url', namespaces) or root.findall('.//url')
-        
-        for url_elem in urls:
-            loc_elem = url_elem.find('sitemap:loc', namespaces) or url_elem.find('loc')
-            lastmod_elem = url_elem.find('sitemap:lastmod', namespaces) or url_elem.find('lastmod')
+        # Stream-parse the body straight off the socket instead of loading it
+        # whole and building a full DOM
+        cached = _http_cache.lookup(url) if _http_cache else None
+        with _host_slot(url), session.get(url, timeout=30, stream=True,
+                                          headers=_conditional_headers(cached)) as response:
+            record = None
+            if response.status_code == 304 and cached:
+                # Unchanged since last run: replay the stored body
+                stream = io.BytesIO(cached[2])
+            elif response.status_code != 200:
+                print(f"    ✗ HTTP {response.status_code}: {url}")
+                return discovered, child_sitemaps
+            else:
+                # Content-Encoding: gzip is undone by urllib3; a .gz file served
+                # as-is still needs decompressing
+                response.raw.decode_content = True
+                stream = response.raw
+                if urlparse(url).path.endswith('.gz') and response.headers.get('Content-Encoding') != 'gzip':
+                    stream = gzip.GzipFile(fileobj=stream)
+                if _http_cache and (response.headers.get('ETag') or response.headers.get('Last-Modified')):
+                    record = []
+            reader = _TailReader(stream, record=record)
+            seen = set()
             
-            if loc_elem is not None:
-                page_url = loc_elem.text.strip()
-                lastmod = None
-                
-                if lastmod_elem is not None:
-                    try:
-                        lastmod = datetime.fromisoformat(lastmod_elem.text.strip().replace('Z', '+00:00'))
-                    except:
-                        pass
-                
+            def add(page_url, lastmod_text):
+                seen.add(page_url)
                 discovered.append({
                     'url': page_url,
-                    'lastmod': lastmod,
+                    'lastmod': parse_lastmod(lastmod_text) if lastmod_text else None,
                     'source': 'sitemap',
                     'in_sitemap': True
                 })
+            
+            try:
+                for page_url, lastmod_text in iter_sitemap_entries(reader, child_sitemaps):
+                    add(page_url, lastmod_text)
+            except ET.ParseError as e:
+                # Government sitemaps are often malformed: keep everything
+                # parsed so far and salvage complete entries after the error
+                print(f"    ⚠ Malformed sitemap {url} ({e}); salvaging remaining entries")
+                for page_url, lastmod_text in salvage_sitemap_entries(reader.tail(), child_sitemaps):
+                    if page_url not in seen:
+                        add(page_url, lastmod_text)
+            
+            if record is not None:
+                # Store the decompressed body so a 304 can be replayed as-is
+                _http_cache.store(url, response.headers, b''.join(record) + reader.raw.read())
         
+        if child_sitemaps:
+            print(f"    ✓ Found {len(child_sitemaps)} child sitemaps in index {url}")
         print(f"    ✓ Found {len(discovered)} URLs in sitemap")
+        if _checkpoint:
+            _checkpoint.record('sitemap', url, discovered, child_sitemaps)
         
     except Exception as e:
         print(f"    ✗ Error parsing sitemap {url}: {e}")
     
-    return discovered
+    return discovered, child_sitemaps
+
 
+def crawl_sitemaps(sitemap_urls: List[str], robots_checker: RobotsChecker,
+                   session: requests.Session, pool: ThreadPoolExecutor) -> List[Dict]:
+    """
+    Fetch sitemaps on pool, following sitemap indexes into their children.
 
-def discover_from_listings(listings: List[str], robots_checker: RobotsChecker) -> List[Dict]:
-    """Discover URLs from listing pages by parsing HTML for links."""
+    Must be called from outside pool's worker threads. At most
+    MAX_SITEMAPS_PER_AUTHORITY files are fetched, each URL at most once.
+    """
     discovered = []
+    scheduled = set()
+    pending = set()
 
-    for listing_url in listings:
-        try:
-            # Check robots.txt
-            if not robots_checker.is_allowed(listing_url):
-                print(f"    ✗ Listing blocked by robots.txt: {listing_url}")
+    def schedule(urls):
+        for sitemap_url in urls:
+            if sitemap_url in scheduled or len(scheduled) >= MAX_SITEMAPS_PER_AUTHORITY:
                 continue
+            scheduled.add(sitemap_url)
+            pending.add(pool.submit(parse_sitemap, sitemap_url, robots_checker, session))
 
-            print(f"    Parsing listing: {listing_url}")
+    schedule(sitemap_urls)
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for fut in done:
+            entries, children = fut.result()
+            discovered.extend(entries)
+            schedule(children)
+    return discovered
 
-            # Fetch the listing page
-            response = requests.get(listing_url, timeout=30, headers={
-                'User-Agent': os.getenv('ROBOTS_UA', 'AseanForgeBot/1.0')
-            })
 
-            if response.status_code != 200:
-                print(f"    ✗ HTTP {response.status_code}: {listing_url}")
+_ANCHORS_WITH_HREF = SoupStrainer('a', href=True)
+
+
+def extract_hrefs(body: bytes) -> List[str]:
+    """Return the href of every <a href> in an HTML page."""
+    if LexborHTMLParser is not None:
+        tree = LexborHTMLParser(body)
+        return [node.attributes.get('href') or '' for node in tree.css('a[href]')]
+    # Only build Tag objects for anchors, not the whole document
+    soup = BeautifulSoup(body, 'html.parser', parse_only=_ANCHORS_WITH_HREF)
+    return [link['href'] for link in soup.find_all('a', href=True)]
+
+
+def discover_from_listing(listing_url: str, robots_checker: RobotsChecker, session: requests.Session) -> List[Dict]:
+    """Discover URLs from one listing page by parsing HTML for links."""
+    done = _checkpoint.get('listing', listing_url) if _checkpoint else None
+    if done is not None:
+        return done[0]
+
+    discovered = []
+
+    try:
+        # Check robots.txt
+        if not robots_checker.is_allowed(listing_url):
+            print(f"    ✗ Listing blocked by robots.txt: {listing_url}")
+            return discovered
+
+        print(f"    Parsing listing: {listing_url}")
+
+        # Fetch the listing page
+        status, body = fetch(session, listing_url)
+
+        if status != 200:
+            print(f"    ✗ HTTP {status}: {listing_url}")
+            return discovered
+
+        # Find all links
+        page_urls = []
+
+        for href in extract_hrefs(body):
+            # Convert relative URLs to absolute
+            if href.startswith('/'):
+                href = urljoin(listing_url, href)
+            elif not href.startswith('http'):
                 continue
 
-            # Parse HTML for links
-            from bs4 import BeautifulSoup
-            soup = BeautifulSoup(response.content, 'html.parser')
+            # Filter for relevant URLs (news, press releases, etc.)
+            if LISTING_KEYWORDS_RE.search(href.lower()):
+                page_urls.append(href)
 
-            # Find all links
-            links = soup.find_all('a', href=True)
-            page_urls = []
+        # Dedupe and add to discovered
+        unique_urls = list(set(page_urls))
+        for url in unique_urls[:50]:  # Limit per listing page
+            discovered.append({
+                'url': url,
+                'lastmod': None,
+                'source': 'listing',
+                'in_sitemap': False
+            })
 
-            for link in links:
-                href = link['href']
+        print(f"    ✓ Found {len(unique_urls)} links in listing")
+        if _checkpoint:
+            _checkpoint.record('listing', listing_url, discovered)
 
-                # Convert relative URLs to absolute
-                if href.startswith('/'):
-                    href = urljoin(listing_url, href)
-                elif not href.startswith('http'):
-                    continue
+    except Exception as e:
+        print(f"    ✗ Error parsing listing {listing_url}: {e}")
 
-                # Filter for relevant URLs (news, press releases, etc.)
-                href_lower = href.lower()
-                if any(keyword in href_lower for keyword in [
-                    'news', 'press', 'release', 'announcement', 'circular',
-                    'regulation', 'guideline', 'speech', 'statement'
-                ]):
-                    page_urls.append(href)
-
-            # Dedupe and add to discovered
-            unique_urls = list(set(page_urls))
-            for url in unique_urls[:50]:  # Limit per listing page
-                discovered.append({
-                    'url': url,
-                    'lastmod': None,
-                    'source': 'listing',
-                    'in_sitemap': False
-                })
+    return discovered
 
-            print(f"    ✓ Found {len(unique_urls)} links in listing")
-            time.sleep(2)  # Rate limiting
 
-        except Exception as e:
-            print(f"    ✗ Error parsing listing {listing_url}: {e}")
+def discover_from_listings(listings: List[str], robots_checker: RobotsChecker, session: requests.Session) -> List[Dict]:
+    """
+    Discover URLs from listing pages concurrently.
 
+    Per-host politeness comes from the host semaphore in fetch() rather
+    than a fixed sleep between pages. Results keep the input order.
+    """
+    if not listings:
+        return []
+    discovered = []
+    with ThreadPoolExecutor(max_workers=min(FETCH_WORKERS, len(listings))) as pool:
+        for page in pool.map(lambda u: discover_from_listing(u, robots_checker, session), listings):
+            discovered.extend(page)
     return discovered
 
 
+def process_authority(authority: str, config: Dict, seed_urls: List[str], robots_checker: RobotsChecker,
+                      session: requests.Session, pool: ThreadPoolExecutor) -> List[Dict]:
+    """
+    Run sitemap, listing and pattern discovery for one authority.
+
+    Fetches go through pool, so this must run outside pool's worker threads.
+    Returns the candidates from the last 365 days, not yet deduped against events.
+    """
+    print(f"Discovering URLs for {authority}...")
+    authority_discovered = []
+    
+    # Fetch sitemaps and listings concurrently
+    listings = config.get('listings', [])
+    listing_future = pool.submit(discover_from_listings, listings, robots_checker, session) if listings else None
+    
+    # Parse sitemaps (following sitemap indexes)
+    authority_discovered.extend(
+        crawl_sitemaps(config.get('sitemaps', []), robots_checker, session, pool)
+    )
+    
+    # Check listings
+    if listing_future is not None:
+        authority_discovered.extend(listing_future.result())
+
+    # Generate pattern-based URLs
+    if config.get('patterns'):
+        authority_discovered.extend(generate_pattern_urls(seed_urls))
+
+    # Filter by date (last 365 days)
+    return filter_by_date(authority_discovered, 365)
+
+
 def filter_by_date(discovered: List[Dict], days: int = 365) -> List[Dict]:
     """Filter URLs by lastmod date (keep last N days)."""
     if days <= 0:
@@ -358,6 +867,8 @@ def filter_by_date(discovered: List[Dict], days: int = 365) -> List[Dict]:
 
 
 def main():
+    global _http_cache, _checkpoint
+    
     print("=" * 60)
     print("COVERAGE EXPANSION STEP 1: Sitemap-First Discovery")
     print("=" * 60)
@@ -373,80 +884,131 @@ def main():
         print(f"✗ Failed to load baseline: {e}")
         sys.exit(1)
     
-    # Get existing URLs
-    print("Loading existing URLs from database...")
-    existing_urls = get_existing_urls()
-    print(f"  ✓ Found {len(existing_urls)} existing URLs")
-    print()
-    
-    # Initialize robots checker
+    # Initialize robots checker and prefetch robots.txt for every host we will hit
     robots_checker = RobotsChecker(os.getenv('ROBOTS_UA', 'AseanForgeBot/1.0'))
+    robots_checker.warm(
+        u for a in laggards for key in ('sitemaps', 'listings')
+        for u in AUTHORITY_CONFIGS.get(a, {}).get(key, [])
+    )
+    
+    # One connection for the whole run: pattern seeds, existence probe, staging
+    conn = get_db()
+    recent_urls = get_recent_urls(conn, laggards)
+    conn.commit()  # don't sit idle in a transaction while crawling
+    
+    session = make_session()
+    _http_cache = ResponseCache(HTTP_CACHE_PATH)
+    _checkpoint = DiscoveryCheckpoint(CHECKPOINT_PATH)
+    if _checkpoint.stale:
+        print(f"Discarded checkpoint older than {CHECKPOINT_MAX_AGE_HOURS}h: {CHECKPOINT_PATH}")
+    if len(_checkpoint):
+        print(f"Resuming: {len(_checkpoint)} sitemap/listing fetches restored from {CHECKPOINT_PATH}")
+        print()
+    pool = ThreadPoolExecutor(max_workers=FETCH_WORKERS)
     
-    # Discover URLs for each laggard authority
+    # Discover URLs for all laggard authorities at once; each authority is a
+    # different host, and per-host politeness is enforced in the fetchers
+    per_authority = []
     all_discovered = []
     crawler_errors = 0
     
+    configured = []
     for authority in laggards:
         if authority not in AUTHORITY_CONFIGS:
             print(f"⚠️  No configuration for authority: {authority}")
             continue
-        
-        print(f"Discovering URLs for {authority}...")
-        config = AUTHORITY_CONFIGS[authority]
-        authority_discovered = []
-        
-        # Parse sitemaps
-        for sitemap_url in config.get('sitemaps', []):
-            sitemap_urls = parse_sitemap(sitemap_url, robots_checker)
-            authority_discovered.extend(sitemap_urls)
-        
-        # Check listings
-        listings = config.get('listings', [])
-        if listings:
-            listing_urls = discover_from_listings(listings, robots_checker)
-            authority_discovered.extend(listing_urls)
-
-        # Generate pattern-based URLs
-        patterns = config.get('patterns', [])
-        if patterns:
-            pattern_urls = generate_pattern_urls(authority, patterns, existing_urls)
-            authority_discovered.extend(pattern_urls)
-
-        # Filter by date (last 365 days)
-        authority_discovered = filter_by_date(authority_discovered, 365)
-        
-        # Dedupe against existing URLs
+        configured.append(authority)
+    
+    with ThreadPoolExecutor(max_workers=max(1, len(configured))) as authority_pool:
+        futures = [
+            authority_pool.submit(process_authority, authority, AUTHORITY_CONFIGS[authority],
+                                  recent_urls[authority], robots_checker, session, pool)
+            for authority in configured
+        ]
+        for authority, fut in zip(configured, futures):
+            try:
+                per_authority.append((authority, fut.result()))
+            except Exception as e:
+                print(f"✗ Discovery failed for {authority}: {e}")
+                crawler_errors += 1
+    print()
+    
+    pool.shutdown()
+    session.close()
+    _http_cache.close()
+    _http_cache = None
+    
+    # Dedupe against existing URLs with one server-side probe for all candidates
+    candidate_urls = {item['url'] for _, items in per_authority for item in items}
+    print(f"Checking {len(candidate_urls)} candidate URLs against database...")
+    existing_urls = find_existing_urls(conn, candidate_urls)
+    print(f"  ✓ {len(existing_urls)} already exist")
+    print()
+    
+    # URLs to drop: already in events, or already emitted earlier in this run
+    # (sitemap entries come first, so they win over listing/pattern copies)
+    skip_urls = existing_urls
+    for authority, authority_discovered in per_authority:
         new_urls = []
+        pattern_count = 0
         for item in authority_discovered:
-            if item['url'] not in existing_urls:
-                item['authority'] = authority
-                new_urls.append(item)
+            if item['url'] in skip_urls:
+                continue
+            if item['source'] == 'pattern':
+                # Limit to avoid too many URLs
+                if pattern_count >= PATTERN_URL_LIMIT:
+                    continue
+                pattern_count += 1
+            skip_urls.add(item['url'])
+            item['authority'] = authority
+            new_urls.append(item)
         
         print(f"  ✓ Found {len(new_urls)} new URLs for {authority}")
         all_discovered.extend(new_urls)
-        print()
+    print()
     
-    # Write discovered URLs to CSV
+    rows = [
+        (
+            item['authority'],
+            item['url'],
+            item['lastmod'].isoformat() if item['lastmod'] else '',
+            item['source'],
+            item['in_sitemap'],
+        )
+        for item in all_discovered
+    ]
+    
+    # The CSV is the step's output (Step 2 reads it); write it first
     os.makedirs(OUTPUT_DIR, exist_ok=True)
     
     with open(DISCOVERED_URLS_CSV, 'w', newline='') as f:
-        writer = csv.DictWriter(f, fieldnames=[
-            'authority', 'url', 'lastmod', 'source', 'in_sitemap'
-        ])
-        writer.writeheader()
-        
-        for item in all_discovered:
-            writer.writerow({
-                'authority': item['authority'],
-                'url': item['url'],
-                'lastmod': item['lastmod'].isoformat() if item['lastmod'] else '',
-                'source': item['source'],
-                'in_sitemap': item['in_sitemap']
-            })
+        writer = csv.writer(f)
+        writer.writerow(DISCOVERED_COLUMNS)
+        writer.writerows(rows)
     
     print(f"✓ Wrote {len(all_discovered)} discovered URLs to {DISCOVERED_URLS_CSV}")
+    
+    # Parallel write path into the staging table; a failure here (no CREATE
+    # privilege, COPY error) is reported but does not fail the discovery
+    try:
+        if rows:
+            stage_discovered_urls(conn, rows)
+        print(f"✓ Staged {len(rows)} discovered URLs in discovered_urls_staging")
+    except Exception as e:
+        if not conn.closed:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                pass
+        print(f"! Warning: could not stage discovered URLs in discovered_urls_staging: {e}")
+    finally:
+        conn.close()
     print()
     
+    # Run completed: the next run starts from scratch
+    _checkpoint.discard()
+    _checkpoint = None
+    
     # Check pass criteria
     total_discovered = len(all_discovered)
     error_rate = crawler_errors / max(1, total_discovered + crawler_errors) * 100
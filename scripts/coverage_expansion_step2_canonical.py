@@ -5,13 +5,20 @@ Coverage Expansion Step 2: Canonical Doc Creation
 Purpose: Create canonical documents for discovered URLs using Firecrawl
 """
 
+import atexit
 import csv
 import json
 import os
 import sys
+import threading
 import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
 from datetime import datetime, timezone
-from typing import Dict, List, Optional
+from statistics import median
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from urllib.parse import urlparse
 
 try:
     from dotenv import load_dotenv
@@ -20,8 +27,8 @@ except Exception:
     pass
 
 import psycopg2
-from psycopg2.extras import RealDictCursor
-from firecrawl import FirecrawlApp
+import requests
+from psycopg2.extras import RealDictCursor, execute_values
 from psycopg2 import errors
 
 
@@ -31,13 +38,29 @@ from app.robots_checker import RobotsChecker
 
 OUTPUT_DIR = "data/output/validation/latest"
 TARGETS_CSV = os.path.join(OUTPUT_DIR, "targets_zero_doc.csv")
+DISCOVERED_URLS_CSV = os.path.join(OUTPUT_DIR, "discovered_urls.csv")
 CANONICAL_DOCS_CSV = os.path.join(OUTPUT_DIR, "mvp_canonical_docs.csv")
 ROBOTS_BLOCKED_CSV = os.path.join(OUTPUT_DIR, "robots_blocked.csv")
 FETCH_FAILURES_CSV = os.path.join(OUTPUT_DIR, "fetch_failures.csv")
 
+# Block buffer for CSV reads/writes
+CSV_BUFFER_SIZE = 1 << 20
+
 # Firecrawl limits (MVP)
 MAX_FIRECRAWL_URLS = 400
 MAX_DOCUMENTS = 250
+MAX_PER_AUTHORITY = 30
+
+# Documents buffered per multi-row INSERT
+DOC_BATCH_SIZE = 20
+
+# Concurrent Firecrawl scrapes (one at a time per authority)
+FIRECRAWL_WORKERS = 6
+SCRAPE_PACING_SECONDS = 1.0
+
+# Firecrawl REST endpoint, called over one keep-alive session
+FIRECRAWL_API_URL = os.getenv('FIRECRAWL_API_URL', 'https://api.firecrawl.dev').rstrip('/')
+FIRECRAWL_SCRAPE_TIMEOUT_MS = 60000
 
 # Authority-specific Firecrawl settings
 AUTHORITY_SETTINGS = {
@@ -53,26 +76,74 @@ AUTHORITY_SETTINGS = {
 }
 
 
+_conn = None
+
+
 def get_db():
-    """Get database connection."""
-    db_url = os.getenv("NEON_DATABASE_URL")
-    if not db_url:
-        raise RuntimeError("NEON_DATABASE_URL not set in app/.env")
-    return psycopg2.connect(db_url)
+    """
+    Get the shared database connection, connecting on first use.
 
+    The connection is in autocommit mode: each statement is its own
+    transaction, so a failed INSERT never leaves the connection aborted
+    for the next candidate. Callers close cursors, not the connection.
+    """
+    global _conn
+    if _conn is None or _conn.closed:
+        db_url = os.getenv("NEON_DATABASE_URL")
+        if not db_url:
+            raise RuntimeError("NEON_DATABASE_URL not set in app/.env")
+        _conn = psycopg2.connect(db_url)
+        _conn.autocommit = True
+    return _conn
 
-def load_discovered_urls() -> List[Dict]:
-    """Load discovered URLs from CSV."""
+
+def close_db():
+    """Close the shared database connection, if open."""
+    global _conn
+    if _conn is not None and not _conn.closed:
+        _conn.close()
+    _conn = None
+
+
+atexit.register(close_db)
+
+
+def load_discovered_urls() -> Iterator[Dict]:
+    """Stream discovered URLs from CSV."""
     if not os.path.exists(DISCOVERED_URLS_CSV):
         raise RuntimeError(f"Discovered URLs file not found: {DISCOVERED_URLS_CSV}")
 
-    urls = []
-    with open(DISCOVERED_URLS_CSV, 'r') as f:
-        reader = csv.DictReader(f)
+    with open(DISCOVERED_URLS_CSV, 'r', newline='', buffering=CSV_BUFFER_SIZE) as f:
+        yield from csv.DictReader(f)
+
+
+def iter_targets_csv() -> Iterator[Dict]:
+    """Stream target events from targets_zero_doc.csv."""
+    with open(TARGETS_CSV, 'r', newline='', buffering=CSV_BUFFER_SIZE) as f:
+        # Positional reads: the candidate dict is the only per-row allocation
+        reader = csv.reader(f)
+        header = next(reader, [])
+        col = {name: i for i, name in enumerate(header)}
+        ei, ui, ai = col['event_id'], col['url'], col['authority']
+        pi = col.get('pub_date')
+        li = col.get('current_max_doc_length')
+        ri = col.get('reason')
         for row in reader:
-            urls.append(row)
+            if not row:
+                continue
+            yield {
+                'event_id': row[ei],
+                'url': row[ui],
+                'authority': row[ai],
+                'pub_date': row[pi] if pi is not None else None,
+                'max_doc_length': int((row[li] if li is not None else '0') or 0),
+                'reason': row[ri] if ri is not None else 'no_doc'
+            }
 
-    return urls
+
+def per_authority_limit(n_authorities: int) -> int:
+    """Candidates kept per authority: up to 30, and a fair share of MAX_DOCUMENTS."""
+    return min(MAX_PER_AUTHORITY, MAX_DOCUMENTS // max(1, n_authorities))
 
 
 def get_urls_needing_docs() -> List[Dict]:
@@ -81,110 +152,180 @@ def get_urls_needing_docs() -> List[Dict]:
     """
     # If targets CSV exists, load it
     if os.path.exists(TARGETS_CSV):
-        targets = []
-        with open(TARGETS_CSV, 'r') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                targets.append({
-                    'event_id': row['event_id'],
-                    'url': row['url'],
-                    'authority': row['authority'],
-                    'pub_date': row.get('pub_date'),
-                    'max_doc_length': int(row.get('current_max_doc_length', '0') or 0),
-                    'reason': row.get('reason', 'no_doc')
-                })
-        return targets
+        return list(iter_targets_csv())
 
     # Otherwise, build targets from DB and persist CSV
     conn = get_db()
     cur = conn.cursor(cursor_factory=RealDictCursor)
 
     lagging_authorities = ['SC', 'PDPC', 'MIC', 'BI', 'OJK', 'DICT', 'SBV', 'IMDA']
-    placeholders = ','.join(['%s'] * len(lagging_authorities))
 
+    # The authority list is bound once (filter and ordering); the SQL text stays constant.
+    # Selection: the newest per_authority_limit() events per authority (30 for
+    # 8 authorities, so at most 240 rows), not the first MAX_DOCUMENTS rows in
+    # authority order.
     cur.execute("""
         WITH per_event AS (
           SELECT e.event_id, e.authority, e.url, e.pub_date,
                  COALESCE(MAX(LENGTH(d.clean_text)), 0) AS max_len
           FROM events e
           LEFT JOIN documents d ON d.event_id = e.event_id
-          WHERE e.authority IN ({placeholders})
+          WHERE e.authority = ANY(%(authorities)s::text[])
             AND e.pub_date >= NOW() - INTERVAL '365 days'
           GROUP BY e.event_id, e.authority, e.url, e.pub_date
+        ), ranked AS (
+          SELECT *, ROW_NUMBER() OVER (PARTITION BY authority ORDER BY pub_date DESC) AS rn
+          FROM per_event
+          WHERE max_len < 400
         )
         SELECT event_id, authority, url, pub_date, max_len
-        FROM per_event
-        WHERE max_len < 400
-        ORDER BY array_position(ARRAY{laglist}::text[], authority), pub_date DESC
-        LIMIT 250
-    """.replace('{laglist}', str(lagging_authorities)).replace('{placeholders}', placeholders), lagging_authorities)
-
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
-
-    candidates = []
-    for r in rows:
-        candidates.append({
+        FROM ranked
+        WHERE rn <= %(per_authority)s
+        ORDER BY array_position(%(authorities)s::text[], authority), pub_date DESC
+        LIMIT %(limit)s
+    """, {
+        'authorities': lagging_authorities,
+        'per_authority': per_authority_limit(len(lagging_authorities)),
+        'limit': MAX_DOCUMENTS,
+    })
+
+    candidates = [
+        {
             'event_id': r['event_id'],
             'url': r['url'],
             'authority': r['authority'],
             'pub_date': r['pub_date'].isoformat() if r['pub_date'] else '',
             'max_doc_length': r['max_len'],
             'reason': 'no_doc' if r['max_len'] == 0 else 'short_doc'
-        })
+        }
+        for r in cur
+    ]
+    cur.close()
 
     # Write targets CSV for reproducibility
     os.makedirs(OUTPUT_DIR, exist_ok=True)
-    with open(TARGETS_CSV, 'w', newline='') as f:
-        writer = csv.DictWriter(f, fieldnames=['event_id', 'authority', 'url', 'pub_date', 'current_max_doc_length', 'reason'])
-        writer.writeheader()
-        for c in candidates:
-            writer.writerow({
-                'event_id': c['event_id'],
-                'authority': c['authority'],
-                'url': c['url'],
-                'pub_date': c['pub_date'],
-                'current_max_doc_length': c['max_doc_length'],
-                'reason': c['reason']
-            })
+    with open(TARGETS_CSV, 'w', newline='', buffering=CSV_BUFFER_SIZE) as f:
+        writer = csv.writer(f)
+        writer.writerow(['event_id', 'authority', 'url', 'pub_date', 'current_max_doc_length', 'reason'])
+        writer.writerows(
+            (c['event_id'], c['authority'], c['url'], c['pub_date'], c['max_doc_length'], c['reason'])
+            for c in candidates
+        )
 
     return candidates
 
 
-def get_firecrawl_settings(authority: str) -> Dict:
-    """Get Firecrawl settings for authority."""
-    return AUTHORITY_SETTINGS.get(authority, AUTHORITY_SETTINGS['default'])
+_authority_slots: Dict[str, threading.Lock] = {}
+_authority_slots_lock = threading.Lock()
+
 
+def _authority_slot(authority: str) -> threading.Lock:
+    """Per-authority lock: at most one in-flight scrape against each site."""
+    with _authority_slots_lock:
+        return _authority_slots.setdefault(authority, threading.Lock())
 
-def fetch_with_firecrawl(url: str, authority: str, fc_app: FirecrawlApp) -> Optional[Dict]:
-    """Fetch document content using Firecrawl."""
-    settings = get_firecrawl_settings(authority)
 
+_host_last_scrape: Dict[str, float] = {}
+_host_last_scrape_lock = threading.Lock()
+
+
+def _pace_host(host: str) -> None:
+    """Sleep only what is left of SCRAPE_PACING_SECONDS since the last scrape of host finished."""
+    with _host_last_scrape_lock:
+        last = _host_last_scrape.get(host)
+    if last is not None:
+        delay = SCRAPE_PACING_SECONDS - (time.monotonic() - last)
+        if delay > 0:
+            time.sleep(delay)
+
+
+def _mark_host_scraped(host: str) -> None:
+    """Record that a scrape of host just finished (starts its pacing gap)."""
+    with _host_last_scrape_lock:
+        _host_last_scrape[host] = time.monotonic()
+
+
+def interleave_by_authority(items: List[Tuple[int, Dict]]) -> List[Tuple[int, Dict]]:
+    """
+    Round-robin (index, candidate) pairs across authorities, keeping each
+    authority's own order, so pool workers are not all queued on one site.
+    """
+    by_auth: Dict[str, List[Tuple[int, Dict]]] = {}
+    for item in items:
+        by_auth.setdefault(item[1]['authority'], []).append(item)
+    queues = list(by_auth.values())
+    return [q[k] for k in range(max(map(len, queues), default=0)) for q in queues if k < len(q)]
+
+
+def make_firecrawl_session(api_key: str) -> requests.Session:
+    """Shared Firecrawl session: scrapes reuse pooled TLS connections to the API."""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=FIRECRAWL_WORKERS)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({
+        'Authorization': f"Bearer {api_key}",
+        'Content-Type': 'application/json',
+    })
+    return session
+
+
+def scrape_candidate(url: str, authority: str, settings: Dict, fc_session: requests.Session) -> Tuple[Optional[Dict], Optional[str]]:
+    """
+    Pool worker: Firecrawl one URL, one at a time per authority and paced per host.
+
+    Returns (content, error); error is set if the fetch raised.
+    """
+    host = urlparse(url).netloc
+    with _authority_slot(authority):
+        _pace_host(host)  # Respectful gap after the previous scrape of this site
+        try:
+            return fetch_with_firecrawl(url, settings, fc_session), None
+        except Exception as e:
+            return None, str(e)
+        finally:
+            _mark_host_scraped(host)
+
+
+def fetch_with_firecrawl(url: str, settings: Dict, fc_session: requests.Session) -> Optional[Dict]:
+    """Fetch document content using Firecrawl's /v2/scrape with the authority's settings."""
     try:
-        result = fc_app.scrape(
-            url=url,
-            formats=["markdown", "html"],
-            only_main_content=True,
-            wait_for=settings['wait_for'],
-            timeout=60000,
-            parsers=["pdf"],
-            proxy=settings['proxy']
+        response = fc_session.post(
+            f"{FIRECRAWL_API_URL}/v2/scrape",
+            json={
+                'url': url,
+                'formats': ["markdown", "html"],
+                'onlyMainContent': True,
+                'waitFor': settings['wait_for'],
+                'timeout': FIRECRAWL_SCRAPE_TIMEOUT_MS,
+                'parsers': ["pdf"],
+                'proxy': settings['proxy'],
+            },
+            # Client-side cap a little above Firecrawl's own scrape timeout
+            timeout=FIRECRAWL_SCRAPE_TIMEOUT_MS / 1000 + 30,
         )
+        if response.status_code != 200:
+            print(f"    ✗ Firecrawl error: HTTP {response.status_code}: {response.text[:200]}")
+            return None
 
-        # Extract content from Document object
-        if hasattr(result, 'markdown'):
-            text = result.markdown or ''
-            html = getattr(result, 'html', '')
+        payload = response.json()
+        if not payload.get('success'):
+            print(f"    ✗ Firecrawl error: {payload.get('error', 'scrape unsuccessful')}")
+            return None
 
-            if len(text) >= 100:  # Minimum viable content
-                is_pdf = url.lower().endswith('.pdf')
-                return {
-                    'text': text,
-                    'html': html,
-                    'markdown': text,
-                    'source_type': 'pdf' if is_pdf else 'html'
-                }
+        # Extract content from the scraped document
+        data = payload.get('data') or {}
+        text = data.get('markdown') or ''
+        html = data.get('html') or ''
+
+        if len(text) >= 100:  # Minimum viable content
+            is_pdf = url.lower().endswith('.pdf')
+            return {
+                'text': text,
+                'html': html,
+                'markdown': text,
+                'source_type': 'pdf' if is_pdf else 'html'
+            }
 
         return None
 
@@ -194,211 +335,193 @@ def fetch_with_firecrawl(url: str, authority: str, fc_app: FirecrawlApp) -> Opti
 
 
 
+def prefetch_doc_state(candidates: List[Dict]) -> Tuple[Set[str], Dict[str, Dict], Set[str]]:
+    """
+    Fetch document state for all candidates in two queries.
+
+    Returns (events_with_qual, url_to_existing, taken_urls): the candidate
+    event_ids that already have a qualifying document (>=400 chars), for
+    each candidate URL an existing qualifying document with that source_url,
+    and every candidate URL already used as a source_url by any document.
+    """
+    event_ids = list({c['event_id'] for c in candidates})
+    urls = list({c['url'] for c in candidates})
 
-def has_qualifying_doc(event_id: str) -> bool:
-    """Check if event already has a qualifying document (>=400 chars)."""
     conn = get_db()
+    # Plain tuple rows; a dict is only built for the documents kept below
     cur = conn.cursor()
     cur.execute("""
-        SELECT COALESCE(MAX(LENGTH(clean_text)), 0)
+        SELECT DISTINCT event_id::text AS event_id
         FROM documents
-        WHERE event_id = %s
-    """, (event_id,))
-    max_len = cur.fetchone()[0]
-    cur.close()
-    conn.close()
-    return (max_len or 0) >= 400
+        WHERE event_id = ANY(%s::uuid[])
+          AND clean_text IS NOT NULL AND LENGTH(clean_text) >= 400
+    """, (event_ids,))
+    events_with_qual = {event_id for (event_id,) in cur}
 
-
-def source_url_exists(url: str) -> bool:
-    """Check if a document with this source_url already exists."""
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("SELECT 1 FROM documents WHERE source_url = %s LIMIT 1", (url,))
-    exists = cur.fetchone() is not None
+    # Qualifying document per URL where one exists, else any document (only
+    # the URL is kept for those)
+    cur.execute("""
+        SELECT DISTINCT ON (source_url)
+               COALESCE(LENGTH(clean_text), 0) >= 400 AS qualifying,
+               document_id, source, source_url, title, raw_text, clean_text,
+               COALESCE(page_spans, '[]') AS page_spans, rendered
+        FROM documents
+        WHERE source_url = ANY(%s)
+        ORDER BY source_url, qualifying DESC
+    """, (urls,))
+    url_to_existing = {}
+    taken_urls = set()
+    columns = [col.name for col in cur.description][1:]
+    for qualifying, *values in cur:
+        source_url = values[2]
+        taken_urls.add(source_url)
+        if qualifying:
+            url_to_existing[source_url] = dict(zip(columns, values))
     cur.close()
-    conn.close()
+    return events_with_qual, url_to_existing, taken_urls
 
 
-def get_existing_qualifying_doc(url: str) -> Optional[Dict]:
-    """Return an existing qualifying document (clean_text >= 400) for this source_url, if any."""
-    conn = get_db()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    cur.execute(
-        """
-        SELECT document_id, source, source_url, title, raw_text, clean_text,
-               COALESCE(page_spans, '[]') AS page_spans, rendered
-        FROM documents
-        WHERE source_url = %s AND LENGTH(clean_text) >= 400
-        LIMIT 1
-        """,
-        (url,),
-    )
-    row = cur.fetchone()
+def source_url_is_unique() -> bool:
+    """True if documents.source_url has a (non-partial) unique index."""
+    cur = get_db().cursor()
+    cur.execute("""
+        SELECT EXISTS (
+            SELECT 1
+            FROM pg_index i
+            JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+            WHERE i.indrelid = 'documents'::regclass
+              AND i.indisunique
+              AND i.indnkeyatts = 1
+              AND i.indpred IS NULL
+              AND a.attname = 'source_url'
+        )
+    """)
+    unique = cur.fetchone()[0]
     cur.close()
-    conn.close()
-    return row
+    return unique
 
 
-def append_canonical_csv(row: Dict):
-    """Append a single created-doc row to mvp_canonical_docs.csv (streaming)."""
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
-    file_exists = os.path.exists(CANONICAL_DOCS_CSV)
-    with open(CANONICAL_DOCS_CSV, "a", newline="") as f:
-        fieldnames = [
-            "event_id",
-            "authority",
-            "url",
-            "source_type",
-            "document_id",
-            "clean_text_length",
-            "timestamp",
-        ]
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        if (not file_exists) or os.path.getsize(CANONICAL_DOCS_CSV) == 0:
-            writer.writeheader()
-        writer.writerow(row)
-        f.flush()
+CANONICAL_FIELDS = [
+    "event_id",
+    "authority",
+    "url",
+    "source_type",
+    "document_id",
+    "clean_text_length",
+    "timestamp",
+]
 
 
-def clone_document_to_event(event_id: str, authority: str, existing: Dict) -> Optional[Dict]:
-    """Clone an existing qualifying document to the given event (event-level link-backfill).
-    Returns dict with document_id and used url if successful.
+def open_csv_log(stack: ExitStack, path: str, header: List[str]):
     """
-    conn = get_db()
-    cur = conn.cursor()
-    base_url = existing["source_url"]
-    candidate_urls = [base_url, f"{base_url}#event={event_id}"]
-    for used_url in candidate_urls:
-        try:
-            cur.execute(
-                """
-                INSERT INTO documents (
-                    document_id, event_id, source, source_url,
-                    title, raw_text, clean_text, page_spans, rendered
-                ) VALUES (
-                    gen_random_uuid(), %s, %s, %s,
-                    %s, %s, %s, %s, %s
-                )
-                RETURNING document_id
-                """,
-                (
-                    event_id,
-                    existing.get("source", "html"),
-                    used_url,
-                    existing.get("title", ""),
-                    existing.get("raw_text", ""),
-                    existing.get("clean_text", ""),
-                    existing.get("page_spans", "[]"),
-                    existing.get("rendered", True),
-                ),
-            )
-            new_id = cur.fetchone()[0]
-            conn.commit()
-            cur.close()
-            conn.close()
-            return {"document_id": str(new_id), "url": used_url}
-        except Exception as e:
-            # Likely unique constraint on source_url; try next candidate variant
-            conn.rollback()
-            last_err = str(e)
-            if "duplicate key value" in last_err or "unique constraint" in last_err:
-                continue
-            # Unexpected error
-            cur.close()
-            conn.close()
-            raise
-    # All attempts failed
-    cur.close()
-    conn.close()
-    return None
+    Open a CSV for appending until stack closes; return its csv.writer.
 
+    The header is written only if the file is new or empty.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    f = stack.enter_context(open(path, 'a', newline='', buffering=CSV_BUFFER_SIZE))
+    writer = csv.writer(f)
+    if f.tell() == 0:
+        writer.writerow(header)
+    return writer
 
 
-def log_fetch_failure(authority: str, url: str, message: str):
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
-    file_exists = os.path.exists(FETCH_FAILURES_CSV)
-    with open(FETCH_FAILURES_CSV, 'a', newline='') as f:
-        writer = csv.writer(f)
-        if not file_exists:
-            writer.writerow(['authority', 'url', 'error', 'timestamp'])
-        writer.writerow([authority, url, message, datetime.now(timezone.utc).isoformat()])
+def append_canonical_csv(writer, row: Dict):
+    """Append a single created-doc row to mvp_canonical_docs.csv (streaming)."""
+    writer.writerow([row[field] for field in CANONICAL_FIELDS])
+
+
+def clone_document_row(event_id: str, existing: Dict) -> Tuple:
+    """Document row cloning an existing qualifying document to the given event (event-level link-backfill)."""
+    return (
+        event_id,
+        existing.get("source", "html"),
+        existing["source_url"],
+        existing.get("title", ""),
+        existing.get("raw_text", ""),
+        existing.get("clean_text", ""),
+        existing.get("page_spans", "[]"),
+        existing.get("rendered", True),
+    )
 
-def create_document(event_id: str, url: str, content: Dict) -> Optional[Dict]:
-    """Create a new document record for this event. Returns {document_id, url} on success."""
-    conn = get_db()
-    cur = conn.cursor()
-    title = ''
-    html = content.get('html', '')
-    text = content.get('text', '')
-    page_spans = '[]'
-    source_type = content.get('source_type', 'html')
-
-    candidate_urls = [url, f"{url}#event={event_id}"]
-    for used_url in candidate_urls:
-        try:
-            cur.execute(
-                """
-                INSERT INTO documents (
-                    document_id, event_id, source, source_url,
-                    title, raw_text, clean_text, page_spans, rendered
-                ) VALUES (
-                    gen_random_uuid(), %s, %s, %s,
-                    %s, %s, %s, %s, %s
-                )
-                RETURNING document_id
-                """,
-                (
-                    event_id,
-                    source_type,
-                    used_url,
-                    title,
-                    html,
-                    text,
-                    page_spans,
-                    True,
-                ),
-            )
-            new_id = cur.fetchone()[0]
-            conn.commit()
-            cur.close()
-            conn.close()
-            return {"document_id": str(new_id), "url": used_url}
-        except Exception as e:
-            # Likely unique constraint on source_url; try next variant
-            conn.rollback()
-            err = str(e)
-            if "duplicate key value" in err or "unique constraint" in err:
-                continue
-            print(f"    ✗ Database error: {e}")
-            cur.close()
-            conn.close()
-            return None
 
-    # If we exhausted candidates
-    cur.close()
-    conn.close()
-    return None
+def scraped_document_row(event_id: str, url: str, content: Dict) -> Tuple:
+    """Document row for freshly scraped content (NUL bytes stripped; Postgres text rejects them)."""
+    return (
+        event_id,
+        content.get('source_type', 'html'),
+        url,
+        '',
+        (content.get('html') or '').replace('\x00', ''),
+        (content.get('text') or '').replace('\x00', ''),
+        '[]',
+        True,
+    )
 
 
-def log_robots_block(authority: str, url: str, reason: str):
-    """Log robots.txt block to CSV."""
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
+def insert_documents(rows: List[Tuple], known_taken: Optional[Set[str]] = None) -> List[Optional[Dict]]:
+    """
+    Insert document rows in one statement per attempt.
+
+    Rows are (event_id, source, source_url, title, raw_text, clean_text,
+    page_spans, rendered). A row whose source_url is already taken is retried
+    once as '{url}#event={event_id}'; rows whose source_url is in known_taken
+    go straight to that variant. Returns, per row, {document_id, url} on
+    success or None.
+    """
+    results: List[Optional[Dict]] = [None] * len(rows)
+    known_taken = known_taken or set()
+    todo = [k for k, row in enumerate(rows) if row[2] not in known_taken]
+    taken = [k for k, row in enumerate(rows) if row[2] in known_taken]
+    cur = get_db().cursor()
+    for attempt in (0, 1):
+        if attempt == 1:
+            todo = sorted(todo + taken)
+        if not todo:
+            continue
+        batch = [
+            rows[k] if attempt == 0 else (rows[k][0], rows[k][1], f"{rows[k][2]}#event={rows[k][0]}") + rows[k][3:]
+            for k in todo
+        ]
+        inserted = execute_values(
+            cur,
+            """
+            INSERT INTO documents (
+                document_id, event_id, source, source_url,
+                title, raw_text, clean_text, page_spans, rendered
+            ) VALUES %s
+            ON CONFLICT DO NOTHING
+            RETURNING document_id, event_id::text, source_url
+            """,
+            batch,
+            template="(gen_random_uuid(), %s, %s, %s, %s, %s, %s, %s, %s)",
+            fetch=True,
+        )
+        by_key = {(event_id, source_url): document_id for document_id, event_id, source_url in inserted}
+        retry = []
+        for k, row in zip(todo, batch):
+            document_id = by_key.get((str(row[0]), row[2]))
+            if document_id:
+                results[k] = {"document_id": str(document_id), "url": row[2]}
+            else:
+                retry.append(k)
+        todo = retry
+    cur.close()
+    return results
 
-    file_exists = os.path.exists(ROBOTS_BLOCKED_CSV)
 
-    with open(ROBOTS_BLOCKED_CSV, 'a', newline='') as f:
-        writer = csv.writer(f)
+def log_fetch_failure(writer, authority: str, url: str, message: str):
+    writer.writerow([authority, url, message, datetime.now(timezone.utc).isoformat()])
 
-        if not file_exists:
-            writer.writerow(['authority', 'url', 'reason', 'timestamp'])
 
-        writer.writerow([
-            authority,
-            url,
-            reason,
-            datetime.now(timezone.utc).isoformat()
-        ])
+def log_robots_block(writer, authority: str, url: str, reason: str):
+    """Log robots.txt block to CSV."""
+    writer.writerow([
+        authority,
+        url,
+        reason,
+        datetime.now(timezone.utc).isoformat()
+    ])
 
 
 def main():
@@ -407,6 +530,12 @@ def main():
     print("=" * 60)
     print()
 
+    # Scrapes go straight to the REST API, so nothing else would catch a missing key
+    fc_api_key = os.getenv('FIRECRAWL_API_KEY')
+    if not fc_api_key:
+        print("✗ FIRECRAWL_API_KEY not set in app/.env")
+        sys.exit(1)
+
     # Load targets (prefer CSV from Step B; otherwise build from DB)
     print("Loading target events (zero/short-doc focus)...")
     candidates = get_urls_needing_docs()
@@ -418,29 +547,40 @@ def main():
         print("✓ STEP 2: PASS (no work needed)")
         sys.exit(0)
 
-    # Limit to MAX_DOCUMENTS and prioritize by authority
+    # Limit to MAX_DOCUMENTS and prioritize by authority. Targets built from
+    # the DB are already capped in SQL; this only trims a larger targets CSV.
     if len(candidates) > MAX_DOCUMENTS:
         print(f"Limiting to {MAX_DOCUMENTS} candidates (from {len(candidates)})")
-        # Prioritize by authority diversity and document length
-        candidates_by_auth = {}
+        # Take up to the per-authority cap to ensure diversity
+        per_auth_limit = per_authority_limit(len({c['authority'] for c in candidates}))
+        taken = Counter()
+        limited_candidates = []
         for candidate in candidates:
             auth = candidate['authority']
-            if auth not in candidates_by_auth:
-                candidates_by_auth[auth] = []
-            candidates_by_auth[auth].append(candidate)
-
-        # Take up to 30 per authority to ensure diversity
-        limited_candidates = []
-        per_auth_limit = min(30, MAX_DOCUMENTS // len(candidates_by_auth))
-
-        for auth, auth_candidates in candidates_by_auth.items():
-            limited_candidates.extend(auth_candidates[:per_auth_limit])
+            if taken[auth] < per_auth_limit:
+                taken[auth] += 1
+                limited_candidates.append(candidate)
 
         candidates = limited_candidates[:MAX_DOCUMENTS]
 
     # Initialize Firecrawl and robots checker
-    fc_app = FirecrawlApp(api_key=os.getenv('FIRECRAWL_API_KEY'))
+    fc_session = make_firecrawl_session(fc_api_key)
     robots_checker = RobotsChecker(os.getenv('ROBOTS_UA', 'AseanForgeBot/1.0'))
+    robots_checker.warm(c['url'] for c in candidates)
+    # One verdict per distinct URL (robots.txt is already cached per host)
+    robots_allowed = {url: robots_checker.is_allowed(url) for url in {c['url'] for c in candidates}}
+
+    # Firecrawl settings resolved once per authority
+    auth_settings = {
+        c['authority']: AUTHORITY_SETTINGS.get(c['authority'], AUTHORITY_SETTINGS['default'])
+        for c in candidates
+    }
+
+    # Existing document state for every candidate, fetched up front
+    events_with_qual, url_to_existing, taken_urls = prefetch_doc_state(candidates)
+    # With a unique source_url, inserting a taken URL can only conflict: go
+    # straight to the '#event=' variant for those
+    known_taken = taken_urls if source_url_is_unique() else set()
 
     # Process candidates
     print(f"Processing {len(candidates)} candidates...")
@@ -452,107 +592,196 @@ def main():
     failed_fetches = 0
     link_backfills = 0
     scrapes = 0
+    processed = 0
+    total = len(candidates)
+
+    # Scrapes run on a pool; everything else (checks, DB writes, CSV logs)
+    # stays on this thread. Candidates whose URL is already being scraped
+    # wait for the next round so they can link-backfill instead.
+    remaining = interleave_by_authority(list(enumerate(candidates, 1)))
+    limit_reached = False
+    backfill_failed = set()
+
+    # Documents waiting for the next multi-row INSERT
+    pending = []
+    deferred = []
+
+    def flush_documents():
+        """Insert pending documents and record the outcome for each candidate."""
+        nonlocal link_backfills, scrapes, failed_fetches
+        if not pending:
+            return
+        batch = pending[:]
+        pending.clear()
+        try:
+            results = insert_documents([item['row'] for item in batch], known_taken)
+        except Exception as e:
+            # One bad row fails the whole statement: retry row by row so only it is lost
+            print(f"    ✗ Database error on batch insert, retrying rows one by one: {e}")
+            results = []
+            for item in batch:
+                try:
+                    results.extend(insert_documents([item['row']], known_taken))
+                except Exception as row_error:
+                    print(f"    ✗ Database error: {row_error}")
+                    results.append(None)
+
+        for item, created in zip(batch, results):
+            i, candidate = item['i'], item['candidate']
+            url = candidate['url']
+            authority = candidate['authority']
+            event_id = candidate['event_id']
+            length = len(item['row'][5] or '')
+            print(f"  [{i}/{total}] {authority}: {url[:60]}...")
+
+            if created is None:
+                if item['source_type'] == 'link_backfill':
+                    print("    ✗ Link-backfill attempt failed; will try scrape")
+                    backfill_failed.add(event_id)
+                    deferred.append((i, candidate))
+                else:
+                    print(f"    ✗ Failed to create document")
+                    failed_fetches += 1
+                    log_fetch_failure(failures_log, authority, url, "db_insert_failed")
+                continue
 
-    for i, candidate in enumerate(candidates, 1):
-        url = candidate['url']
-        authority = candidate['authority']
-        event_id = candidate['event_id']
-
-        print(f"  [{i}/{len(candidates)}] {authority}: {url[:60]}...")
-
-        # Skip if already has qualifying doc
-        if has_qualifying_doc(event_id):
-            print("    ✗ Skipping: event already has qualifying document (>=400 chars)")
-            continue
-
-        # Link-backfill first: if a qualifying doc exists anywhere, clone it to this event
-        existing = get_existing_qualifying_doc(url)
-        if existing:
-            clone = clone_document_to_event(event_id, authority, existing)
-            if clone:
-                length = len(existing.get('clean_text') or '')
-                row = {
-                    'event_id': event_id,
-                    'authority': authority,
-                    'url': clone['url'],
-                    'source_type': 'link_backfill',
-                    'document_id': clone['document_id'],
-                    'clean_text_length': length,
-                    'timestamp': datetime.now(timezone.utc).isoformat(),
-                }
-                created_docs.append(row)
-                append_canonical_csv(row)
+            events_with_qual.add(event_id)
+            if known_taken is taken_urls:
+                taken_urls.add(created['url'])
+            if item['source_type'] == 'link_backfill':
                 link_backfills += 1
                 print(f"    ✓ Link-backfilled document ({length} chars)")
-                # Respectful pacing even on link-backfill
-                time.sleep(0.2)
-                continue
             else:
-                print("    ✗ Link-backfill attempt failed; will try scrape")
-
-        # Check Firecrawl limit
-        if firecrawl_urls_used >= MAX_FIRECRAWL_URLS:
-            print(f"    ✗ Reached Firecrawl URL limit ({MAX_FIRECRAWL_URLS})")
-            break
-
-        # Check robots.txt
-        if not robots_checker.is_allowed(url):
-            print(f"    ✗ Blocked by robots.txt")
-            log_robots_block(authority, url, "disallowed by robots.txt")
-            robots_blocks += 1
-            continue
-
-        # Fetch with Firecrawl (with timeout)
-        firecrawl_urls_used += 1
-        try:
-            content = fetch_with_firecrawl(url, authority, fc_app)
-        except Exception as e:
-            print(f"    ✗ Firecrawl exception: {e}")
-            failed_fetches += 1
-            log_fetch_failure(authority, url, f"firecrawl_exception: {e}")
-            continue
-
-        if content is None:
-            print(f"    ✗ Failed to fetch content")
-            failed_fetches += 1
-            log_fetch_failure(authority, url, "no_content")
-            continue
-
-        # Check content length
-        text_length = len(content['text'])
-        if text_length < 400:
-            print(f"    ✗ Content too short ({text_length} chars)")
-            failed_fetches += 1
-            log_fetch_failure(authority, url, f"short_content:{text_length}")
-            continue
-
-        # Create document (per-event insert with fallback if source_url is unique)
-        created = create_document(event_id, url, content)
-        if created:
-            print(f"    ✓ Created document ({text_length} chars)")
+                scrapes += 1
+                print(f"    ✓ Created document ({length} chars)")
+                # Keep the prefetched state current for later candidates
+                if created['url'] == url:
+                    url_to_existing.setdefault(url, {
+                        'document_id': created['document_id'],
+                        'source': item['row'][1],
+                        'source_url': url,
+                        'title': item['row'][3],
+                        'raw_text': item['row'][4],
+                        'clean_text': item['row'][5],
+                        'page_spans': item['row'][6],
+                        'rendered': item['row'][7],
+                    })
             row = {
                 'event_id': event_id,
                 'authority': authority,
                 'url': created['url'],
-                'source_type': 'scrape',
+                'source_type': item['source_type'],
                 'document_id': created['document_id'],
-                'clean_text_length': text_length,
+                'clean_text_length': length,
                 'timestamp': datetime.now(timezone.utc).isoformat(),
             }
             created_docs.append(row)
-            append_canonical_csv(row)
-            scrapes += 1
-        else:
-            print(f"    ✗ Failed to create document")
-            failed_fetches += 1
-            log_fetch_failure(authority, url, "db_insert_failed")
-
-        # Rate limiting and progress update
-        time.sleep(1.0)  # Increased delay to be more respectful
-
-        # Progress checkpoint every 10 items
-        if i % 10 == 0:
-            print(f"    Progress: {i}/{len(candidates)} processed, {len(created_docs)} created")
+            append_canonical_csv(canonical_log, row)
+
+    def queue_document(i, candidate, source_type, row):
+        pending.append({'i': i, 'candidate': candidate, 'source_type': source_type, 'row': row})
+        if len(pending) >= DOC_BATCH_SIZE:
+            flush_documents()
+
+    with ExitStack() as stack:
+        # Output CSVs stay open (block-buffered) for the whole run
+        canonical_log = open_csv_log(stack, CANONICAL_DOCS_CSV, CANONICAL_FIELDS)
+        failures_log = open_csv_log(stack, FETCH_FAILURES_CSV, ['authority', 'url', 'error', 'timestamp'])
+        robots_log = open_csv_log(stack, ROBOTS_BLOCKED_CSV, ['authority', 'url', 'reason', 'timestamp'])
+        # Session closes after the pool has drained its scrapes
+        stack.enter_context(fc_session)
+        pool = ThreadPoolExecutor(max_workers=FIRECRAWL_WORKERS)
+        # When unwinding on an error, drop queued scrapes instead of spending credits on them
+        stack.push(lambda exc_type, exc, tb: pool.shutdown(wait=True, cancel_futures=exc_type is not None))
+
+        while remaining and not limit_reached:
+            jobs = []
+            deferred = []
+            scheduled_urls = set()
+
+            for i, candidate in remaining:
+                url = candidate['url']
+                authority = candidate['authority']
+                event_id = candidate['event_id']
+
+                if url in scheduled_urls:
+                    deferred.append((i, candidate))
+                    continue
+
+                # Skip if already has qualifying doc
+                if event_id in events_with_qual:
+                    print(f"  [{i}/{total}] {authority}: {url[:60]}...")
+                    print("    ✗ Skipping: event already has qualifying document (>=400 chars)")
+                    continue
+
+                # Link-backfill first: if a qualifying doc exists anywhere, clone it to this event
+                existing = url_to_existing.get(url)
+                if existing and event_id not in backfill_failed:
+                    queue_document(i, candidate, 'link_backfill', clone_document_row(event_id, existing))
+                    continue
+
+                print(f"  [{i}/{total}] {authority}: {url[:60]}...")
+
+                # Check Firecrawl limit
+                if firecrawl_urls_used >= MAX_FIRECRAWL_URLS:
+                    print(f"    ✗ Reached Firecrawl URL limit ({MAX_FIRECRAWL_URLS})")
+                    limit_reached = True
+                    break
+
+                # Check robots.txt
+                if not robots_allowed[url]:
+                    print(f"    ✗ Blocked by robots.txt")
+                    log_robots_block(robots_log, authority, url, "disallowed by robots.txt")
+                    robots_blocks += 1
+                    continue
+
+                # Fetch with Firecrawl (queued on the pool)
+                firecrawl_urls_used += 1
+                scheduled_urls.add(url)
+                jobs.append((i, candidate, pool.submit(scrape_candidate, url, authority,
+                                                       auth_settings[authority], fc_session)))
+                print("    … queued for Firecrawl")
+
+            for i, candidate, future in jobs:
+                url = candidate['url']
+                authority = candidate['authority']
+                event_id = candidate['event_id']
+                content, error = future.result()
+                processed += 1
+
+                if error:
+                    print(f"  [{i}/{total}] {authority}: {url[:60]}...")
+                    print(f"    ✗ Firecrawl exception: {error}")
+                    failed_fetches += 1
+                    log_fetch_failure(failures_log, authority, url, f"firecrawl_exception: {error}")
+                    continue
+
+                if content is None:
+                    print(f"  [{i}/{total}] {authority}: {url[:60]}...")
+                    print(f"    ✗ Failed to fetch content")
+                    failed_fetches += 1
+                    log_fetch_failure(failures_log, authority, url, "no_content")
+                    continue
+
+                # Check content length
+                text_length = len(content['text'])
+                if text_length < 400:
+                    print(f"  [{i}/{total}] {authority}: {url[:60]}...")
+                    print(f"    ✗ Content too short ({text_length} chars)")
+                    failed_fetches += 1
+                    log_fetch_failure(failures_log, authority, url, f"short_content:{text_length}")
+                    continue
+
+                # Create document (batched insert with fallback if source_url is unique)
+                queue_document(i, candidate, 'scrape', scraped_document_row(event_id, url, content))
+
+                # Progress checkpoint every 10 scrapes
+                if processed % 10 == 0:
+                    print(f"    Progress: {processed} scraped, {len(created_docs)} created")
+
+            # Round done: land its documents before deferred candidates re-check state
+            flush_documents()
+            remaining = deferred
 
     print()
     print("CANONICAL DOC CREATION RESULTS")
@@ -564,7 +793,7 @@ def main():
 
     if created_docs:
         lengths = [doc['clean_text_length'] for doc in created_docs]
-        median_length = sorted(lengths)[len(lengths) // 2]
+        median_length = int(median(lengths))
         print(f"Median document length: {median_length} chars")
 
     print()
@@ -8,7 +8,9 @@ Purpose: Enrich newly created documents using OpenAI Batch API
 import json
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone
+from typing import List, Tuple
 
 try:
     from dotenv import load_dotenv
@@ -17,7 +19,6 @@ except Exception:
     pass
 
 import psycopg2
-from psycopg2.extras import RealDictCursor
 
 # Import enrichment modules
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
@@ -29,6 +30,10 @@ CANONICAL_CSV = os.path.join(OUTPUT_DIR, "mvp_canonical_docs.csv")
 # Budget limits (MVP)
 MAX_USD = float(os.getenv('OPENAI_ENRICH_MAX_USD', '10'))
 
+# Batch polling (MVP waits at most 30 minutes per batch)
+POLL_INTERVAL_SECONDS = 30
+POLL_TIMEOUT_HOURS = 0.5
+
 
 def get_db():
     """Get database connection."""
@@ -42,44 +47,76 @@ def load_step_c_event_ids() -> list:
     """Load event IDs from Step C output CSV."""
     if not os.path.exists(CANONICAL_CSV):
         return []
-    ids = []
+    ids = set()
     import csv
-    with open(CANONICAL_CSV, 'r') as f:
-        reader = csv.DictReader(f)
+    with open(CANONICAL_CSV, 'r', newline='') as f:
+        # Only event_id is needed: read it by position instead of a dict per row
+        reader = csv.reader(f)
+        header = next(reader, [])
+        if 'event_id' not in header:
+            return []
+        ei = header.index('event_id')
         for row in reader:
-            if row.get('event_id'):
-                ids.append(row['event_id'])
-    # De-duplicate
-    return sorted(list(set(ids)))
+            if len(row) > ei and row[ei]:
+                ids.add(row[ei])
+    # De-duplicated while reading; the SQL cohort filter does not depend on order
+    return list(ids)
+
 
+def get_events_needing_enrichment(event_ids: list) -> Tuple[List[str], List[str]]:
+    """
+    Get events (restricted to Step C cohort) that need embeddings or summaries.
 
-def get_events_needing_enrichment(event_ids: list) -> list:
-    """Get events (restricted to Step C cohort) that need embeddings or summaries."""
+    Returns (embedding_ids, summary_ids), each in authority / newest-first order.
+    """
     if not event_ids:
-        return []
+        return [], []
     conn = get_db()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    placeholders = ','.join(['%s'] * len(event_ids))
-    cur.execute(f"""
+    cur = conn.cursor()
+    # One array parameter keeps the statement text constant regardless of cohort size;
+    # only the ids and the two flags cross the wire
+    cur.execute("""
         SELECT
             e.event_id,
-            e.authority,
-            e.title,
-            e.url,
-            CASE WHEN e.embedding IS NULL THEN 1 ELSE 0 END as needs_embedding,
-            CASE WHEN e.summary_en IS NULL THEN 1 ELSE 0 END as needs_summary
+            e.embedding IS NULL AS needs_embedding,
+            e.summary_en IS NULL AS needs_summary
         FROM events e
-        INNER JOIN documents d ON d.event_id = e.event_id
-        WHERE e.event_id IN ({placeholders})
-          AND d.clean_text IS NOT NULL
-          AND LENGTH(d.clean_text) >= 400
+        WHERE e.event_id = ANY(%s::uuid[])
+          AND EXISTS (
+              SELECT 1 FROM documents d
+              WHERE d.event_id = e.event_id
+                AND d.clean_text IS NOT NULL
+                AND LENGTH(d.clean_text) >= 400
+          )
           AND (e.embedding IS NULL OR e.summary_en IS NULL)
         ORDER BY e.authority, e.pub_date DESC
-    """, event_ids)
-    results = cur.fetchall()
+    """, (event_ids,))
+    embedding_ids, summary_ids = [], []
+    for event_id, needs_embedding, needs_summary in cur:
+        if needs_embedding:
+            embedding_ids.append(event_id)
+        if needs_summary:
+            summary_ids.append(event_id)
     cur.close()
     conn.close()
-    return [dict(row) for row in results]
+    return embedding_ids, summary_ids
+
+
+def count_enriched(embedding_ids: List[str], summary_ids: List[str]) -> Tuple[int, int]:
+    """Count how many of embedding_ids now have an embedding and summary_ids a summary."""
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT
+            COUNT(*) FILTER (WHERE embedding IS NOT NULL AND event_id = ANY(%(emb)s::uuid[])),
+            COUNT(*) FILTER (WHERE summary_en IS NOT NULL AND event_id = ANY(%(sum)s::uuid[]))
+        FROM events
+        WHERE event_id = ANY(%(emb)s::uuid[]) OR event_id = ANY(%(sum)s::uuid[])
+    """, {'emb': embedding_ids, 'sum': summary_ids})
+    emb_filled, sum_filled = cur.fetchone()
+    cur.close()
+    conn.close()
+    return emb_filled, sum_filled
 
 
 def main():
@@ -93,17 +130,14 @@ def main():
     cohort_event_ids = load_step_c_event_ids()
 
     # Get events needing enrichment, restricted to cohort
-    events = get_events_needing_enrichment(cohort_event_ids)
-
-    events_needing_embeddings = [e for e in events if e['needs_embedding']]
-    events_needing_summaries = [e for e in events if e['needs_summary']]
+    embedding_ids, summary_ids = get_events_needing_enrichment(cohort_event_ids)
 
     print(f"  ✓ Cohort size: {len(cohort_event_ids)} events")
-    print(f"  ✓ Embeddings needed: {len(events_needing_embeddings)} events")
-    print(f"  ✓ Summaries needed: {len(events_needing_summaries)} events")
+    print(f"  ✓ Embeddings needed: {len(embedding_ids)} events")
+    print(f"  ✓ Summaries needed: {len(summary_ids)} events")
     print()
 
-    if len(events) == 0:
+    if not embedding_ids and not summary_ids:
         print("No events need enrichment. Skipping Step 3.")
         print("✓ STEP 3: PASS (no work needed)")
         sys.exit(0)
@@ -112,11 +146,10 @@ def main():
     batch_ids = []
     
     # Build and submit embedding requests
-    if events_needing_embeddings:
-        print(f"Building embedding requests for {len(events_needing_embeddings)} events...")
+    if embedding_ids:
+        print(f"Building embedding requests for {len(embedding_ids)} events...")
         
-        event_ids = [e['event_id'] for e in events_needing_embeddings]
-        emb_result = builders.build_embedding_requests(event_ids)
+        emb_result = builders.build_embedding_requests(event_ids=embedding_ids)
         
         if emb_result['request_count'] > 0:
             projected_cost = emb_result.get('projected_cost_usd', 0)
@@ -138,11 +171,10 @@ def main():
             print("  ✓ No embedding requests to submit")
     
     # Build and submit summary requests
-    if events_needing_summaries:
-        print(f"Building summary requests for {len(events_needing_summaries)} events...")
+    if summary_ids:
+        print(f"Building summary requests for {len(summary_ids)} events...")
         
-        event_ids = [e['event_id'] for e in events_needing_summaries]
-        sum_result = builders.build_summary_requests(event_ids)
+        sum_result = builders.build_summary_requests(event_ids=summary_ids)
         
         if sum_result['request_count'] > 0:
             projected_cost = sum_result.get('projected_cost_usd', 0)
@@ -172,72 +204,89 @@ def main():
         print("✓ STEP 3: PASS (no work needed)")
         sys.exit(0)
     
-    # Poll for completion
+    # Poll for completion (batches are polled side by side, so the wait is
+    # the slowest batch rather than the sum of them)
     print("Polling for batch completion...")
     completed_batches = []
     
-    for batch_type, batch_id in batch_ids:
-        print(f"  Polling {batch_type} batch: {batch_id}")
+    with ThreadPoolExecutor(max_workers=len(batch_ids)) as pool:
+        futures = {}
+        for batch_type, batch_id in batch_ids:
+            print(f"  Polling {batch_type} batch: {batch_id}")
+            # Poll with timeout
+            futures[pool.submit(poll.poll_batch, batch_id,
+                                poll_interval_seconds=POLL_INTERVAL_SECONDS,
+                                timeout_hours=POLL_TIMEOUT_HOURS)] = (batch_type, batch_id)
         
-        # Poll with timeout
-        status = poll.poll_batch_completion(batch_id, max_wait_minutes=30)
-        
-        if status == 'completed':
-            print(f"  ✓ {batch_type} batch completed")
-            completed_batches.append((batch_type, batch_id))
-        else:
-            print(f"  ✗ {batch_type} batch failed or timed out: {status}")
+        for future in as_completed(futures):
+            batch_type, batch_id = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {'status': f"error: {e}"}
+            
+            status = result.get('status')
+            if status == 'completed' and result.get('output_file_path'):
+                print(f"  ✓ {batch_type} batch completed")
+                completed_batches.append((batch_type, batch_id, result['output_file_path']))
+            elif status == 'completed':
+                print(f"  ✗ {batch_type} batch completed without an output file")
+            else:
+                print(f"  ✗ {batch_type} batch failed or timed out: {status}")
     
     print()
     
-    # Merge results
+    # Merge results (embeddings and summaries update different columns of
+    # events, one autocommit row UPDATE at a time on separate connections,
+    # so the two merges run concurrently)
     merge_errors = 0
+    merged_types = set()
     
-    for batch_type, batch_id in completed_batches:
-        print(f"Merging {batch_type} results from batch {batch_id}...")
-        
-        try:
-            if batch_type == 'embeddings':
-                merge.merge_embedding_results(batch_id)
-            else:  # summaries
-                merge.merge_summary_results(batch_id)
-            
-            print(f"  ✓ Merged {batch_type} results")
+    if completed_batches:
+        with ThreadPoolExecutor(max_workers=len(completed_batches)) as pool:
+            futures = {}
+            for batch_type, batch_id, results_path in completed_batches:
+                print(f"Merging {batch_type} results from batch {batch_id}...")
+                if batch_type == 'embeddings':
+                    futures[pool.submit(merge.merge_embeddings, results_path)] = batch_type
+                else:  # summaries
+                    futures[pool.submit(merge.merge_summaries, results_path)] = batch_type
             
-        except Exception as e:
-            print(f"  ✗ Error merging {batch_type}: {e}")
-            merge_errors += 1
+            for future in as_completed(futures):
+                batch_type = futures[future]
+                try:
+                    stats = future.result()
+                    print(f"  ✓ Merged {batch_type} results "
+                          f"(upserted {stats['upserted_count']}, errors {stats['error_count']})")
+                    merged_types.add(batch_type)
+                except Exception as e:
+                    print(f"  ✗ Error merging {batch_type}: {e}")
+                    merge_errors += 1
     
     print()
     
     # Calculate final coverage
     print("Calculating final coverage...")
     
-    conn = get_db()
-    cur = conn.cursor()
-    
-    # Get coverage for the events we tried to enrich
-    event_ids = [e['event_id'] for e in events]
-    placeholders = ','.join(['%s'] * len(event_ids))
-    
-    cur.execute(f"""
-        SELECT 
-            COUNT(*) FILTER (WHERE embedding IS NOT NULL) as with_emb,
-            COUNT(*) FILTER (WHERE summary_en IS NOT NULL) as with_sum,
-            COUNT(*) as total
-        FROM events
-        WHERE event_id IN ({placeholders})
-    """, event_ids)
+    # Coverage for the events we tried to enrich. The first query already told us
+    # which of them had an embedding / summary; only ids whose batch was merged
+    # can have changed, so just those are re-checked.
+    total = len(set(embedding_ids).union(summary_ids))
+    with_emb = total - len(embedding_ids)
+    with_sum = total - len(summary_ids)
     
-    result = cur.fetchone()
-    embedding_coverage = (result[0] / result[2]) * 100 if result[2] > 0 else 0
-    summary_coverage = (result[1] / result[2]) * 100 if result[2] > 0 else 0
+    recheck_emb = embedding_ids if 'embeddings' in merged_types else []
+    recheck_sum = summary_ids if 'summaries' in merged_types else []
+    if recheck_emb or recheck_sum:
+        emb_filled, sum_filled = count_enriched(recheck_emb, recheck_sum)
+        with_emb += emb_filled
+        with_sum += sum_filled
     
-    cur.close()
-    conn.close()
+    embedding_coverage = (with_emb / total) * 100 if total > 0 else 0
+    summary_coverage = (with_sum / total) * 100 if total > 0 else 0
     
-    print(f"  ✓ Embedding coverage: {embedding_coverage:.1f}% ({result[0]}/{result[2]})")
-    print(f"  ✓ Summary coverage: {summary_coverage:.1f}% ({result[1]}/{result[2]})")
+    print(f"  ✓ Embedding coverage: {embedding_coverage:.1f}% ({with_emb}/{total})")
+    print(f"  ✓ Summary coverage: {summary_coverage:.1f}% ({with_sum}/{total})")
     print()
     
     # Write enrichment report (Markdown)
@@ -248,8 +297,8 @@ def main():
         f.write(f"Timestamp: {datetime.now(timezone.utc).isoformat()}\n\n")
         f.write(f"Cohort size: {len(cohort_event_ids)} events\n\n")
         f.write("## Coverage\n")
-        f.write(f"- Embedding coverage: {embedding_coverage:.1f}% ({result[0]}/{result[2]})\n")
-        f.write(f"- Summary coverage: {summary_coverage:.1f}% ({result[1]}/{result[2]})\n\n")
+        f.write(f"- Embedding coverage: {embedding_coverage:.1f}% ({with_emb}/{total})\n")
+        f.write(f"- Summary coverage: {summary_coverage:.1f}% ({with_sum}/{total})\n\n")
         f.write("## Batches\n")
         if batch_ids:
             for btype, bid in batch_ids:
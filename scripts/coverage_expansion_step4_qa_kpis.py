@@ -5,6 +5,7 @@ Coverage Expansion Step 4: QA & KPIs
 Purpose: Run quality assurance checks and compute coverage/freshness KPIs
 """
 
+import atexit
 import csv
 import json
 import os
@@ -25,12 +26,35 @@ OUTPUT_DIR = "data/output/validation/latest"
 BASELINE_FILE = os.path.join(OUTPUT_DIR, "expansion_baseline.json")
 
 
+_conn = None
+
+
 def get_db():
-    """Get database connection."""
-    db_url = os.getenv("NEON_DATABASE_URL")
-    if not db_url:
-        raise RuntimeError("NEON_DATABASE_URL not set in app/.env")
-    return psycopg2.connect(db_url)
+    """
+    Get the shared database connection, connecting on first use.
+
+    QA checks and coverage metrics run over the same connection (autocommit,
+    read-only queries); callers close cursors, not the connection.
+    """
+    global _conn
+    if _conn is None or _conn.closed:
+        db_url = os.getenv("NEON_DATABASE_URL")
+        if not db_url:
+            raise RuntimeError("NEON_DATABASE_URL not set in app/.env")
+        _conn = psycopg2.connect(db_url)
+        _conn.autocommit = True
+    return _conn
+
+
+def close_db():
+    """Close the shared database connection, if open."""
+    global _conn
+    if _conn is not None and not _conn.closed:
+        _conn.close()
+    _conn = None
+
+
+atexit.register(close_db)
 
 
 def decimal_to_float(obj):
@@ -51,9 +75,19 @@ def run_qa_checks():
 
     qa_results = {}
 
+    # Events-side checks (uniqueness, URL validity, timeliness) in one pass over events
+    cutoff_date = datetime.now(timezone.utc) - timedelta(days=90)
+    cur.execute("""
+        SELECT
+            COUNT(*) as total_events,
+            COUNT(DISTINCT event_hash) as unique_hashes,
+            COUNT(*) FILTER (WHERE url IS NULL OR url = '') as invalid_urls,
+            COUNT(*) FILTER (WHERE pub_date >= %s) as recent_events
+        FROM events
+    """, (cutoff_date,))
+    total_events, unique_hashes, invalid_urls, recent_events = cur.fetchone()
+
     # 1. Uniqueness checks
-    cur.execute("SELECT COUNT(*), COUNT(DISTINCT event_hash) FROM events")
-    total_events, unique_hashes = cur.fetchone()
     qa_results['uniqueness'] = {
         'total_events': total_events,
         'unique_hashes': unique_hashes,
@@ -62,22 +96,24 @@ def run_qa_checks():
     }
 
     # 2. URL validity
-    cur.execute("SELECT COUNT(*) FROM events WHERE url IS NULL OR url = ''")
-    invalid_urls = cur.fetchone()[0]
     qa_results['url_validity'] = {
         'invalid_urls': invalid_urls,
         'pass': invalid_urls == 0
     }
 
-    # 3. Document quality
+    # 3. Document quality (each clean_text is detoasted once to measure it,
+    # not once per aggregate)
     cur.execute("""
         SELECT
             COUNT(*) as total_docs,
-            COUNT(*) FILTER (WHERE LENGTH(clean_text) >= 1000) as good_docs,
-            AVG(LENGTH(clean_text)) as avg_length,
-            PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY LENGTH(clean_text)) as median_length
-        FROM documents
-        WHERE clean_text IS NOT NULL
+            COUNT(*) FILTER (WHERE len >= 1000) as good_docs,
+            AVG(len) as avg_length,
+            PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY len) as median_length
+        FROM (
+            SELECT LENGTH(clean_text) AS len
+            FROM documents
+            WHERE clean_text IS NOT NULL
+        ) doc_lengths
     """)
     result = cur.fetchone()
     qa_results['document_quality'] = {
@@ -89,20 +125,12 @@ def run_qa_checks():
     }
 
     # 4. Timeliness
-    cutoff_date = datetime.now(timezone.utc) - timedelta(days=90)
-    cur.execute("""
-        SELECT COUNT(*)
-        FROM events
-        WHERE pub_date >= %s
-    """, (cutoff_date,))
-    recent_events = cur.fetchone()[0]
     qa_results['timeliness'] = {
         'events_last_90_days': recent_events,
         'pass': recent_events >= 10  # Should have at least 10 recent events
     }
 
     cur.close()
-    conn.close()
 
     # Overall QA pass
     qa_results['overall_pass'] = all(
@@ -118,18 +146,44 @@ def compute_coverage_metrics():
     conn = get_db()
     cur = conn.cursor(cursor_factory=RealDictCursor)
 
-    # Global metrics
+    # Global, per-authority and 90-day freshness metrics in one pass: GROUPING
+    # SETS adds the all-events row (is_global) alongside the per-authority rows.
+    # has_doc is an EXISTS probe whose predicate matches the partial index
+    # idx_documents_qualifying, so clean_text is never detoasted here and each
+    # event is counted once however many documents it has.
+    cutoff_date = datetime.now(timezone.utc) - timedelta(days=90)
     cur.execute("""
+        WITH per_event AS (
+            SELECT
+                e.authority,
+                e.pub_date,
+                e.summary_en IS NOT NULL as has_summary,
+                e.embedding IS NOT NULL as has_embedding,
+                EXISTS (
+                    SELECT 1 FROM documents d
+                    WHERE d.event_id = e.event_id
+                      AND d.clean_text IS NOT NULL AND LENGTH(d.clean_text) >= 400
+                ) as has_doc
+            FROM events e
+        )
         SELECT
+            authority,
+            GROUPING(authority) AS is_global,
             COUNT(*) as total_events,
-            COUNT(*) FILTER (WHERE d.clean_text IS NOT NULL AND LENGTH(d.clean_text) >= 400) as events_with_docs,
-            COUNT(*) FILTER (WHERE e.summary_en IS NOT NULL) as events_with_summaries,
-            COUNT(*) FILTER (WHERE e.embedding IS NOT NULL) as events_with_embeddings
-        FROM events e
-        LEFT JOIN documents d ON d.event_id = e.event_id
-    """)
+            COUNT(*) FILTER (WHERE has_doc) as events_with_docs,
+            COUNT(*) FILTER (WHERE has_summary) as events_with_summaries,
+            COUNT(*) FILTER (WHERE has_embedding) as events_with_embeddings,
+            COUNT(*) FILTER (WHERE pub_date >= %(cutoff)s) as total_events_90d,
+            COUNT(*) FILTER (WHERE has_doc AND pub_date >= %(cutoff)s) as events_with_docs_90d
+        FROM per_event
+        GROUP BY GROUPING SETS ((), (authority))
+        ORDER BY is_global DESC, authority
+    """, {'cutoff': cutoff_date})
+
+    rows = cur.fetchall()
+    cur.close()
 
-    global_result = cur.fetchone()
+    global_result = rows[0]
     global_metrics = {
         'total_events': global_result['total_events'],
         'events_with_docs': global_result['events_with_docs'],
@@ -141,23 +195,9 @@ def compute_coverage_metrics():
     }
 
     # Per-authority metrics
-    cur.execute("""
-        SELECT
-            e.authority,
-            COUNT(*) as total_events,
-            COUNT(*) FILTER (WHERE d.clean_text IS NOT NULL AND LENGTH(d.clean_text) >= 400) as events_with_docs,
-            COUNT(*) FILTER (WHERE e.summary_en IS NOT NULL) as events_with_summaries,
-            COUNT(*) FILTER (WHERE e.embedding IS NOT NULL) as events_with_embeddings
-        FROM events e
-        LEFT JOIN documents d ON d.event_id = e.event_id
-        GROUP BY e.authority
-        ORDER BY e.authority
-    """)
-
-    authority_results = cur.fetchall()
     authority_metrics = {}
 
-    for row in authority_results:
+    for row in rows[1:]:
         authority = row['authority']
         authority_metrics[authority] = {
             'total_events': row['total_events'],
@@ -170,26 +210,12 @@ def compute_coverage_metrics():
         }
 
     # Freshness metrics (last 90 days)
-    cutoff_date = datetime.now(timezone.utc) - timedelta(days=90)
-    cur.execute("""
-        SELECT
-            COUNT(*) as total_events,
-            COUNT(*) FILTER (WHERE d.clean_text IS NOT NULL AND LENGTH(d.clean_text) >= 400) as events_with_docs
-        FROM events e
-        LEFT JOIN documents d ON d.event_id = e.event_id
-        WHERE e.pub_date >= %s
-    """, (cutoff_date,))
-
-    freshness_result = cur.fetchone()
     freshness_metrics = {
-        'total_events_90d': freshness_result['total_events'],
-        'events_with_docs_90d': freshness_result['events_with_docs'],
-        'doc_completeness_90d_pct': (freshness_result['events_with_docs'] / max(1, freshness_result['total_events'])) * 100
+        'total_events_90d': global_result['total_events_90d'],
+        'events_with_docs_90d': global_result['events_with_docs_90d'],
+        'doc_completeness_90d_pct': (global_result['events_with_docs_90d'] / max(1, global_result['total_events_90d'])) * 100
     }
 
-    cur.close()
-    conn.close()
-
     return {
         'global': decimal_to_float(global_metrics),
         'by_authority': decimal_to_float(authority_metrics),
@@ -18,7 +18,6 @@ try:
 except Exception:
     pass
 
-import pandas as pd
 import psycopg2
 from psycopg2.extras import RealDictCursor
 
@@ -35,68 +34,131 @@ def get_db():
     return psycopg2.connect(db_url)
 
 
+EVENTS_EXPORT_SQL = """
+    SELECT 
+        event_id,
+        event_hash,
+        authority,
+        title,
+        url,
+        pub_date,
+        access_ts,
+        summary_en,
+        summary_model,
+        summary_ts,
+        summary_version,
+        embedding_model,
+        embedding_ts,
+        embedding_version
+    FROM events
+    ORDER BY authority, pub_date DESC
+"""
+
+DOCUMENTS_EXPORT_SQL = """
+    SELECT 
+        document_id,
+        event_id,
+        source,
+        source_url,
+        title,
+        LENGTH(clean_text) as clean_text_length,
+        LENGTH(raw_text) as raw_text_length,
+        rendered
+    FROM documents
+    ORDER BY event_id
+"""
+
+# Rows per server-side cursor fetch / Parquet row group
+EXPORT_BATCH_ROWS = 10000
+
+
+def export_csv(conn, query: str, path: str) -> int:
+    """Stream a query straight from the server into a CSV file (COPY); returns the row count."""
+    with open(path, 'w', newline='', encoding='utf-8') as f, conn.cursor() as cur:
+        cur.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER)", f)
+        return cur.rowcount
+
+
+def _arrow_type(pa, type_code: int):
+    """Parquet column type for a PostgreSQL type OID (text for anything not listed)."""
+    return {
+        16: pa.bool_(),                          # bool
+        20: pa.int64(), 21: pa.int64(), 23: pa.int64(),  # int8 / int2 / int4
+        1082: pa.date32(),                       # date
+        1114: pa.timestamp('us'),                # timestamp
+        1184: pa.timestamp('us', tz='UTC'),      # timestamptz
+    }.get(type_code, pa.string())
+
+
+def export_parquet(conn, name: str, query: str, path: str) -> None:
+    """
+    Stream a query into a Parquet file in EXPORT_BATCH_ROWS batches.
+
+    Rows come from a server-side (named) cursor and go out one row group at a
+    time, so memory stays at one batch however large the table is.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        print(f"  ! Skipping Parquet export for {name} (pyarrow missing): {e}")
+        return
+
+    with conn.cursor(name=f"{name}_export") as cur:
+        cur.itersize = EXPORT_BATCH_ROWS
+        cur.execute(query)
+        writer = None
+        try:
+            while True:
+                rows = cur.fetchmany(EXPORT_BATCH_ROWS)
+                if writer is None:
+                    # Schema from the column types, not the values, so an all-NULL first batch is fine
+                    schema = pa.schema([(col.name, _arrow_type(pa, col.type_code)) for col in cur.description])
+                    writer = pq.ParquetWriter(path, schema)
+                if not rows:
+                    break
+                columns = list(zip(*rows))
+                writer.write_table(pa.Table.from_arrays(
+                    [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                    schema=schema,
+                ))
+        finally:
+            if writer is not None:
+                writer.close()
+
+
 def export_data():
     """Export events and documents to Parquet and CSV."""
     conn = get_db()
-    
-    # Export events
-    print("Exporting events table...")
-    events_df = pd.read_sql("""
-        SELECT 
-            event_id,
-            event_hash,
-            authority,
-            title,
-            url,
-            pub_date,
-            access_ts,
-            summary_en,
-            summary_model,
-            summary_ts,
-            summary_version,
-            embedding_model,
-            embedding_ts,
-            embedding_version
-        FROM events
-        ORDER BY authority, pub_date DESC
-    """, conn)
+    # Named (server-side) cursors need a transaction; keep it read-only
+    conn.set_session(readonly=True)
     
     os.makedirs(DATASET_DIR, exist_ok=True)
     
+    # Export events
+    print("Exporting events table...")
     # Save as Parquet and CSV (Parquet optional)
     try:
-        events_df.to_parquet(os.path.join(DATASET_DIR, "events.parquet"), index=False)
+        export_parquet(conn, "events", EVENTS_EXPORT_SQL, os.path.join(DATASET_DIR, "events.parquet"))
     except Exception as e:
-        print(f"  ! Skipping Parquet export for events (pyarrow/fastparquet missing): {e}")
-    events_df.to_csv(os.path.join(DATASET_DIR, "events.csv"), index=False)
-    print(f"  ✓ Exported {len(events_df)} events (CSV)")
+        conn.rollback()
+        print(f"  ! Skipping Parquet export for events: {e}")
+    events_count = export_csv(conn, EVENTS_EXPORT_SQL, os.path.join(DATASET_DIR, "events.csv"))
+    print(f"  ✓ Exported {events_count} events (CSV)")
 
     # Export documents
     print("Exporting documents table...")
-    documents_df = pd.read_sql("""
-        SELECT 
-            document_id,
-            event_id,
-            source,
-            source_url,
-            title,
-            LENGTH(clean_text) as clean_text_length,
-            LENGTH(raw_text) as raw_text_length,
-            rendered
-        FROM documents
-        ORDER BY event_id
-    """, conn)
-    
     try:
-        documents_df.to_parquet(os.path.join(DATASET_DIR, "documents.parquet"), index=False)
+        export_parquet(conn, "documents", DOCUMENTS_EXPORT_SQL, os.path.join(DATASET_DIR, "documents.parquet"))
     except Exception as e:
-        print(f"  ! Skipping Parquet export for documents (pyarrow/fastparquet missing): {e}")
-    documents_df.to_csv(os.path.join(DATASET_DIR, "documents.csv"), index=False)
-    print(f"  ✓ Exported {len(documents_df)} documents (CSV)")
+        conn.rollback()
+        print(f"  ! Skipping Parquet export for documents: {e}")
+    documents_count = export_csv(conn, DOCUMENTS_EXPORT_SQL, os.path.join(DATASET_DIR, "documents.csv"))
+    print(f"  ✓ Exported {documents_count} documents (CSV)")
 
     conn.close()
     
-    return len(events_df), len(documents_df)
+    return events_count, documents_count
 
 
 def create_data_dictionary():
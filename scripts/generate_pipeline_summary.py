@@ -62,20 +62,28 @@ def main():
             
             total, with_summary, with_summary_model, with_embedding, with_embedding_model = cur.fetchone()
             
+            # document_id is unique, so a semi-join counts documents without
+            # the hash/sort a COUNT(DISTINCT) over the join needs
             cur.execute("""
-                SELECT COUNT(DISTINCT d.document_id)
+                SELECT COUNT(*)
                 FROM documents d
-                JOIN events e ON e.event_id = d.event_id
-                WHERE e.authority = %s;
+                WHERE EXISTS (
+                    SELECT 1 FROM events e
+                    WHERE e.event_id = d.event_id
+                      AND e.authority = %s
+                );
             """, (authority,))
             total_docs = cur.fetchone()[0]
             
             cur.execute("""
-                SELECT COUNT(DISTINCT d.document_id)
+                SELECT COUNT(*)
                 FROM documents d
-                JOIN events e ON e.event_id = d.event_id
-                WHERE e.authority = %s
-                  AND e.embedding_model IS NOT NULL;
+                WHERE EXISTS (
+                    SELECT 1 FROM events e
+                    WHERE e.event_id = d.event_id
+                      AND e.authority = %s
+                      AND e.embedding_model IS NOT NULL
+                );
             """, (authority,))
             docs_with_embedding_model = cur.fetchone()[0]
             
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Database Migration: Add Coverage Metric Indexes
+
+Adds the indexes the coverage/baseline scripts rely on:
+- idx_documents_qualifying: documents(event_id) WHERE clean_text IS NOT NULL
+  AND length(clean_text) >= 400 (the "qualifying doc" predicate)
+- idx_events_pub_date: events(pub_date) for the freshness windows
+
+Indexes are built CONCURRENTLY so the migration does not block ingest. A
+failed concurrent build leaves an INVALID index behind that IF NOT EXISTS
+would skip, so invalid indexes are dropped and rebuilt, and the run exits
+non-zero unless every index ends up valid.
+
+Usage:
+    .venv/bin/python scripts/migrate_add_coverage_indexes.py
+"""
+
+import os
+import sys
+from datetime import datetime
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv("app/.env")
+except Exception:
+    pass
+
+import psycopg2
+
+
+COVERAGE_INDEXES = {
+    "idx_documents_qualifying": """
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_documents_qualifying
+        ON documents (event_id)
+        WHERE clean_text IS NOT NULL AND length(clean_text) >= 400;
+    """,
+    "idx_events_pub_date": """
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_events_pub_date
+        ON events (pub_date);
+    """,
+}
+
+
+def index_validity(cur, names):
+    """Map index name -> pg_index.indisvalid for the given names that exist."""
+    cur.execute("""
+        SELECT c.relname, i.indisvalid
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = ANY(%s);
+    """, (list(names),))
+    return {row[0]: row[1] for row in cur.fetchall()}
+
+
+def main():
+    db_url = os.getenv("NEON_DATABASE_URL")
+    if not db_url:
+        print("ERROR: NEON_DATABASE_URL not set in app/.env", file=sys.stderr)
+        sys.exit(1)
+
+    print(f"[{datetime.utcnow().isoformat()}] Starting migration: add_coverage_indexes")
+
+    try:
+        conn = psycopg2.connect(db_url)
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+        conn.autocommit = True
+        cur = conn.cursor()
+
+        validity = index_validity(cur, COVERAGE_INDEXES)
+        for name, ddl in COVERAGE_INDEXES.items():
+            if validity.get(name) is False:
+                # Left over from a failed concurrent build; IF NOT EXISTS would skip it
+                print(f"  Dropping invalid index {name}...")
+                cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name};")
+            print(f"  Creating index {name}...")
+            cur.execute(ddl)
+            print(f"    ✓ {name}")
+
+        # Verify indexes exist and are valid (pg_indexes also lists invalid ones)
+        print("  Verifying indexes...")
+        validity = index_validity(cur, COVERAGE_INDEXES)
+        missing = [name for name in COVERAGE_INDEXES if name not in validity]
+        invalid = [name for name in COVERAGE_INDEXES if validity.get(name) is False]
+
+        cur.close()
+        conn.close()
+
+        if missing or invalid:
+            if missing:
+                print(f"    ✗ Indexes not found: {', '.join(missing)}", file=sys.stderr)
+            if invalid:
+                print(f"    ✗ Indexes INVALID: {', '.join(invalid)}", file=sys.stderr)
+            print("\nERROR: Migration did not leave all indexes valid", file=sys.stderr)
+            sys.exit(1)
+        print(f"    ✓ All {len(COVERAGE_INDEXES)} indexes verified (valid)")
+
+        print(f"[{datetime.utcnow().isoformat()}] Migration completed successfully")
+
+    except psycopg2.Error as e:
+        print(f"\nERROR: Database migration failed: {e}", file=sys.stderr)
+        sys.exit(1)
+    except Exception as e:
+        print(f"\nERROR: Unexpected error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
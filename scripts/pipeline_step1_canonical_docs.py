@@ -265,76 +265,80 @@ def main():
         print("✓ STEP 1: PASS (no work needed)")
         sys.exit(0)
     
-    # Process candidates
-    docs_created = 0
-    docs_lengths = []
-    blocked_count = 0
-    failed_count = 0
+    # Flushes the buffered robots_blocked.csv rows on every exit path
+    with robots_checker:
+        robots_checker.warm(c['url'] for c in candidates)
     
-    print(f"Processing candidates (max {MAX_DOCS_CREATED} docs)...")
+        # Process candidates
+        docs_created = 0
+        docs_lengths = []
+        blocked_count = 0
+        failed_count = 0
     
-    for idx, candidate in enumerate(candidates, 1):
-        if docs_created >= MAX_DOCS_CREATED:
-            print(f"  Reached max docs limit ({MAX_DOCS_CREATED})")
-            break
+        print(f"Processing candidates (max {MAX_DOCS_CREATED} docs)...")
+    
+        for idx, candidate in enumerate(candidates, 1):
+            if docs_created >= MAX_DOCS_CREATED:
+                print(f"  Reached max docs limit ({MAX_DOCS_CREATED})")
+                break
         
-        event_id = candidate['event_id']
-        url = candidate['url']
-        authority = candidate['authority']
+            event_id = candidate['event_id']
+            url = candidate['url']
+            authority = candidate['authority']
         
-        print(f"  [{idx}/{len(candidates)}] {authority}: {url[:80]}...")
+            print(f"  [{idx}/{len(candidates)}] {authority}: {url[:80]}...")
         
-        # Check robots.txt
-        if not robots_checker.is_allowed(url):
-            print(f"    ✗ Blocked by robots.txt")
-            robots_checker.log_block(authority, url)
-            blocked_count += 1
-            continue
+            # Check robots.txt
+            if not robots_checker.is_allowed(url):
+                print(f"    ✗ Blocked by robots.txt")
+                robots_checker.log_block(authority, url)
+                blocked_count += 1
+                continue
         
-        # Fetch content
-        result = fetch_with_firecrawl(fc_app, url, authority)
+            # Fetch content
+            result = fetch_with_firecrawl(fc_app, url, authority)
         
-        if not result or not result.get('text'):
-            print(f"    ✗ Failed to fetch content")
-            failed_count += 1
-            continue
+            if not result or not result.get('text'):
+                print(f"    ✗ Failed to fetch content")
+                failed_count += 1
+                continue
         
-        clean_text = result['text'].strip()
-        char_count = len(clean_text)
+            clean_text = result['text'].strip()
+            char_count = len(clean_text)
         
-        if char_count < 400:
-            print(f"    ✗ Content too short ({char_count} chars)")
-            failed_count += 1
-            continue
+            if char_count < 400:
+                print(f"    ✗ Content too short ({char_count} chars)")
+                failed_count += 1
+                continue
         
-        # Determine source type
-        source_type = "pdf" if url.lower().endswith('.pdf') or 'pdf' in candidate.get('content_type', '').lower() else "html"
+            # Determine source type
+            source_type = "pdf" if url.lower().endswith('.pdf') or 'pdf' in candidate.get('content_type', '').lower() else "html"
         
-        # Create document
-        success = create_canonical_document(conn, event_id, url, authority, clean_text, source_type)
+            # Create document
+            success = create_canonical_document(conn, event_id, url, authority, clean_text, source_type)
         
-        if success:
-            docs_created += 1
-            docs_lengths.append(char_count)
+            if success:
+                docs_created += 1
+                docs_lengths.append(char_count)
             
-            # Log to CSV
-            with open(CANONICAL_DOCS_CSV, "a", newline="") as f:
-                writer = csv.writer(f)
-                writer.writerow([
-                    event_id,
-                    url,
-                    authority,
-                    char_count,
-                    source_type,
-                    datetime.now(timezone.utc).isoformat()
-                ])
+                # Log to CSV
+                with open(CANONICAL_DOCS_CSV, "a", newline="") as f:
+                    writer = csv.writer(f)
+                    writer.writerow([
+                        event_id,
+                        url,
+                        authority,
+                        char_count,
+                        source_type,
+                        datetime.now(timezone.utc).isoformat()
+                    ])
             
-            print(f"    ✓ Created document ({char_count} chars, {source_type})")
-        else:
-            failed_count += 1
+                print(f"    ✓ Created document ({char_count} chars, {source_type})")
+            else:
+                failed_count += 1
         
-        # Rate limiting delay
-        time.sleep(1.2)
+            # Rate limiting delay
+            time.sleep(1.2)
     
     conn.close()
     
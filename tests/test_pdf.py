@@ -5,7 +5,7 @@ from pathlib import Path
 import pytest
 from pypdf import PdfReader
 
-from scripts.build_pdf import parse_front_matter, resolve_mode, main as build_pdf_main
+from scripts.build_pdf import parse_front_matter, resolve_mode, parse_blocks, main as build_pdf_main
 
 
 def test_front_matter_and_mode_resolution():
@@ -28,6 +28,28 @@ Body
     assert resolve_mode("auto", {}) == "publish"
 
 
+def test_parse_blocks_kinds():
+    lines = [
+        "# Title",
+        "## Section",
+        "First line",
+        "second line",
+        "",
+        "![Chart](charts/a.png)",
+        "| Authority | Count |",
+        "|-----------|:-----:|",
+        "| MAS | 3 |",
+        "| MAS | 4 |",
+        "",
+        "### Notes",
+    ]
+    blocks = parse_blocks(lines)
+    assert [b["type"] for b in blocks] == ["h1", "h2", "para", "image", "table", "h3"]
+    assert blocks[2]["text"] == "First line second line"
+    assert blocks[3]["src"] == "charts/a.png"
+    assert blocks[4]["rows"] == [["Authority", "Count"], ["MAS", "3"], ["MAS", "4"]]
+
+
 def _force_reportlab(monkeypatch):
     class DummyHTML:
         def __init__(self, *a, **k):